@@ -0,0 +1,107 @@
+"""
+Startup benchmark: import cost of the heavy modules and the app's first-render
+breakdown, each measured in a fresh interpreter (i.e. a cold worker).
+
+    python bench_startup.py                 # 3 runs, median per step
+    python bench_startup.py -n 5 --no-snapshot
+    python bench_startup.py -o bench_output.txt   # append a JSON line to track over time
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+IMPORTS = ["streamlit", "pandas", "plotly.graph_objects", "bvc_core.market_data"]
+
+IMPORT_SNIPPET = """
+import time
+t = time.perf_counter()
+import {module}
+print(time.perf_counter() - t)
+"""
+
+RENDER_SNIPPET = """
+import json, os, time
+t = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(os.path.join({app_dir!r}, "bvc_app.py"), default_timeout=120)
+at.run()
+total = time.perf_counter() - t
+from bvc_core import startup
+print(json.dumps({{"total_ms": total * 1000, "steps": startup.profile.breakdown(),
+                  "exceptions": [str(e.value) for e in at.exception]}}))
+"""
+
+
+def run_python(code):
+    result = subprocess.run([sys.executable, "-c", code], cwd=APP_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    return result.stdout.strip().splitlines()[-1]
+
+
+def bench_imports(runs):
+    timings = {}
+    for module in IMPORTS:
+        samples = [float(run_python(IMPORT_SNIPPET.format(module=module))) * 1000 for _ in range(runs)]
+        timings[module] = statistics.median(samples)
+    return timings
+
+
+def bench_first_render(runs, use_snapshot):
+    from bvc_core.snapshot import SNAPSHOT_PATH
+
+    hidden = f"{SNAPSHOT_PATH}.bench"
+    totals, steps = [], {}
+    for _ in range(runs):
+        if not use_snapshot and os.path.exists(SNAPSHOT_PATH):
+            os.replace(SNAPSHOT_PATH, hidden)
+        try:
+            report = json.loads(run_python(RENDER_SNIPPET.format(app_dir=APP_DIR)))
+        finally:
+            if os.path.exists(hidden):
+                os.replace(hidden, SNAPSHOT_PATH)
+        if report["exceptions"]:
+            print(f"App raised: {report['exceptions']}", file=sys.stderr)
+        totals.append(report["total_ms"])
+        for row in report["steps"]:
+            steps.setdefault(row["step"], []).append(row["delta_ms"])
+    return statistics.median(totals), {step: statistics.median(v) for step, v in steps.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start benchmark for bvc_app.py")
+    parser.add_argument("-n", "--runs", type=int, default=3)
+    parser.add_argument("--no-snapshot", action="store_true", help="hide the last-known snapshot (first paint waits on the network)")
+    parser.add_argument("-o", "--output", help="append the results as a JSON line to this file")
+    args = parser.parse_args()
+
+    imports = bench_imports(args.runs)
+    print("Import time (median ms, fresh interpreter)")
+    for module, ms in imports.items():
+        print(f"  {module:<24} {ms:8.0f}")
+
+    total, steps = bench_first_render(args.runs, use_snapshot=not args.no_snapshot)
+    print(f"\nFirst render ({'without' if args.no_snapshot else 'with'} snapshot, median ms)")
+    for step, ms in steps.items():
+        print(f"  {step:<24} {ms:8.0f}")
+    print(f"  {'total (incl. AppTest)':<24} {total:8.0f}")
+
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps({
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "snapshot": not args.no_snapshot,
+                "imports_ms": imports,
+                "first_render_ms": steps,
+                "total_ms": total,
+            }) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,20 @@
+from bvc_core import startup
 import streamlit as st
 import os
 import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
-import requests
+startup.profile.mark("import pandas")
+# plotly is imported where a chart is built: most reruns (and the first paint) never need it
 import time
 import random
-from datetime import datetime, timedelta, timezone
-from streamlit_autorefresh import st_autorefresh
-
-# Venezuela Timezone (UTC-4)
-VET = timezone(timedelta(hours=-4))
+import threading
+from datetime import datetime
+import streamlit.components.v1 as components
+import db_utils
+from bvc_core import alerts, bvc_site, corporate_actions, downsample, figure_cache, history, indicators, market_data, market_index, quote_hub, quote_table, rates, risk, snapshot, symbol_stats, valuation
+from bvc_core import cache as shared_cache
+from bvc_core import portfolio_history as portfolio_history_engine
+from bvc_core.config import VET
+startup.profile.mark("import app modules")
 
 
 # --- Page Configuration ---
@@ -174,279 +178,207 @@ st.markdown("""
     }
 </style>
 """, unsafe_allow_html=True)
+startup.profile.mark("page config + css")
 
 # --- Data Fetching Functions ---
+# Thin cached wrappers over the headless implementations in bvc_core.market_data.
+# shared_cache keeps one copy per host (or per Redis) for every worker process.
 
-@st.cache_data(ttl=3600)
+@shared_cache.cached(ttl=3600)
 def fetch_bcv_rate():
     """
     Fetches the official BCV USD/VES exchange rate.
     """
-    url = "https://ve.dolarapi.com/v1/dolares/oficial"
-    try:
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        return data.get('promedio', 1.0) # Fallback to 1.0 if not found
-    except Exception as e:
-        print(f"Error fetching BCV rate: {e}")
-        return 1.0
-
-@st.cache_data(ttl=86400) # Cache indefinitely for history (or 1 day)
+    return market_data.fetch_bcv_rate()
+
+@shared_cache.cached(ttl=86400) # Cache indefinitely for history (or 1 day)
 def fetch_historical_bcv_rate(target_date):
     """
     Fetches historical BCV rate for a specific date using api.dolarvzla.com.
     """
-    str_date = target_date.strftime('%Y-%m-%d')
-    url = f"https://api.dolarvzla.com/public/exchange-rate/list?from={str_date}&to={str_date}"
-    try:
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            if 'rates' in data and len(data['rates']) > 0:
-                return float(data['rates'][0]['usd'])
-    except Exception as e:
-        print(f"Error fetching historical BCV: {e}")
-    return None
+    return market_data.fetch_historical_bcv_rate(target_date)
 
-@st.cache_data(ttl=300)
-def fetch_binance_rate():
+@st.cache_resource
+def get_rate_aggregator():
     """
-    Fetches the Binance P2P VES/USDT rate.
+    Process-wide Binance P2P sampler (BUY/SELL, several pages) with its
+    persisted series; the rate card only reads its latest point.
     """
-    url = "https://p2p.binance.com/bapi/c2c/v2/friendly/c2c/adv/search"
-    payload = {
-        "asset": "USDT",
-        "fiat": "VES",
-        "merchantCheck": True,
-        "page": 1,
-        "payTypes": [],
-        "publisherType": "merchant",
-        "rows": 3,
-        "tradeType": "BUY"
-    }
-    headers = {
-        "Content-Type": "application/json",
-        "User-Agent": "Mozilla/5.0"
-    }
-    try:
-        response = requests.post(url, json=payload, headers=headers, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        if 'data' in data and len(data['data']) > 0:
-            prices = [float(adv['adv']['price']) for adv in data['data']]
-            return sum(prices) / len(prices)
-        return None
-    except Exception as e:
-        print(f"Error fetching Binance rate: {e}")
-        return None
+    aggregator = rates.RateAggregator(fetch_official=fetch_bcv_rate, interval=300)
+    aggregator.start()
+    return aggregator
 
-@st.cache_data(ttl=60)
-def fetch_interbono_data():
+@st.cache_resource
+def get_index_engine():
     """
-    Fetches data from the Interbono API proxy (Yahoo Finance wrapper).
-    Returns a dictionary with market summary and a DataFrame of stocks.
+    Process-wide market index engine. Each trading session chains from the
+    persisted closes before it; until a quote carries its session, from the
+    closes before today.
     """
-    url = "https://getmarketvalues-hdiyird7fq-uc.a.run.app"
-    
-    # List of symbols derived from Interbono's website
-    symbols = [
-        "ABC-A.CR", "BEX.CR", "BNC.CR", "BPV.CR", "BVE.CR", "BVCC.CR", "BVL.CR",
-        "CCP-B.CR", "CCR.CR", "CGQ.CR", "CIE.CR", "CRM-A.CR", "DOM.CR",
-        "EFE.CR", "ENV.CR", "FNC.CR", "FNV.CR", "FVIA.CR", "FVIB.CR",
-        "GMC-B.CR", "GZL.CR", "ICP-B.CR", "INV.CR", "IVC-A.CR", "IVC-B.CR",
-        "MPA.CR", "MVZ-A.CR", "MVZ-B.CR", "PCP-B.CR", "PER.CR", "PGR.CR", "PIV-B.CR",
-        "PTN.CR", "RFM.CR", "RST.CR", "RST-B.CR", "SVS.CR", "TDV-D.CR",
-        "TPG.CR", "VNA-B.CR"
-    ]
-    
-    yahoo_urls = [f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}" for symbol in symbols]
-    
-    payload = {
-        "urls": yahoo_urls
-    }
-    
-    headers = {
-        "Content-Type": "application/json",
-        "User-Agent": "Mozilla/5.0"
-    }
-    
-    try:
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        
-        stocks_list = []
-        
-        if 'data' in data:
-            results = data['data']
-            for i, result in enumerate(results):
-                try:
-                    # Defensive parsing as per API structure
-                    chart_result = result.get('chart', {}).get('result', [{}])[0]
-                    meta = chart_result.get('meta', {})
-                    
-                    symbol = meta.get('symbol', symbols[i])
-                    price = meta.get('regularMarketPrice', 0.0)
-                    prev_close = meta.get('chartPreviousClose', meta.get('previousClose', price))
-                    
-                    # Extra fields for table
-                    open_price = meta.get('regularMarketOpen', 0.0) # Might be missing
-                    if open_price == 0.0:
-                         open_price = prev_close # Fallback ensuring UI doesn't look broken
-                    
-                    day_high = meta.get('regularMarketDayHigh', 0.0)
-                    day_low = meta.get('regularMarketDayLow', 0.0)
+    today = datetime.now(VET).strftime("%Y-%m-%d")
+    return market_index.MarketIndexEngine(
+        base_levels=db_utils.get_last_index_closes(today), closes=db_utils.get_last_index_closes
+    )
 
-                    # Calculate change
-                    change_amount = price - prev_close
-                    change_percent = (change_amount / prev_close * 100) if prev_close else 0.0
-                    
-                    # Get name mapping
-                    api_name = meta.get('shortName', meta.get('longName', symbol))
-                    name = api_name.title()
-                    
-                    stocks_list.append({
-                        "Symbol": symbol,
-                        "Name": name,
-                        "Price": price,
-                        "Change": change_amount,
-                        "ChangePercent": change_percent,
-                        "Volume": meta.get('regularMarketVolume', 0),
-                        "Open": open_price,
-                        "DayHigh": day_high,
-                        "DayLow": day_low
-                    })
-                except Exception as e:
-                    print(f"Error parsing result for {symbols[i]}: {e}")
-                    continue
-                    
-        df = pd.DataFrame(stocks_list)
-        
-        # Calculate a pseudo index or "Market Heat" based on average change
-        avg_change = df['ChangePercent'].mean() if not df.empty else 0.0
-        
-        current_date = datetime.now(VET).strftime("%d/%m/%Y %H:%M:%S")
-        
-        return {
-            "status": "online",
-            "market_avg_change": avg_change,
-            "stocks": df,
-            "date": current_date
-        }
+@st.cache_resource
+def get_alert_engine():
+    """Process-wide alert engine; its rule index is rebuilt when the rules change."""
+    return alerts.AlertEngine()
+
+def evaluate_alerts(stocks, now):
+    """Runs the alert rules against a new snapshot and records what fired."""
+    engine = get_alert_engine()
+    day = now.strftime("%Y-%m-%d")
+    version = db_utils.get_alerts_version()
+    if version is None or engine.version != version:
+        engine.load(db_utils.get_alert_rules(), db_utils.get_fired_alert_ids(day), day, version)
+    if not engine.rules:
+        return
+
+    drawdown = None
+    if engine.has_portfolio_rules:
+        # Straight from the DB: this may run outside any session (warm-up, quote hub)
+        holdings = corporate_actions.adjust_holdings(db_utils.query_holdings()[0], get_action_book())
+        if holdings:
+            hist_df = fetch_multi_history([h['symbol'] for h in holdings], dividends=False)
+            if not hist_df.empty:
+                drawdown = alerts.portfolio_drawdown(
+                    portfolio_history_engine.get_portfolio_history(holdings, hist_df, holdings_version())
+                )
+    db_utils.record_alert_events(engine.evaluate(stocks, now, drawdown))
 
-    except Exception as e:
-        st.error(f"Error fetching data: {e}")
-        # Fallback empty structure
-        return {
-            "status": "error",
-            "market_avg_change": 0.0,
-            "stocks": pd.DataFrame(),
-            "date": datetime.now(VET).strftime("%d/%m/%Y")
-        }
+@shared_cache.cached(ttl=60)
+def fetch_market_snapshot():
+    """
+    Fetches data from the Interbono API proxy (Yahoo Finance wrapper), with
+    per-symbol failover to bolsadecaracas.com and its official IBC.
+    Only the fetch is shared across workers: it must stay free of side effects.
+    """
+    return bvc_site.fetch_merged()
+
+@st.cache_resource
+def get_snapshot_state():
+    """Process-wide record of the last snapshot processed by fetch_interbono_data()."""
+    return {"lock": threading.Lock(), "key": None, "data": None}
 
-def fetch_historical_price(symbol, target_date):
+def fetch_interbono_data():
     """
-    Fetches the historical close price for a symbol on a specific date.
-    target_date should be a datetime.date object.
+    Returns a dictionary with market summary and a DataFrame of stocks. The
+    derived columns, index persistence, alerts and the cold-start snapshot
+    run once per new snapshot in this process, whichever caller sees it first.
     """
-    url = "https://getmarketvalues-hdiyird7fq-uc.a.run.app"
-    
-    # Convert date to timestamp range (start and end of the day)
-    dt = datetime.combine(target_date, datetime.min.time())
-    p1 = int(dt.timestamp())
-    p2 = p1 + 86400 # +24 hours
-    
-    yahoo_url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}?period1={p1}&period2={p2}&interval=1d"
-    
-    payload = {"urls": [yahoo_url]}
-    headers = {"Content-Type": "application/json", "User-Agent": "Mozilla/5.0"}
-    
-    try:
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        
-        if 'data' in data and data['data']:
-            result = data['data'][0]
-            chart_result = result.get('chart', {}).get('result', [{}])[0]
-            
-            # Try to get the close price from indicators
-            indicators = chart_result.get('indicators', {}).get('quote', [{}])[0]
-            closes = indicators.get('close', [])
-            
-            # Filter out None values and get the first valid close
-            valid_closes = [c for c in closes if c is not None]
-            if valid_closes:
-                return valid_closes[0]
-            
-            # Fallback to adjclose if necessary
-            adjcloses = chart_result.get('indicators', {}).get('adjclose', [{}])[0].get('adjclose', [])
-            valid_adj = [c for c in adjcloses if c is not None]
-            if valid_adj:
-                return valid_adj[0]
-                
-        return None
-    except Exception as e:
-        print(f"Error fetching historical price for {symbol}: {e}")
-        return None
+    data = fetch_market_snapshot()
+    if data['status'] == 'error':
+        return {**data, 'market_avg_change': 0.0, 'market_index': {}}
+
+    key = (data['date'], int(pd.util.hash_pandas_object(data['stocks'], index=False).sum()))
+    state = get_snapshot_state()
+    with state["lock"]:
+        if state["key"] != key:
+            state["data"] = process_snapshot(dict(data))
+            state["key"] = key
+        return dict(state["data"])
+
+def process_snapshot(data):
+    """Derived data and side effects of a new quote snapshot."""
+    # Weighted market indices, updated incrementally and persisted per snapshot
+    now = datetime.now(VET)
+    engine = get_index_engine()
+    index_values = engine.update(data['stocks'])
+    if data.get('ibc'):
+        index_values = {**index_values, market_index.OFFICIAL_IBC: data['ibc']}
+    # Stored under the quotes' trading session; snapshots with no known session are not persisted
+    if index_values and engine.day is not None:
+        db_utils.save_index_values(index_values, now, day=engine.day)
+    data['market_avg_change'] = index_values.get(market_index.VOLUME_WEIGHTED, {}).get('change_pct', 0.0)
+    data['market_index'] = index_values
+    data['stocks'] = attach_symbol_stats(data['stocks'])
+    evaluate_alerts(data['stocks'], now)
+    # Last-known snapshot for the next cold start
+    snapshot.save_snapshot(data, usd_rate=fetch_bcv_rate())
+    return data
+
+fetch_historical_price = market_data.fetch_historical_price
+
+@st.cache_resource
+def get_history_store():
+    """Process-wide store of daily bars (persisted in the DB); other ranges and intervals are derived locally."""
+    return history.HistoryStore(
+        ttl=3600, persist=db_utils, on_update=get_stats_engine().ingest_bars,
+        actions=get_action_book(), on_restate=restate_symbols
+    )
+
+@st.cache_resource
+def get_action_book():
+    """Process-wide splits and dividends (persisted in the DB) behind the adjusted history and holdings."""
+    return corporate_actions.ActionBook(persist=db_utils)
+
+def restate_symbols(symbols):
+    """A new corporate action rewrote these symbols' adjusted history: drop what was derived from it."""
+    get_stats_engine().reset(symbols)
+    get_indicator_engine().invalidate(symbols)
 
-@st.cache_data(ttl=3600)
-def fetch_multi_history(symbols, range_str="1y"):
+def load_holdings():
+    """Holdings from the DB in today's shares (quantities and costs adjusted for splits since purchase)."""
+    return corporate_actions.adjust_holdings(db_utils.get_holdings(), get_action_book())
+
+def holdings_version():
+    """Cache key for anything derived from load_holdings(): changes on holdings writes and new splits."""
+    return (db_utils.get_portfolio_version(), get_action_book().version)
+
+@st.cache_resource
+def get_stats_engine():
+    """Process-wide per-symbol stats (52-week range, SMAs, average volume), fed by the history store."""
+    return symbol_stats.StatsEngine()
+
+@st.cache_resource
+def get_indicator_engine():
+    """Process-wide technical indicator engine (memoized, incremental on new bars)."""
+    return indicators.IndicatorEngine()
+
+def attach_symbol_stats(stocks):
+    """
+    Adds the materialized stats and the 14-day RSI as columns of the quote
+    frame, so the table, the screener, the alerts and the snapshot read them
+    directly. New daily bars reach the engine through the history store;
+    today's bar comes from the quotes.
+    """
+    if stocks.empty:
+        return stocks
+    bars = get_history_store().bars(stocks['Symbol'].tolist(), "1d", "1y")
+    engine = get_stats_engine()
+    engine.ingest_quotes(stocks)
+    stats = engine.table(stocks)
+    stocks = stocks.drop(columns=symbol_stats.STAT_COLUMNS + ["RSI"], errors="ignore").join(stats, on="Symbol")
+    if not bars.empty:
+        stocks['RSI'] = stocks['Symbol'].map(get_indicator_engine().latest("rsi", bars))
+    return stocks
+
+def fetch_multi_history(symbols, range_str="1y", dividends=True):
     """
     Fetches historical data for multiple symbols to build the portfolio chart.
+    Served from the history store: only a deeper range than held hits the proxy.
+    Holdings are valued with dividends=False (split-adjusted only), like their cost.
     """
-    if not symbols:
-        return pd.DataFrame()
-    
-    url = "https://getmarketvalues-hdiyird7fq-uc.a.run.app"
-    all_series = {}
-    
-    # We'll fetch 1y by default with 1d interval
-    headers = {"Content-Type": "application/json", "User-Agent": "Mozilla/5.0"}
-    
-    # To keep it efficient, we only fetch for unique symbols
-    unique_symbols = list(set(symbols))
-    yahoo_urls = [f"https://query1.finance.yahoo.com/v8/finance/chart/{s}?range={range_str}&interval=1d" for s in unique_symbols]
-    
-    try:
-        response = requests.post(url, json={"urls": yahoo_urls}, headers=headers, timeout=15)
-        response.raise_for_status()
-        results = response.json().get('data', [])
-        
-        for i, result in enumerate(results):
-            try:
-                chart_result = result.get('chart', {}).get('result', [{}])[0]
-                meta = chart_result.get('meta', {})
-                symbol = meta.get('symbol', unique_symbols[i])
-                timestamps = chart_result.get('timestamp', [])
-                indicators = chart_result.get('indicators', {}).get('quote', [{}])[0]
-                closes = indicators.get('close', [])
-                
-                if timestamps and closes:
-                    df = pd.DataFrame({
-                        'Date': pd.to_datetime(timestamps, unit='s'),
-                        symbol: closes
-                    }).set_index('Date')
-                    # Clean None values
-                    df[symbol] = df[symbol].ffill().bfill()
-                    all_series[symbol] = df[symbol]
-            except:
-                continue
-                
-        if not all_series:
-            return pd.DataFrame()
-            
-        return pd.DataFrame(all_series)
-    except Exception as e:
-        print(f"Error fetching multi history: {e}")
-        return pd.DataFrame()
+    return get_history_store().closes(symbols, range_str, dividends=dividends)
+
+@st.cache_resource
+def get_figure_cache():
+    """Process-wide LRU of built figures (as JSON), shared by every session."""
+    return figure_cache.FigureCache(maxsize=64)
+
+def cached_figure(parts, build):
+    """build()'s figure, reused while parts (its input data) and the active theme are unchanged."""
+    return get_figure_cache().get((st.context.theme.type, parts), build)
 
 def create_sparkline(series, color="#4ade80"):
     """Generates a small Plotly sparkline for the portfolio cards."""
     if series is None or len(series) < 2:
         return None
-        
+    return cached_figure(("sparkline", series, color), lambda: build_sparkline(series, color))
+
+def build_sparkline(series, color):
+    import plotly.graph_objects as go
     fig = go.Figure(go.Scatter(
         y=series, 
         mode='lines', 
@@ -471,13 +403,17 @@ def create_sparkline(series, color="#4ade80"):
 
 # Auto-refresh logic (5 minutes) - Only during Market Hours
 # BVC typical hours: Mon-Fri 9:00 AM - 1:00 PM (approx)
-now_vet = datetime.now(VET)
-is_weekday = now_vet.weekday() < 5 # 0-4 is Mon-Fri
-is_market_hours = 8 <= now_vet.hour < 14 # 8 AM to 2 PM to be safe
+# Refreshes are fragment-scoped: only the quote sections and rate cards rerun
+# on their timers, never the whole page.
+def is_market_open(now=None):
+    """Mon-Fri, 8 AM to 2 PM Caracas time to be safe."""
+    now = now or datetime.now(VET)
+    return now.weekday() < 5 and 8 <= now.hour < 14
 
-if is_weekday and is_market_hours:
-    st_autorefresh(interval=5 * 60 * 1000, key="data_refresh")
-else:
+QUOTES_REFRESH = "5m" if is_market_open() else None
+RATES_REFRESH = "10m" # P2P rates move outside market hours too
+
+if not QUOTES_REFRESH:
     # Small status message for the user if they're looking at the app off-hours
     st.sidebar.info("🌙 Mercado Cerrado - Refresco automático desactivado.")
 
@@ -488,16 +424,76 @@ with col1:
 with col2:
     if st.button("🔄 Actualizar Ahora"):
         st.cache_data.clear()
+        # Only the quote snapshot: the shared cache also serves every other user and worker
+        fetch_market_snapshot.clear()
         st.rerun()
     st.markdown(f"<div style='text-align: right; font-size: 0.8rem; color: #94a3b8;'>Última actualización: {datetime.now(VET).strftime('%H:%M:%S')}</div>", unsafe_allow_html=True)
 
+# --- Database Init ---
+@st.cache_resource
+def init_db_wrapper():
+    db_utils.init_db()
+
+# --- Cold Start ---
+# A new worker warms the schema and the first quote/rate fetch in the background
+# and paints from the last-known snapshot in the meantime.
+@st.cache_resource
+def get_warmup():
+    """Starts the warm-up once per process and returns its thread."""
+    def warm_up():
+        init_db_wrapper()
+        fetch_bcv_rate()
+        fetch_interbono_data()
+
+    thread = threading.Thread(target=warm_up, name="bvc-warmup", daemon=True)
+    thread.start()
+    return thread
+
+@st.cache_data(show_spinner=False)
+def load_last_snapshot():
+    return snapshot.load_snapshot()
+
+def cold_start_snapshot():
+    """
+    The last-known snapshot while the warm-up is still running, else None.
+    Without a saved snapshot this waits for the warm-up instead.
+    """
+    warmup = get_warmup()
+    if warmup.is_alive():
+        cold = load_last_snapshot()
+        if cold:
+            return cold
+        warmup.join()
+    return None
+
+def current_quotes():
+    """Quote data for this run: the snapshot on a cold worker, the cached live fetch otherwise."""
+    return cold_start_snapshot() or fetch_interbono_data()
+
+def current_usd_rate():
+    return (cold_start_snapshot() or {}).get('usd_rate') or fetch_bcv_rate()
+
+@st.fragment(run_every=1)
+def await_live_data():
+    """Polls the warm-up; once live data is cached a full rerun replaces the snapshot."""
+    if not get_warmup().is_alive():
+        st.rerun()
+
 # Fetch Data
-data = fetch_interbono_data()
-usd_rate = fetch_bcv_rate()
-binance_rate = fetch_binance_rate()
+data = current_quotes()
+usd_rate = current_usd_rate()
+if data['status'] == 'error':
+    st.error(f"Error fetching data: {data['error']}")
+if data['status'] == 'snapshot':
+    st.caption(f"⏳ Mostrando la última cotización conocida ({data['date']}). Actualizando...")
+    await_live_data()
+startup.profile.mark("quote data")
 
 # Display BCV Rate in Sidebar or Header
-st.sidebar.markdown(f"""
+@st.fragment(run_every=RATES_REFRESH)
+def render_bcv_sidebar_card():
+    usd_rate = current_usd_rate()
+    st.markdown(f"""
 <style>
 @keyframes pulse {{
   0% {{ transform: scale(1); opacity: 1; }}
@@ -523,20 +519,152 @@ st.sidebar.markdown(f"""
 </div>
 """, unsafe_allow_html=True)
 
+with st.sidebar:
+    render_bcv_sidebar_card()
+
 # Helper Mapping (Global)
 symbol_to_name = dict(zip(data['stocks']['Symbol'], data['stocks']['Name'])) if not data['stocks'].empty else {}
 
-# --- Database Init ---
-import db_utils
 
-@st.cache_resource
-def init_db_wrapper():
-    db_utils.init_db()
+# --- Helper Functions ---
 
-init_db_wrapper()
+def set_state(key, value):
+    """Widget callback: updates session state before the (fragment) rerun."""
+    st.session_state[key] = value
 
+def toggle_sort(column_key):
+    """Sort header callback: same column flips direction, a new column sorts ascending."""
+    if st.session_state.sort_column == column_key:
+        st.session_state.sort_ascending = not st.session_state.sort_ascending
+    else:
+        st.session_state.sort_column = column_key
+        st.session_state.sort_ascending = True
+
+# --- Symbol Detail ---
+# Overlay label -> (indicator, params, outputs, color)
+DETAIL_OVERLAYS = {
+    "SMA 50": ("sma", {"window": 50}, ("sma",), "#38bdf8"),
+    "SMA 200": ("sma", {"window": 200}, ("sma",), "#a78bfa"),
+    "EMA 20": ("ema", {"span": 20}, ("ema",), "#f59e0b"),
+    "Bollinger (20, 2)": ("bollinger", {"window": 20, "k": 2.0}, ("upper", "lower"), "#64748b"),
+}
+DETAIL_PANELS = ["Volumen", "RSI", "MACD"]
+
+def build_detail_figure(ohlc, line_mode, overlays, lower, lower_kind):
+    """
+    Price chart (candles or close line) with indicator overlays over a lower
+    panel. overlays/lower: lists of (label, series, color); lower_kind is
+    "Volumen" (bars colored by candle direction), "RSI" or "MACD".
+    """
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
 
-# --- Helper Functions ---
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.72, 0.28], vertical_spacing=0.03)
+    if line_mode:
+        fig.add_trace(go.Scatter(x=ohlc.index, y=ohlc['Close'], mode='lines', line=dict(color="#38bdf8", width=2), name="Cierre"), row=1, col=1)
+    else:
+        fig.add_trace(go.Candlestick(
+            x=ohlc.index, open=ohlc['Open'], high=ohlc['High'], low=ohlc['Low'], close=ohlc['Close'],
+            increasing_line_color="#4ade80", decreasing_line_color="#f87171", name="Precio"
+        ), row=1, col=1)
+    for label, series, color in overlays:
+        fig.add_trace(go.Scatter(x=series.index, y=series.values, mode='lines', line=dict(color=color, width=1.3), name=label), row=1, col=1)
+
+    for label, series, color in lower:
+        if label in ("Volumen", "Histograma"):
+            fig.add_trace(go.Bar(x=series.index, y=series.values, marker_color=color, name=label), row=2, col=1)
+        else:
+            fig.add_trace(go.Scatter(x=series.index, y=series.values, mode='lines', line=dict(color=color, width=1.3), name=label), row=2, col=1)
+    if lower_kind == "RSI":
+        for level in (30, 70):
+            fig.add_hline(y=level, line=dict(color="#475569", width=1, dash="dot"), row=2, col=1)
+
+    fig.update_layout(
+        margin=dict(l=0, r=0, t=10, b=0),
+        height=520,
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        hovermode="x unified",
+        showlegend=True,
+        legend=dict(orientation="h", y=1.02, x=0, font=dict(size=10, color="#cbd5e1")),
+        xaxis_rangeslider_visible=False,
+        bargap=0.1
+    )
+    # The BVC doesn't trade on weekends
+    fig.update_xaxes(showgrid=False, color="#475569", tickfont=dict(size=10), rangebreaks=[dict(bounds=["sat", "mon"])])
+    fig.update_yaxes(showgrid=True, gridcolor='rgba(255,255,255,0.05)', tickfont=dict(color='#94a3b8', size=10))
+    return fig
+
+@st.dialog("📈 Detalle del Símbolo", width="large")
+def symbol_detail(symbol):
+    """Candles, volume and indicators from the history store, downsampled to a bounded number of points."""
+    quote = data['stocks'].loc[data['stocks']['Symbol'] == symbol] if not data['stocks'].empty else pd.DataFrame()
+    if not quote.empty:
+        q = quote.iloc[0]
+        color = "#4ade80" if q['Change'] >= 0 else "#f87171"
+        st.markdown(f"""
+            <div style="margin-bottom: 8px;">
+                <span style="font-weight: 800; font-size: 1.3rem; color: #f8fafc;">{symbol.replace('.CR', '')}</span>
+                <span style="font-size: 0.9rem; color: #94a3b8; margin-left: 8px;">{q['Name']}</span>
+                <div style="font-size: 1.1rem; font-weight: 600;">Bs. {q['Price']:,.2f}
+                    <span style="color: {color}; font-size: 0.9rem;">{'+' if q['ChangePercent'] > 0 else ''}{q['ChangePercent']:.2f}%</span>
+                </div>
+            </div>
+        """, unsafe_allow_html=True)
+
+    c1, c2 = st.columns([2, 1])
+    with c1:
+        range_label = st.segmented_control("Rango", list(history.RANGE_LABELS), default="1Y", key="detail_range", label_visibility="collapsed") or "1Y"
+    with c2:
+        chart_type = st.segmented_control("Tipo", ["Velas", "Línea"], default="Velas", key="detail_chart_type", label_visibility="collapsed") or "Velas"
+    c3, c4 = st.columns([2, 1])
+    with c3:
+        chosen = st.multiselect("Indicadores", list(DETAIL_OVERLAYS), default=["SMA 50"], key="detail_overlays", label_visibility="collapsed")
+    with c4:
+        lower_kind = st.segmented_control("Panel inferior", DETAIL_PANELS, default="Volumen", key="detail_panel", label_visibility="collapsed") or "Volumen"
+
+    # Load at least two years so long averages are defined from the first visible bar
+    range_str = history.RANGE_LABELS[range_label]
+    depth = history.RANGES[max(history.RANGES.index(range_str), history.RANGES.index("2y"))]
+    bars = get_history_store().bars([symbol], "1d", depth)
+    if bars.empty:
+        st.info("No hay historial disponible para este símbolo.")
+        return
+
+    visible = history.slice_range(bars, range_str)
+    # Candles merge runs of bars (extremes kept); the close line keeps its LTTB points
+    bucketed = downsample.bucket_ohlcv(visible)
+    line_mode = chart_type == "Línea"
+    shown = downsample.lttb_frame(visible.xs(symbol, axis=1, level=1), 'Close') if line_mode else bucketed.xs(symbol, axis=1, level=1)
+
+    engine = get_indicator_engine()
+    def indicator(name, params, output):
+        return engine.compute(name, bars, **params)[output][symbol].reindex(shown.index)
+
+    overlays = []
+    for label in chosen:
+        name, params, outputs, color = DETAIL_OVERLAYS[label]
+        overlays.extend((label if len(outputs) == 1 else f"{label} {out}", indicator(name, params, out), color) for out in outputs)
+
+    if lower_kind == "RSI":
+        lower = [("RSI 14", indicator("rsi", {}, "rsi"), "#f59e0b")]
+    elif lower_kind == "MACD":
+        lower = [
+            ("Histograma", indicator("macd", {}, "hist"), "#475569"),
+            ("MACD", indicator("macd", {}, "macd"), "#38bdf8"),
+            ("Señal", indicator("macd", {}, "signal"), "#f59e0b"),
+        ]
+    else:
+        volume = bucketed.xs(symbol, axis=1, level=1)
+        lower = [("Volumen", volume['Volume'], ["#4ade80" if up else "#f87171" for up in volume['Close'] >= volume['Open']])]
+
+    fig = cached_figure(
+        ("symbol_detail", shown, line_mode, overlays, lower, lower_kind),
+        lambda: build_detail_figure(shown, line_mode, overlays, lower, lower_kind)
+    )
+    st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
+    if len(shown) < len(visible):
+        st.caption(f"{len(shown):,} de {len(visible):,} barras diarias mostradas ({'LTTB' if line_mode else 'velas agrupadas'}).")
 
 @st.dialog("📄 Detalles de Transacción")
 def transaction_details(item, usd_rate, available_symbols, format_func):
@@ -635,9 +763,9 @@ def transaction_details(item, usd_rate, available_symbols, format_func):
     if not st.session_state[f"edit_mode_{item['id']}"]:
         col_act1, col_act2 = st.columns([1, 1])
         with col_act1:
-            if st.button("✏️ Editar Registro", use_container_width=True, key=f"btn_edit_{item['id']}"):
-                st.session_state[f"edit_mode_{item['id']}"] = True
-                st.rerun()
+            # Dialogs are fragments: toggling edit mode via a callback reruns only the dialog
+            st.button("✏️ Editar Registro", use_container_width=True, key=f"btn_edit_{item['id']}",
+                      on_click=set_state, args=(f"edit_mode_{item['id']}", True))
         with col_act2:
             if st.button("🗑️ Eliminar Acción", type="primary", use_container_width=True, key=f"btn_del_{item['id']}"):
                 db_utils.delete_holding(item['id'])
@@ -655,245 +783,389 @@ def transaction_details(item, usd_rate, available_symbols, format_func):
             c_save, c_cancel = st.columns(2)
             with c_save:
                 if st.form_submit_button("💾 Guardar", type="primary"):
-                    db_utils.update_holding(item['id'], new_sym, new_qty, new_cost, new_date.isoformat())
+                    # Entered in today's shares; stored as bought (before later splits)
+                    split = get_action_book().share_factors([new_sym], [new_date.isoformat()])[0]
+                    db_utils.update_holding(item['id'], new_sym, new_qty / split, new_cost * split, new_date.isoformat())
                     st.success("Guardado.")
                     st.session_state[f"edit_mode_{item['id']}"] = False
                     time.sleep(1)
                     st.rerun()
             with c_cancel:
-                if st.form_submit_button("Cancelar"):
-                    st.session_state[f"edit_mode_{item['id']}"] = False
-                    st.rerun()
-
-
-# --- Tabs ---
-tab_market, tab_portfolio = st.tabs(["🏛️ Mercado", "💼 Mi Portafolio"])
-
-# --- TAB: MERCADO ---
-with tab_market:
-    if data['status'] == 'error' or data['stocks'].empty:
-        st.warning("No se pudo conectar con el servicio de datos. Intente nuevamente.")
-    else:
-        # Market Summary Hero
-        st.markdown("### 📊 Resumen del Mercado")
-        ibc_col1, ibc_col2, ibc_col3, ibc_col4 = st.columns([1, 1, 1, 1.2])
+                st.form_submit_button("Cancelar", on_click=set_state, args=(f"edit_mode_{item['id']}", False))
+
+
+# --- Views ---
+# Only the selected view is executed on each rerun (st.tabs would run both bodies),
+# so sorting the quote table never touches holdings, history or portfolio charts.
+VIEW_MARKET = "🏛️ Mercado"
+VIEW_PORTFOLIO = "💼 Mi Portafolio"
+
+# --- VIEW: MERCADO ---
+@st.fragment(run_every=QUOTES_REFRESH)
+def render_market_summary():
+    """Trend, top movers and volume cards; refreshes with the quotes."""
+    data = current_quotes()
+    if data['stocks'].empty:
+        return
+
+    ibc_col1, ibc_col2, ibc_col3 = st.columns(3)
+
+    with ibc_col1:
+        # Precomputed by the index engine on each snapshot
+        avg_change = data['market_avg_change']
+        cap_index = data.get('market_index', {}).get(market_index.CAP_WEIGHTED)
+        cap_str = f" • {market_index.cap_label()} {cap_index['change_pct']:+.2f}%" if cap_index else ""
+        official = data.get('market_index', {}).get(market_index.OFFICIAL_IBC)
+        if official:
+            cap_str += f" • IBC {official['value']:,.2f} ({official['change_pct']:+.2f}%)"
+        delta_color = "delta-positive" if avg_change >= 0 else "delta-negative"
+        delta_icon = "▲" if avg_change >= 0 else "▼"
+        st.markdown(f"""
+        <div class="metric-card">
+            <div class="metric-label">Tendencia (Pond. Volumen)</div>
+            <div>
+                <div class="metric-value" style="font-size: 1.5rem; margin-bottom: 4px;">{avg_change:.2f}%</div>
+                <div class="metric-delta {delta_color}">
+                    {delta_icon} Mercado General{cap_str}
+                </div>
+            </div>
+        </div>
+        """, unsafe_allow_html=True)
 
-        with ibc_col1:
-            avg_change = data['market_avg_change']
-            delta_color = "delta-positive" if avg_change >= 0 else "delta-negative"
-            delta_icon = "▲" if avg_change >= 0 else "▼"
+    with ibc_col2:
+        # Top Gainer
+        top_gainer = data['stocks'].loc[data['stocks']['ChangePercent'].idxmax()] if not data['stocks'].empty else None
+        if top_gainer is not None:
             st.markdown(f"""
             <div class="metric-card">
-                <div class="metric-label">Tendencia Promedio</div>
+                <div class="metric-label">Mayor Alza 🚀</div>
                 <div>
-                    <div class="metric-value" style="font-size: 1.5rem; margin-bottom: 4px;">{avg_change:.2f}%</div>
-                    <div class="metric-delta {delta_color}">
-                        {delta_icon} Mercado General
+                    <div style="font-weight: 800; font-size: 1.5rem; color: #f8fafc;">{top_gainer['Symbol'].replace('.CR', '')}</div>
+                    <div style="font-size: 0.8rem; color: #64748b; margin-bottom: 8px; white-space: nowrap; overflow: hidden; text-overflow: ellipsis;">{top_gainer['Name']}</div>
+                    <div style="display: flex; justify-content: space-between; align-items: center;">
+                        <div style="color: #4ade80; font-weight: 700;">+{top_gainer['ChangePercent']:.2f}%</div>
+                        <div style="text-align: right; padding-right: 5px; padding-bottom: 5px;">
+                            <div style="color: #f8fafc; font-size: 0.9rem; font-weight: 600;">Bs. {top_gainer['Price']:,.2f}</div>
+                            <div style="color: #38bdf8; font-size: 0.75rem;">$ {top_gainer['Price']/usd_rate:,.2f}</div>
+                        </div>
                     </div>
                 </div>
             </div>
             """, unsafe_allow_html=True)
 
-        with ibc_col2:
-            # Top Gainer
-            top_gainer = data['stocks'].loc[data['stocks']['ChangePercent'].idxmax()] if not data['stocks'].empty else None
-            if top_gainer is not None:
+    with ibc_col3:
+        # Market Volume (Sum of simple volumes for demo)
+        total_vol = data['stocks']['Volume'].sum() if 'Volume' in data['stocks'].columns else 0
+        st.markdown(f"""
+        <div class="metric-card">
+            <div class="metric-label">Volumen Total</div>
+            <div>
+                <div class="metric-value" style="font-size: 1.5rem; margin-bottom: 4px;">{total_vol:,.0f}</div>
+                <div class="metric-delta delta-positive">
+                    Acciones
+                </div>
+            </div>
+        </div>
+        """, unsafe_allow_html=True)
+
+
+@st.fragment(run_every=RATES_REFRESH)
+def render_rate_card():
+    """BCV / Binance rate card; refreshes on its own interval."""
+    usd_rate = current_usd_rate()
+    # Precomputed by the aggregator thread (or the persisted series on a cold start)
+    p2p = get_rate_aggregator().latest() or {}
+    binance_rate = p2p.get(f"buy_{rates.HEADLINE}")
+    binance_display = f"Bs. {binance_rate:,.2f}" if binance_rate else "Cargando..."
+    p2p_details = " • ".join(
+        f"{label} {p2p[key]:+.1f}%" for label, key in [("Brecha", "brecha_pct"), ("Spread", "spread_pct")] if p2p.get(key) is not None
+    )
+    st.markdown(f"""
+    <div class="metric-card" style="border-color: rgba(245, 158, 11, 0.3);">
+        <div class="metric-label">Tipo de Cambio DIVISA</div>
+        <div style="margin-top: 10px;">
+            <div style="display: flex; justify-content: space-between; margin-bottom: 10px;">
+                <span style="color: #94a3b8; font-size: 0.75rem; font-weight: 600;">🏛️ BCV</span>
+                <span style="color: #f8fafc; font-size: 0.95rem; font-weight: 700;">Bs. {usd_rate:,.2f}</span>
+            </div>
+            <div style="display: flex; justify-content: space-between;">
+                <span style="color: #94a3b8; font-size: 0.75rem; font-weight: 600;">🔶 Binance</span>
+                <span style="color: #f59e0b; font-size: 0.95rem; font-weight: 700;">{binance_display}</span>
+            </div>
+        </div>
+        <div style="font-size: 0.65rem; color: #64748b; text-align: right; margin-top: 5px;">P2P USDT/VES{' • ' + p2p_details if p2p_details else ''}</div>
+    </div>
+    """, unsafe_allow_html=True)
+
+
+@st.cache_resource
+def get_quote_publisher():
+    """Process-wide holder of the current read-only quote table."""
+    return quote_table.QuotePublisher()
+
+def current_quote_table():
+    """The shared, presorted quote table for this run's snapshot (built once per snapshot)."""
+    return get_quote_publisher().publish(current_quotes()['stocks'])
+
+@st.fragment(run_every=QUOTES_REFRESH)
+def render_quote_table():
+    """Sortable quote table. Sort clicks and refreshes rerun only this fragment."""
+    table = current_quote_table()
+    usd_rate = current_usd_rate()
+    if table.empty:
+        return
+
+    # Market Overview (Stocks) Table
+    st.markdown("### 🏢 Cotizaciones en Tiempo Real")
+    
+    # Initialize sort state
+    if 'sort_column' not in st.session_state:
+        st.session_state.sort_column = 'ChangePercent'
+        st.session_state.sort_ascending = False
+    
+    # Table Header with Clickable Buttons
+    # Use more responsive weights
+    header_cols = st.columns([2, 1.2, 1, 1.2, 1, 1, 1.2])
+    
+    # Define sortable columns and their labels
+    column_mappings = [
+        ("Symbol", "ACCIÓN"),
+        ("Price", "PRECIO"),
+        ("Change", "CAMBIO"),
+        ("ChangePercent", "% CAMBIO"),
+        ("Open", "APERTURA"),
+        ("Volume", "VOLUMEN"),
+        ("DayHigh", "RANGO")
+    ]
+    
+    # We'll hide columns 5, 6, 7 on mobile
+    mobile_hide_indices = [4, 5, 6] 
+    
+    for i, (col, (column_key, label)) in enumerate(zip(header_cols, column_mappings)):
+        with col:
+            is_mobile_hide = i in mobile_hide_indices
+            class_str = "mobile-hide" if is_mobile_hide else ""
+            
+            if column_key:
+                arrow = ""
+                if st.session_state.sort_column == column_key:
+                    arrow = " ↑" if st.session_state.sort_ascending else " ↓"
+                
+                st.markdown(f'<div class="{class_str}">', unsafe_allow_html=True)
+                # Callback runs before the fragment rerun, so arrows and order are already updated
+                st.button(f"{label}{arrow}", key=f"sort_{column_key}", use_container_width=True,
+                          on_click=toggle_sort, args=(column_key,))
+                st.markdown('</div>', unsafe_allow_html=True)
+            else:
+                st.markdown(f"<div class='{class_str}' style='color: #94a3b8; font-size: 0.8rem; font-weight: bold; margin-bottom: 10px; text-align: center;'>{label}</div>", unsafe_allow_html=True)
+    
+    # Table Rows, in the table's precomputed order for the session's sort key
+    for row in table.rows(st.session_state.sort_column, st.session_state.sort_ascending):
+        with st.container():
+            # Define Colors
+            text_color = "#4ade80" if row['Change'] >= 0 else "#f87171"
+            bg_badge = "rgba(74, 222, 128, 0.1)" if row['Change'] >= 0 else "rgba(248, 113, 113, 0.1)"
+            # arrow_icon = "↑" if row['Change'] >= 0 else "↓"
+            
+            # Layout with responsive weights
+            c1, c2, c3, c4, c5, c6, c7 = st.columns([2, 1.2, 1, 1.2, 1, 1, 1.2])
+            
+            # Col 1: Symbol (opens the detail chart) & Name
+            with c1:
+                st.markdown('<div class="portfolio-symbol-marker"></div>', unsafe_allow_html=True)
+                if st.button(row['Symbol'].replace('.CR', ''), key=f"detail_btn_{row['Symbol']}", help="Ver gráfico e indicadores", type="tertiary"):
+                    symbol_detail(row['Symbol'])
                 st.markdown(f"""
-                <div class="metric-card">
-                    <div class="metric-label">Mayor Alza 🚀</div>
-                    <div>
-                        <div style="font-weight: 800; font-size: 1.5rem; color: #f8fafc;">{top_gainer['Symbol'].replace('.CR', '')}</div>
-                        <div style="font-size: 0.8rem; color: #64748b; margin-bottom: 8px; white-space: nowrap; overflow: hidden; text-overflow: ellipsis;">{top_gainer['Name']}</div>
-                        <div style="display: flex; justify-content: space-between; align-items: center;">
-                            <div style="color: #4ade80; font-weight: 700;">+{top_gainer['ChangePercent']:.2f}%</div>
-                            <div style="text-align: right; padding-right: 5px; padding-bottom: 5px;">
-                                <div style="color: #f8fafc; font-size: 0.9rem; font-weight: 600;">Bs. {top_gainer['Price']:,.2f}</div>
-                                <div style="color: #38bdf8; font-size: 0.75rem;">$ {top_gainer['Price']/usd_rate:,.2f}</div>
-                            </div>
-                        </div>
-                    </div>
+                <div style="margin-bottom: 10px;">
+                    <div style="font-size: 0.8rem; color: #94a3b8;">{row['Name']}</div>
                 </div>
                 """, unsafe_allow_html=True)
-
-        with ibc_col3:
-            # Market Volume (Sum of simple volumes for demo)
-            total_vol = data['stocks']['Volume'].sum() if 'Volume' in data['stocks'].columns else 0
-            st.markdown(f"""
-            <div class="metric-card">
-                <div class="metric-label">Volumen Total</div>
+            
+            # Col 2: Price
+            with c2:
+                 price_usd = row['Price'] / usd_rate if usd_rate > 0 else 0
+                 st.markdown(f"""
                 <div>
-                    <div class="metric-value" style="font-size: 1.5rem; margin-bottom: 4px;">{total_vol:,.0f}</div>
-                    <div class="metric-delta delta-positive">
-                        Acciones
-                    </div>
+                    <div style="font-weight: bold; font-size: 1rem;">Bs. {row['Price']:,.2f}</div>
+                    <div style="font-size: 0.75rem; color: #38bdf8;">$ {price_usd:,.2f}</div>
                 </div>
-            </div>
-            """, unsafe_allow_html=True)
+                """, unsafe_allow_html=True)
 
-        with ibc_col4:
-            # Dollar Rates Card
-            binance_display = f"Bs. {binance_rate:,.2f}" if binance_rate else "Cargando..."
-            st.markdown(f"""
-            <div class="metric-card" style="border-color: rgba(245, 158, 11, 0.3);">
-                <div class="metric-label">Tipo de Cambio DIVISA</div>
-                <div style="margin-top: 10px;">
-                    <div style="display: flex; justify-content: space-between; margin-bottom: 10px;">
-                        <span style="color: #94a3b8; font-size: 0.75rem; font-weight: 600;">🏛️ BCV</span>
-                        <span style="color: #f8fafc; font-size: 0.95rem; font-weight: 700;">Bs. {usd_rate:,.2f}</span>
-                    </div>
-                    <div style="display: flex; justify-content: space-between;">
-                        <span style="color: #94a3b8; font-size: 0.75rem; font-weight: 600;">🔶 Binance</span>
-                        <span style="color: #f59e0b; font-size: 0.95rem; font-weight: 700;">{binance_display}</span>
-                    </div>
+            # Col 3: Change
+            with c3:
+                st.markdown(f"""
+                <div class="mobile-hide">
+                    <div style="font-weight: bold; font-size: 1rem; color: {text_color};">{'+' if row['Change'] > 0 else ''}{row['Change']:,.2f}</div>
+                    <div style="font-size: 0.75rem; color: #64748b;">Hoy</div>
                 </div>
-                <div style="font-size: 0.65rem; color: #64748b; text-align: right; margin-top: 5px;">P2P USDT/VES</div>
-            </div>
-            """, unsafe_allow_html=True)
+                """, unsafe_allow_html=True)
 
-        # Market Overview (Stocks) Table
-        st.markdown("### 🏢 Cotizaciones en Tiempo Real")
-        
-        # Initialize sort state
-        if 'sort_column' not in st.session_state:
-            st.session_state.sort_column = 'ChangePercent'
-            st.session_state.sort_ascending = False
-        
-        df_display = data['stocks'].copy()
-        
-        # Table Header with Clickable Buttons
-        # Use more responsive weights
-        header_cols = st.columns([2, 1.2, 1, 1.2, 1, 1, 1.2])
-        
-        # Define sortable columns and their labels
-        column_mappings = [
-            ("Symbol", "ACCIÓN"),
-            ("Price", "PRECIO"),
-            ("Change", "CAMBIO"),
-            ("ChangePercent", "% CAMBIO"),
-            ("Open", "APERTURA"),
-            ("Volume", "VOLUMEN"),
-            ("DayHigh", "RANGO")
-        ]
-        
-        # We'll hide columns 5, 6, 7 on mobile
-        mobile_hide_indices = [4, 5, 6] 
-        
-        for i, (col, (column_key, label)) in enumerate(zip(header_cols, column_mappings)):
-            with col:
-                is_mobile_hide = i in mobile_hide_indices
-                class_str = "mobile-hide" if is_mobile_hide else ""
-                
-                if column_key:
-                    arrow = ""
-                    if st.session_state.sort_column == column_key:
-                        arrow = " ↑" if st.session_state.sort_ascending else " ↓"
-                    
-                    st.markdown(f'<div class="{class_str}">', unsafe_allow_html=True)
-                    if st.button(f"{label}{arrow}", key=f"sort_{column_key}", use_container_width=True):
-                        if st.session_state.sort_column == column_key:
-                            st.session_state.sort_ascending = not st.session_state.sort_ascending
-                        else:
-                            st.session_state.sort_column = column_key
-                            st.session_state.sort_ascending = True
-                        st.rerun()
-                    st.markdown('</div>', unsafe_allow_html=True)
-                else:
-                    st.markdown(f"<div class='{class_str}' style='color: #94a3b8; font-size: 0.8rem; font-weight: bold; margin-bottom: 10px; text-align: center;'>{label}</div>", unsafe_allow_html=True)
-        
-        # Apply sorting
-        df_display = df_display.sort_values(
-            by=st.session_state.sort_column,
-            ascending=st.session_state.sort_ascending
-        )
+            # Col 4: % Change Badge
+            with c4:
+                 st.markdown(f"""
+                <div style="
+                    background-color: {bg_badge};
+                    color: {text_color};
+                    padding: 4px 8px;
+                    border-radius: 6px;
+                    font-weight: bold;
+                    font-size: 0.85rem;
+                    display: inline-block;
+                    text-align: center;
+                ">
+                    {'+' if row['ChangePercent'] > 0 else ''}{row['ChangePercent']:.2f}%
+                </div>
+                """, unsafe_allow_html=True)
             
-        # Table Rows
-        for idx, row in df_display.iterrows():
-            with st.container():
-                # Define Colors
-                text_color = "#4ade80" if row['Change'] >= 0 else "#f87171"
-                bg_badge = "rgba(74, 222, 128, 0.1)" if row['Change'] >= 0 else "rgba(248, 113, 113, 0.1)"
-                # arrow_icon = "↑" if row['Change'] >= 0 else "↓"
-                
-                # Layout with responsive weights
-                c1, c2, c3, c4, c5, c6, c7 = st.columns([2, 1.2, 1, 1.2, 1, 1, 1.2])
-                
-                # Col 1: Symbol & Name
-                with c1:
-                    st.markdown(f"""
-                    <div style="margin-bottom: 10px;">
-                        <div style="font-weight: bold; font-size: 1.1rem; color: #f8fafc;">{row['Symbol'].replace('.CR', '')}</div>
-                        <div style="font-size: 0.8rem; color: #94a3b8;">{row['Name']}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                
-                # Col 2: Price
-                with c2:
-                     price_usd = row['Price'] / usd_rate if usd_rate > 0 else 0
-                     st.markdown(f"""
-                    <div>
-                        <div style="font-weight: bold; font-size: 1rem;">Bs. {row['Price']:,.2f}</div>
-                        <div style="font-size: 0.75rem; color: #38bdf8;">$ {price_usd:,.2f}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-
-                # Col 3: Change
-                with c3:
-                    st.markdown(f"""
-                    <div class="mobile-hide">
-                        <div style="font-weight: bold; font-size: 1rem; color: {text_color};">{'+' if row['Change'] > 0 else ''}{row['Change']:,.2f}</div>
-                        <div style="font-size: 0.75rem; color: #64748b;">Hoy</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-
-                # Col 4: % Change Badge
-                with c4:
-                     st.markdown(f"""
-                    <div style="
-                        background-color: {bg_badge};
-                        color: {text_color};
-                        padding: 4px 8px;
-                        border-radius: 6px;
-                        font-weight: bold;
-                        font-size: 0.85rem;
-                        display: inline-block;
-                        text-align: center;
-                    ">
-                        {'+' if row['ChangePercent'] > 0 else ''}{row['ChangePercent']:.2f}%
-                    </div>
-                    """, unsafe_allow_html=True)
-                
-                # Col 5: Open
-                with c5:
-                     st.markdown(f"""
-                    <div class="mobile-hide">
-                         <div style="font-weight: 600; font-size: 0.95rem;">{row['Open']:,.2f}</div>
-                         <div style="font-size: 0.75rem; color: #64748b;">Apertura</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                # Col 6: Volume
-                with c6:
-                     vol_str = f"{row['Volume']/1000:.1f}K" if row['Volume'] > 1000 else str(row['Volume'])
-                     st.markdown(f"""
-                    <div class="mobile-hide">
-                         <div style="font-weight: 600; font-size: 0.95rem;">{vol_str}</div>
-                         <div style="font-size: 0.75rem; color: #64748b;">Vol</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                
-                # Col 7: Range
-                with c7:
-                     st.markdown(f"""
-                    <div class="mobile-hide" style="font-size: 0.8rem; text-align: center;">
-                         <div style="color: #4ade80;">↑ {row['DayHigh']:,.2f}</div>
-                         <div style="color: #f87171;">↓ {row['DayLow']:,.2f}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
+            # Col 5: Open
+            with c5:
+                 st.markdown(f"""
+                <div class="mobile-hide">
+                     <div style="font-weight: 600; font-size: 0.95rem;">{row['Open']:,.2f}</div>
+                     <div style="font-size: 0.75rem; color: #64748b;">Apertura</div>
+                </div>
+                """, unsafe_allow_html=True)
                 
+            # Col 6: Volume
+            with c6:
+                 vol_str = f"{row['Volume']/1000:.1f}K" if row['Volume'] > 1000 else str(row['Volume'])
+                 st.markdown(f"""
+                <div class="mobile-hide">
+                     <div style="font-weight: 600; font-size: 0.95rem;">{vol_str}</div>
+                     <div style="font-size: 0.75rem; color: #64748b;">Vol</div>
+                </div>
+                """, unsafe_allow_html=True)
+            
+            # Col 7: Range
+            with c7:
+                 high_52w, low_52w = row.get('High52w'), row.get('Low52w')
+                 range_52w = (
+                     f'<div style="color: #64748b; font-size: 0.7rem;">52s {low_52w:,.2f} – {high_52w:,.2f}</div>'
+                     if pd.notna(high_52w) and pd.notna(low_52w) else ""
+                 )
+                 st.markdown(f"""
+                <div class="mobile-hide" style="font-size: 0.8rem; text-align: center;">
+                     <div style="color: #4ade80;">↑ {row['DayHigh']:,.2f}</div>
+                     <div style="color: #f87171;">↓ {row['DayLow']:,.2f}</div>
+                     {range_52w}
+                </div>
+                """, unsafe_allow_html=True)
+
+
+# Screener filters over the materialized stat columns
+SCREENER_FILTERS = {
+    "Sobre SMA 50": lambda df: df['Price'] > df['SMA50'],
+    "Sobre SMA 200": lambda df: df['Price'] > df['SMA200'],
+    "A ≤5% del máximo 52s": lambda df: df['FromHighPct'] >= -5,
+    "Volumen sobre su promedio": lambda df: df['Volume'] > df['AvgVolume'],
+    "RSI < 30 (sobrevendida)": lambda df: df['RSI'] < 30,
+    "RSI > 70 (sobrecomprada)": lambda df: df['RSI'] > 70,
+}
+
+def render_screener():
+    """Filters the quote snapshot on its stat columns; nothing is computed here."""
+    stocks = data['stocks'].reindex(columns=list(data['stocks'].columns.union(symbol_stats.STAT_COLUMNS + ["RSI"], sort=False)))
+    with st.expander("🔎 Screener"):
+        chosen = st.multiselect("Filtros", list(SCREENER_FILTERS), key="screener_filters")
+        mask = pd.Series(True, index=stocks.index)
+        for name in chosen:
+            mask &= SCREENER_FILTERS[name](stocks).fillna(False)
+        view = stocks.loc[mask, ['Symbol', 'Name', 'Price', 'ChangePercent', 'Volume'] + symbol_stats.STAT_COLUMNS + ['RSI']]
+        view = view.assign(Symbol=view['Symbol'].str.replace('.CR', ''))
+        st.caption(f"{len(view)} de {len(stocks)} acciones")
+        st.dataframe(
+            view.sort_values('FromHighPct', ascending=False),
+            hide_index=True,
+            column_config={
+                "Symbol": "Acción",
+                "Name": "Nombre",
+                "Price": st.column_config.NumberColumn("Precio", format="%.2f"),
+                "ChangePercent": st.column_config.NumberColumn("% Hoy", format="%.2f%%"),
+                "Volume": st.column_config.NumberColumn("Volumen", format="%d"),
+                "High52w": st.column_config.NumberColumn("Máx. 52s", format="%.2f"),
+                "Low52w": st.column_config.NumberColumn("Mín. 52s", format="%.2f"),
+                "AvgVolume": st.column_config.NumberColumn("Vol. prom. 50d", format="%.0f"),
+                "SMA50": st.column_config.NumberColumn("SMA 50", format="%.2f"),
+                "SMA200": st.column_config.NumberColumn("SMA 200", format="%.2f"),
+                "FromHighPct": st.column_config.NumberColumn("Desde máx. 52s", format="%.1f%%"),
+                "RSI": st.column_config.NumberColumn("RSI 14", format="%.0f"),
+            }
+        )
+
 
+# --- Live Quote Streaming ---
+QUOTE_HUB_PORT = int(os.environ.get("QUOTE_HUB_PORT", 8765))
+# Interface the hub listens on (loopback unless a reverse proxy on another host needs it)
+QUOTE_HUB_HOST = os.environ.get("QUOTE_HUB_HOST", "127.0.0.1")
+# Browser-visible URL of the hub: required unless the app is opened on localhost
+QUOTE_HUB_URL = os.environ.get("QUOTE_HUB_URL")
+# Origins allowed to read the stream (comma-separated; defaults to the local app)
+QUOTE_HUB_ALLOWED_ORIGINS = [o.strip() for o in os.environ.get("QUOTE_HUB_ALLOWED_ORIGINS", "").split(",") if o.strip()]
+LOCAL_HOSTS = ("localhost", "127.0.0.1")
 
-    # Footer (inside Market tab)
-    with st.expander("🛠️ Estado del Sistema (Debug)"):
+@st.cache_resource
+def get_quote_hub():
+    """
+    Process-wide quote hub: one SSE server shared by every session, and one
+    poller that only runs while a browser is subscribed during market hours.
+    """
+    origins = QUOTE_HUB_ALLOWED_ORIGINS or [f"http://{host}:{st.get_option('server.port')}" for host in LOCAL_HOSTS]
+    hub = quote_hub.QuoteHub(fetch=fetch_interbono_data, interval=20, active=is_market_open)
+    hub.start(host=QUOTE_HUB_HOST, port=QUOTE_HUB_PORT, allowed_origins=origins)
+    return hub
+
+def quote_hub_url():
+    """URL the browser reaches the hub at, or None when it isn't configured for a remote viewer."""
+    if QUOTE_HUB_URL:
+        return QUOTE_HUB_URL
+    host = (st.context.headers.get("Host") or "").split(":")[0]
+    return f"http://{host}:{QUOTE_HUB_PORT}" if host in LOCAL_HOSTS else None
+
+def render_live_quote_table():
+    """Quote table rendered in the browser and updated in place from the hub's SSE stream."""
+    hub_url = quote_hub_url()
+    if hub_url is None:
+        st.info("El modo en vivo requiere configurar `QUOTE_HUB_URL` en este servidor.")
+        render_quote_table()
+        return
+    get_quote_hub()
+    st.markdown("### 🏢 Cotizaciones en Tiempo Real")
+
+    template_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "quote_stream.html")
+    with open(template_path, encoding="utf-8") as f:
+        html = f.read()
+    html = (html
+            .replace("__HUB_URL__", hub_url)
+            .replace("__USD_RATE__", f"{usd_rate or 0:.6f}")
+            .replace("__SORT_KEY__", st.session_state.get("sort_column", "ChangePercent"))
+            .replace("__SORT_ASC__", "true" if st.session_state.get("sort_ascending", False) else "false"))
+
+    rows = len(data['stocks']) if not data['stocks'].empty else 20
+    components.html(html, height=80 + rows * 52, scrolling=True)
+
+
+def render_market_view():
+    if data['status'] == 'error' or data['stocks'].empty:
+        st.warning("No se pudo conectar con el servicio de datos. Intente nuevamente.")
+    else:
+        # Market Summary Hero
+        st.markdown("### 📊 Resumen del Mercado")
+        summary_col, rates_col = st.columns([3, 1.2])
+        with summary_col:
+            render_market_summary()
+        with rates_col:
+            render_rate_card()
+
+        # Live mode streams changed quotes from the hub instead of rerunning on a timer
+        if st.toggle("⚡ En vivo", key="live_quotes", help="Recibe los cambios de precio al instante (streaming)"):
+            render_live_quote_table()
+        else:
+            render_quote_table()
+        render_screener()
+
+
+    # Footer (inside Market view); a toggle rather than an expander, whose body would run on every rerun
+    if st.toggle("🛠️ Estado del Sistema (Debug)", key="show_debug"):
         mode = "PostgreSQL (Nube)" if db_utils.DB_URL else "SQLite (Local)"
         st.write(f"**Modo de Conexión:** `{mode}`")
         st.write(f"**Ubicación/URL:** `{db_utils.DB_NAME if not db_utils.DB_URL else 'Oculta (Secrets)'}`")
@@ -905,75 +1177,76 @@ with tab_market:
             st.error(f"Error de Conexión: {st.session_state.db_error}")
             st.info("💡 Tip: Verifica que tu DATABASE_URL incluya '?sslmode=require' al final.")
         
+        init_db_wrapper()
         st.write(f"**Total Activos:** {len(db_utils.get_holdings())}")
         
         if not db_utils.DB_URL and os.path.exists(db_utils.SQLITE_PATH):
             st.write(f"**Tamaño DB Local:** {os.path.getsize(db_utils.SQLITE_PATH) / 1024:.2f} KB")
 
-# --- TAB: MI PORTAFOLIO ---
-with tab_portfolio:
-    holdings = db_utils.get_holdings()
-
+        if startup.profile.finished:
+            st.write(f"**Arranque del proceso:** {startup.profile.total_ms():.0f} ms hasta el primer render")
+            st.dataframe(
+                pd.DataFrame(startup.profile.breakdown()).rename(columns={"step": "Paso", "at_ms": "Acumulado (ms)", "delta_ms": "Duración (ms)"}),
+                hide_index=True,
+                column_config={c: st.column_config.NumberColumn(format="%.0f") for c in ["Acumulado (ms)", "Duración (ms)"]}
+            )
+
+        fig_stats = get_figure_cache().stats()
+        st.write(f"**Caché de gráficos:** {fig_stats['figures']} figuras ({fig_stats['bytes'] / 1024:.0f} KB), "
+                 f"{fig_stats['hits']} aciertos / {fig_stats['misses']} construcciones")
+
+        flight = market_data.proxy_flight.metrics()
+        st.write(f"**Solicitudes al proxy:** {flight['executed']} enviadas, "
+                 f"{flight['coalesced']} ahorradas por coalescencia de {flight['requests']} llamadas")
+
+        site = bvc_site.home_page.metrics()
+        st.write(f"**bolsadecaracas.com:** {site['downloads']} descargas, {site['not_modified']} sin cambios (304), "
+                 f"{site['throttled']} servidas sin consultar")
+
+        # Latency per request class and source behind the hedge delays (p95 of each)
+        latency_rows = []
+        hedges = 0
+        for hedger in (market_data.proxy_hedge, bvc_site.quote_hedge):
+            hedge_stats = hedger.metrics()
+            hedges += hedge_stats['hedges']
+            for (kind, source), lat in hedge_stats['latency'].items():
+                latency_rows.append({
+                    "Tipo": kind, "Fuente": source, "Muestras": lat['n'], "p50 (ms)": lat['p50'], "p95 (ms)": lat['p95'],
+                    "p99 (ms)": lat['p99'], "Espera (ms)": hedger.delay(source, kind) * 1000,
+                    "Ganadas": hedge_stats['wins'].get(source, 0)
+                })
+        st.write(f"**Solicitudes de respaldo (hedging):** {hedges} disparadas")
+        if latency_rows:
+            st.dataframe(
+                pd.DataFrame(latency_rows), hide_index=True,
+                column_config={c: st.column_config.NumberColumn(format="%.0f") for c in ["p50 (ms)", "p95 (ms)", "p99 (ms)", "Espera (ms)"]}
+            )
+
+# --- VIEW: MI PORTAFOLIO ---
+def format_func(symbol):
+    s_clean = symbol.replace('.CR', '')
+    s_name = symbol_to_name.get(symbol, '')
+    if not s_name or s_name.upper() == s_clean.upper():
+        return s_clean
+    return f"{s_clean} ({s_name})"
+
+
+@st.fragment
+def render_portfolio_holdings():
+    """Portfolio metrics, charts and cards. Reruns on its own interactions or when holdings change."""
+    holdings = load_holdings()
     available_symbols = data['stocks']['Symbol'].tolist() if not data['stocks'].empty else []
-    
-    def format_func(symbol):
-        s_clean = symbol.replace('.CR', '')
-        s_name = symbol_to_name.get(symbol, '')
-        if not s_name or s_name.upper() == s_clean.upper():
-            return s_clean
-        return f"{s_clean} ({s_name})"
-
-
 
     if not holdings:
         st.info("Tu portafolio está vacío. Agrega acciones a continuación para comenzar. (Ahora se guardan en Base de Datos)")
     else:
+        import plotly.graph_objects as go
         # Calculate Logic
-        portfolio_data = []
-        total_value = 0.0
-        total_cost = 0.0
-        
-        for item in holdings:
-            # Get current market data - with proper error handling
-            curr_price = item['avg_cost']  # Default fallback
-            day_change_pct = 0.0
-            
-            # Only try to access market data if stocks data is available and not empty
-            if data['status'] == 'online' and not data['stocks'].empty:
-                try:
-                    market_dat = data['stocks'][data['stocks']['Symbol'] == item['symbol']]
-                    if not market_dat.empty:
-                        curr_price = market_dat['Price'].values[0]
-                        day_change_pct = market_dat['ChangePercent'].values[0]
-                except (KeyError, IndexError):
-                    pass
-            
-            market_val = curr_price * item['qty']
-            cost_val = item['avg_cost'] * item['qty']
-            gain_loss = market_val - cost_val
-            gain_loss_pct = (gain_loss / cost_val * 100) if cost_val > 0 else 0
-            
-            total_value += market_val
-            total_cost += cost_val
-            
-            portfolio_data.append({
-                "id": item['id'],
-                "Symbol": item['symbol'],
-                "Cantidad": item['qty'],
-                "Precio Mercado": curr_price,
-                "Costo Prom.": item['avg_cost'],
-                "Valor Total": market_val,
-                "Ganancia/Pérdida": gain_loss,
-                "G/P %": gain_loss_pct,
-                "Cambio Diario %": day_change_pct,
-                "purchase_date": item.get('purchase_date'),
-                "qty": item['qty'],
-                "avg_cost": item['avg_cost'],
-                "symbol": item['symbol']
-            })
+        portfolio_data, pf_totals = valuation.value_portfolio(holdings, data['stocks'])
+        total_value = pf_totals['value']
+        total_cost = pf_totals['cost']
 
         # --- Premium Portfolio UI (Inspired by Image) ---
-        df_pf = pd.DataFrame(portfolio_data)
         
         # 1. Dashboard Header (Metrics + Chart)
             
@@ -988,7 +1261,6 @@ with tab_portfolio:
             color_hex = "#4ade80" if total_gain >= 0 else "#f87171"
             total_val_usd = total_value / usd_rate if usd_rate > 0 else 0
             total_gain_usd = total_gain / usd_rate if usd_rate > 0 else 0
-            total_cost_usd = total_cost / usd_rate if usd_rate > 0 else 0
             
             st.markdown(f"""
                 <div style="height: 100%; display: flex; flex-direction: column; justify-content: center;">
@@ -1017,65 +1289,96 @@ with tab_portfolio:
                      val_usd = v / usd_rate if usd_rate and usd_rate > 0 else 0
                      text_values.append(f"Bs. {v:,.0f}<br>$ {val_usd:,.2f}")
                 
-                fig_bar = go.Figure(data=[
-                    go.Bar(
-                        x=bar_labels,
-                        y=bar_values,
-                        marker_color=bar_colors,
-                        text=text_values,
-                        textposition='auto',
-                        width=0.6
-                    )
-                ])
+                def build_bar():
+                    fig_bar = go.Figure(data=[
+                        go.Bar(
+                            x=bar_labels,
+                            y=bar_values,
+                            marker_color=bar_colors,
+                            text=text_values,
+                            textposition='auto',
+                            width=0.6
+                        )
+                    ])
                 
-                fig_bar.update_layout(
-                    margin=dict(l=20, r=20, t=30, b=20),
-                    height=200,
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    xaxis=dict(
-                        showgrid=False, 
-                        showline=True, 
-                        linecolor='rgba(255,255,255,0.2)',
-                        tickfont=dict(color='#cbd5e1', size=12)
-                    ),
-                    yaxis=dict(showgrid=True, gridcolor='rgba(255,255,255,0.05)', tickfont=dict(color='#94a3b8', size=10)),
-                    showlegend=False,
-                    bargap=0.4
-                )
+                    fig_bar.update_layout(
+                        margin=dict(l=20, r=20, t=30, b=20),
+                        height=200,
+                        paper_bgcolor='rgba(0,0,0,0)',
+                        plot_bgcolor='rgba(0,0,0,0)',
+                        xaxis=dict(
+                            showgrid=False, 
+                            showline=True, 
+                            linecolor='rgba(255,255,255,0.2)',
+                            tickfont=dict(color='#cbd5e1', size=12)
+                        ),
+                        yaxis=dict(showgrid=True, gridcolor='rgba(255,255,255,0.05)', tickfont=dict(color='#94a3b8', size=10)),
+                        showlegend=False,
+                        bargap=0.4
+                    )
+                    return fig_bar
+
+                fig_bar = cached_figure(("portfolio_bar", bar_values, text_values, bar_colors), build_bar)
                 st.plotly_chart(fig_bar, use_container_width=True, config={'displayModeBar': False})
 
         with d_col3:
             # 3. Portfolio History Chart (Inline)
             symbols = [h['symbol'] for h in holdings]
-            hist_df = fetch_multi_history(symbols)
+            hist_df = fetch_multi_history(symbols, dividends=False)
+            chart_range = st.segmented_control(
+                "Rango", list(history.RANGE_LABELS), default="1Y", key="pf_chart_range", label_visibility="collapsed"
+            ) or "1Y"
             
             if not hist_df.empty:
-                portfolio_history = pd.Series(0, index=hist_df.index)
-                for item in holdings:
-                    if item['symbol'] in hist_df.columns:
-                        portfolio_history += hist_df[item['symbol']] * item['qty']
+                # Value actually held over time (respects each lot's purchase date)
+                portfolio_history = portfolio_history_engine.get_portfolio_history(
+                    holdings, hist_df, holdings_version()
+                )
+
+                # Ranges up to a year are sliced from the loaded history; longer ones
+                # come from the history store (persisted bars), never a per-range fetch
+                range_str = history.RANGE_LABELS[chart_range]
+                if history.RANGES.index(range_str) > history.RANGES.index("1y"):
+                    long_hist = fetch_multi_history(symbols, range_str, dividends=False)
+                    chart_history = portfolio_history_engine.get_portfolio_history(
+                        holdings, long_hist, holdings_version()
+                    ) if not long_hist.empty else portfolio_history
+                else:
+                    chart_history = history.slice_range(portfolio_history, range_str)
+                chart_history = downsample.lttb_frame(chart_history, 'Value')
                 
-                fig_main = go.Figure()
-                fig_main.add_trace(go.Scatter(
-                    x=portfolio_history.index, 
-                    y=portfolio_history.values,
-                    mode='lines',
-                    line=dict(color="#f59e0b", width=2.5),
-                    fill='tozeroy',
-                    fillcolor='rgba(245, 158, 11, 0.03)',
-                    name="Valor"
-                ))
+                def build_main():
+                    fig_main = go.Figure()
+                    fig_main.add_trace(go.Scatter(
+                        x=chart_history.index, 
+                        y=chart_history['Value'].values,
+                        mode='lines',
+                        line=dict(color="#f59e0b", width=2.5),
+                        fill='tozeroy',
+                        fillcolor='rgba(245, 158, 11, 0.03)',
+                        name="Valor"
+                    ))
+                    fig_main.add_trace(go.Scatter(
+                        x=chart_history.index,
+                        y=chart_history['Cost'].values,
+                        mode='lines',
+                        line=dict(color="#64748b", width=1.5, dash='dot'),
+                        name="Invertido"
+                    ))
                 
-                fig_main.update_layout(
-                    margin=dict(l=0, r=0, t=10, b=0),
-                    height=200,
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    xaxis=dict(showgrid=False, color="#475569", tickfont=dict(size=10)),
-                    yaxis=dict(showgrid=False, visible=False),
-                    hovermode="x unified"
-                )
+                    fig_main.update_layout(
+                        margin=dict(l=0, r=0, t=10, b=0),
+                        height=200,
+                        paper_bgcolor='rgba(0,0,0,0)',
+                        plot_bgcolor='rgba(0,0,0,0)',
+                        xaxis=dict(showgrid=False, color="#475569", tickfont=dict(size=10)),
+                        yaxis=dict(showgrid=False, visible=False),
+                        hovermode="x unified",
+                        showlegend=False
+                    )
+                    return fig_main
+
+                fig_main = cached_figure(("portfolio_history", chart_history[['Value', 'Cost']]), build_main)
                 st.plotly_chart(fig_main, use_container_width=True, config={'displayModeBar': False})
             else:
                 st.info("Cargando datos históricos...")
@@ -1124,6 +1427,8 @@ with tab_portfolio:
                             st.plotly_chart(create_sparkline(spark_series, accent_color), use_container_width=True, config={'displayModeBar': False}, key=f"spark_{p_item['id']}")
                         else:
                             st.write("") # Placeholder
+                        if st.button("📈", key=f"chart_btn_{p_item['id']}", help="Ver gráfico e indicadores", type="tertiary"):
+                            symbol_detail(symbol_full)
                             
                     with col_val:
                         val_total_usd = p_item['Valor Total'] / usd_rate if usd_rate > 0 else 0
@@ -1141,7 +1446,69 @@ with tab_portfolio:
             if idx < len(portfolio_data) - 1:
                 st.markdown('<div style="height: 1px; background-color: rgba(255,255,255,0.1); margin: 15px 0;"></div>', unsafe_allow_html=True)
 
-    st.markdown("---")
+        # 4. Risk Analytics (portfolio vs. market and every listed symbol), computed only while shown
+        if st.toggle("📐 Análisis de Riesgo", key="show_risk"):
+            market_hist = fetch_multi_history(available_symbols)
+            pf_hist = portfolio_history if not hist_df.empty else None
+            benchmark = market_index.weighted_history(market_hist)
+            risk_stats, risk_corr = risk.get_risk_report(market_hist, pf_hist, market=benchmark)
+
+            if risk_stats is None:
+                st.info("No hay suficiente historial para calcular métricas de riesgo.")
+            else:
+                pf_row = risk_stats.loc[risk.PORTFOLIO_COLUMN] if risk.PORTFOLIO_COLUMN in risk_stats.index else None
+                if pf_row is not None:
+                    r1, r2, r3, r4 = st.columns(4)
+                    risk_cards = [
+                        (r1, "Volatilidad Anual", f"{pf_row['AnnVolatility'] * 100:.2f}%"),
+                        (r2, "Máx. Caída", f"{pf_row['MaxDrawdown'] * 100:.2f}%"),
+                        (r3, "Sharpe", f"{pf_row['Sharpe']:.2f}"),
+                        (r4, f"Beta vs BVC ({market_index.benchmark_label()})", f"{pf_row['Beta']:.2f}"),
+                    ]
+                    for col, label, value in risk_cards:
+                        with col:
+                            st.markdown(f"""
+                            <div class="metric-card" style="height: 110px;">
+                                <div class="metric-label">{label}</div>
+                                <div class="metric-value" style="font-size: 1.5rem;">{value}</div>
+                            </div>
+                            """, unsafe_allow_html=True)
+
+                table = risk_stats.copy()
+                table.index = [s.replace('.CR', '') for s in table.index]
+                st.dataframe(
+                    table.style.format({
+                        'AnnReturn': '{:.2%}', 'AnnVolatility': '{:.2%}', 'Sharpe': '{:.2f}',
+                        'MaxDrawdown': '{:.2%}', 'Beta': '{:.2f}'
+                    }),
+                    use_container_width=True
+                )
+
+                labels = [s.replace('.CR', '') for s in risk_corr.columns]
+                def build_corr():
+                    fig_corr = go.Figure(go.Heatmap(
+                        z=risk_corr.values, x=labels, y=labels,
+                        zmin=-1, zmax=1, colorscale='RdBu'
+                    ))
+                    fig_corr.update_layout(
+                        margin=dict(l=0, r=0, t=10, b=0),
+                        height=600,
+                        paper_bgcolor='rgba(0,0,0,0)',
+                        plot_bgcolor='rgba(0,0,0,0)',
+                        font=dict(color='#94a3b8', size=9)
+                    )
+                    return fig_corr
+
+                fig_corr = cached_figure(("correlation", risk_corr, labels), build_corr)
+                st.plotly_chart(fig_corr, use_container_width=True, config={'displayModeBar': False})
+
+
+@st.fragment
+def render_add_asset():
+    """Add-asset form. Widget changes rerun only this fragment; a saved purchase reruns the app."""
+    holdings = db_utils.get_holdings()
+    available_symbols = data['stocks']['Symbol'].tolist() if not data['stocks'].empty else []
+
     # 1. Add Asset Section (Now at the bottom)
     with st.expander("➕ Agregar Activo", expanded=not holdings):
         # Interactive Add Asset
@@ -1232,7 +1599,9 @@ with tab_portfolio:
             
         if st.button("Confirmar Compra y Agregar", type="primary", use_container_width=True):
             try:
-                db_utils.add_holding(symbol_sel, qty_input, final_avg_cost, purchase_date.isoformat())
+                # Entered in today's shares; stored as bought (before later splits)
+                split = get_action_book().share_factors([symbol_sel], [purchase_date.isoformat()])[0]
+                db_utils.add_holding(symbol_sel, qty_input / split, final_avg_cost * split, purchase_date.isoformat())
                 st.success(f"✅ Se agregaron {qty_input} acciones a un costo real de Bs. {final_avg_cost:,.4f}")
                 time.sleep(1.5)
                 st.rerun()
@@ -1240,9 +1609,93 @@ with tab_portfolio:
                 st.error(f"Error al guardar: {e}")
 
 
+# --- Alerts (sidebar) ---
+ALERT_KINDS = {
+    "Precio (Bs.)": alerts.PRICE,
+    "Variación diaria (%)": alerts.CHANGE_PCT,
+    "RSI (14)": alerts.RSI,
+    "Caída del portafolio (%)": alerts.DRAWDOWN,
+}
+ALERT_DIRECTIONS = {"Sube a / por encima de": alerts.ABOVE, "Baja a / por debajo de": alerts.BELOW}
+
+def add_alert_rule_from_form():
+    """Add-rule button callback: reads the form widgets from session state."""
+    kind = ALERT_KINDS[st.session_state.alert_kind]
+    if kind == alerts.DRAWDOWN:
+        symbol, direction = alerts.PORTFOLIO_SYMBOL, alerts.ABOVE
+    else:
+        symbol, direction = st.session_state.alert_symbol, ALERT_DIRECTIONS[st.session_state.alert_direction]
+    db_utils.add_alert_rule(kind, symbol, direction, st.session_state.alert_threshold)
+
+@st.fragment(run_every=QUOTES_REFRESH)
+def render_alerts_panel():
+    """Fired alerts (new ones also pop up as toasts) and rule management."""
+    init_db_wrapper()
+    events = db_utils.get_alert_events(limit=10)
+
+    # Toast only what fired since this session last looked
+    last_seen = st.session_state.get("alerts_seen_id")
+    newest = max((e['id'] for e in events), default=0)
+    if last_seen is not None:
+        for e in reversed(events):
+            if e['id'] > last_seen:
+                st.toast(f"🔔 {alerts.describe(e)} (actual: {e['value']:,.2f})")
+    st.session_state.alerts_seen_id = max(newest, last_seen or 0)
+
+    today = datetime.now(VET).strftime("%Y-%m-%d")
+    fired_today = sum(1 for e in events if e['day'] == today)
+    with st.expander(f"🔔 Alertas{f' ({fired_today} hoy)' if fired_today else ''}"):
+        if events:
+            for e in events:
+                st.markdown(
+                    f"<div style='font-size: 0.8rem; color: #cbd5e1;'>{str(e['fired_at'])[5:16]} • {alerts.describe(e)}"
+                    f" <span style='color: #94a3b8;'>(actual: {e['value']:,.2f})</span></div>",
+                    unsafe_allow_html=True
+                )
+        else:
+            st.caption("Sin alertas disparadas.")
+
+        st.markdown("**Reglas**")
+        rules = db_utils.get_alert_rules()
+        for rule in rules:
+            r_col1, r_col2 = st.columns([5, 1])
+            r_col1.caption(alerts.describe(rule))
+            r_col2.button("✕", key=f"del_alert_{rule['id']}", on_click=db_utils.delete_alert_rule, args=(rule['id'],))
+        if not rules:
+            st.caption("No hay reglas configuradas.")
+
+        kind_label = st.selectbox("Tipo", list(ALERT_KINDS), key="alert_kind")
+        if ALERT_KINDS[kind_label] != alerts.DRAWDOWN:
+            st.selectbox("Símbolo", data['stocks']['Symbol'].tolist() if not data['stocks'].empty else [], format_func=format_func, key="alert_symbol")
+            st.selectbox("Condición", list(ALERT_DIRECTIONS), key="alert_direction")
+        st.number_input("Umbral", value=0.0, step=0.5, format="%.2f", key="alert_threshold")
+        st.button("Agregar Regla", on_click=add_alert_rule_from_form, use_container_width=True,
+                  disabled=ALERT_KINDS[kind_label] != alerts.DRAWDOWN and data['stocks'].empty)
+
+
+def render_portfolio_view():
+    init_db_wrapper()
+    render_portfolio_holdings()
+    st.markdown("---")
+    render_add_asset()
 
 
+active_view = st.segmented_control(
+    "Vista",
+    options=[VIEW_MARKET, VIEW_PORTFOLIO],
+    default=VIEW_MARKET,
+    key="active_view",
+    label_visibility="collapsed"
+)
 
+if active_view == VIEW_PORTFOLIO:
+    render_portfolio_view()
+else:
+    render_market_view()
 
+with st.sidebar:
+    render_alerts_panel()
 
 st.markdown("<div style='text-align: center; color: #64748b; font-size: 0.8rem; padding: 20px 0; border-top: 1px solid rgba(255,255,255,0.05); margin-top: 40px;'>Finanzas Pro v3.0 • Desarrollado con ❤️ para el Mercado de Valores</div>", unsafe_allow_html=True)
+
+startup.profile.finish()
@@ -0,0 +1,8 @@
+"""
+Headless core of the Mercado de Valores app.
+
+Market data fetching and parsing, persistence, valuation and analytics live
+here so scripts, cron jobs and the CLI can use them without starting
+Streamlit. Nothing in this package may import streamlit or plotly, and
+submodules are not imported eagerly, to keep `import bvc_core` cheap.
+"""
@@ -0,0 +1,153 @@
+"""
+Alert engine evaluated against each quote snapshot.
+
+Rules are indexed by (symbol, kind, direction) in threshold-sorted arrays, so
+a new value only costs a binary search in the few arrays of its symbol, and
+only values that changed since the previous snapshot are looked at. Alerts
+are edge-triggered: a rule fires when its threshold lies between the
+previous and the new value, not while the condition merely holds, and at
+most once per day. No streamlit imports here.
+"""
+import math
+import threading
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+from bvc_core import risk
+
+# Rule kinds: what the threshold is compared against
+PRICE = "price" # last price (Bs.)
+CHANGE_PCT = "change_pct" # daily change (%)
+RSI = "rsi" # 14-day RSI (0-100)
+DRAWDOWN = "drawdown" # portfolio drawdown from its peak (%), symbol PORTFOLIO_SYMBOL
+
+ABOVE = "above"
+BELOW = "below"
+
+PORTFOLIO_SYMBOL = "PORTFOLIO"
+
+# Quote column behind each per-symbol kind
+KIND_FIELDS = {PRICE: "Price", CHANGE_PCT: "ChangePercent", RSI: "RSI"}
+
+
+def portfolio_drawdown(history):
+    """
+    Current drawdown (%) of a portfolio history frame ('Value', 'Cost'),
+    measured on the time-weighted index so purchases and sales don't count.
+    """
+    if history is None or len(history) < 2:
+        return None
+    index = risk.portfolio_index(history).to_numpy()
+    peak = np.max(index)
+    return float((1.0 - index[-1] / peak) * 100) if peak > 0 else None
+
+
+class AlertEngine:
+    def __init__(self, rules=(), fired=(), day=None, version=None):
+        self._lock = threading.Lock()
+        # (symbol, kind) -> last observed value; kept across days and rule reloads
+        # so a crossing between two snapshots is caught whenever it happens
+        self._last = {}
+        self.load(rules, fired, day, version)
+
+    def load(self, rules, fired=(), day=None, version=None):
+        """
+        Rebuilds the index from rule dicts (id, kind, symbol, direction,
+        threshold). `fired` holds the rule ids already fired on `day`.
+        """
+        grouped = {}
+        for rule in rules:
+            grouped.setdefault((rule['symbol'], rule['kind'], rule['direction']), []).append(
+                (float(rule['threshold']), rule['id'])
+            )
+
+        index = {}
+        for key, entries in grouped.items():
+            entries.sort()
+            index[key] = ([t for t, _ in entries], [rule_id for _, rule_id in entries])
+
+        with self._lock:
+            self.rules = {rule['id']: rule for rule in rules}
+            self._index = index
+            self._day = day
+            self._fired = set(fired)
+            self.version = version
+
+    @property
+    def has_portfolio_rules(self):
+        return any(r['symbol'] == PORTFOLIO_SYMBOL for r in self.rules.values())
+
+    def _triggered(self, symbol, kind, prev, value):
+        """
+        Rule ids whose threshold was crossed going from prev to value: the
+        slice of the sorted thresholds in (prev, value] (above) or [value, prev) (below).
+        """
+        hits = []
+        above = self._index.get((symbol, kind, ABOVE))
+        if above and value > prev:
+            hits.extend(above[1][bisect_right(above[0], prev):bisect_right(above[0], value)])
+        below = self._index.get((symbol, kind, BELOW))
+        if below and value < prev:
+            hits.extend(below[1][bisect_left(below[0], value):bisect_left(below[0], prev)])
+        return hits
+
+    def evaluate(self, stocks, now, portfolio_drawdown=None):
+        """
+        Evaluates a quote snapshot (DataFrame with Symbol, Price, ChangePercent, RSI)
+        and, optionally, the current portfolio drawdown, against the previous
+        observations. The first value seen for a symbol only sets its baseline.
+        Returns the new events as dicts (rule_id, kind, symbol, direction,
+        threshold, value, day, fired_at).
+        """
+        day = now.strftime("%Y-%m-%d")
+        observations = []
+        if stocks is not None and not stocks.empty:
+            symbols = stocks['Symbol'].tolist()
+            for kind, field in KIND_FIELDS.items():
+                if field in stocks.columns:
+                    observations.extend(((s, kind), v) for s, v in zip(symbols, stocks[field].tolist()))
+        if portfolio_drawdown is not None:
+            observations.append(((PORTFOLIO_SYMBOL, DRAWDOWN), portfolio_drawdown))
+
+        events = []
+        with self._lock:
+            if day != self._day:
+                # New trading day: every rule may fire again
+                self._day = day
+                self._fired = set()
+
+            for (symbol, kind), value in observations:
+                if value is None or not math.isfinite(value):
+                    continue
+                prev = self._last.get((symbol, kind))
+                self._last[(symbol, kind)] = value
+                if prev is None or prev == value:
+                    continue
+
+                for rule_id in self._triggered(symbol, kind, prev, value):
+                    if rule_id in self._fired:
+                        continue
+                    self._fired.add(rule_id)
+                    rule = self.rules[rule_id]
+                    events.append({
+                        "rule_id": rule_id,
+                        "kind": kind,
+                        "symbol": symbol,
+                        "direction": rule['direction'],
+                        "threshold": rule['threshold'],
+                        "value": float(value),
+                        "day": day,
+                        "fired_at": now,
+                    })
+        return events
+
+
+def describe(rule_or_event):
+    """Short Spanish description, e.g. 'BNC.CR precio ≥ 12.50'."""
+    kind = rule_or_event['kind']
+    label = {PRICE: "precio", CHANGE_PCT: "variación diaria", RSI: "RSI", DRAWDOWN: "caída desde máximo"}.get(kind, kind)
+    op = "≥" if rule_or_event['direction'] == ABOVE else "≤"
+    unit = "" if kind in (PRICE, RSI) else "%"
+    symbol = "Portafolio" if rule_or_event['symbol'] == PORTFOLIO_SYMBOL else rule_or_event['symbol'].replace('.CR', '')
+    return f"{symbol} {label} {op} {rule_or_event['threshold']:,.2f}{unit}"
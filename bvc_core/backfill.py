@@ -0,0 +1,152 @@
+"""
+Historical backfill: pulls the maximum daily range (and, optionally, intraday
+bars) for every symbol into the local store in one bounded batch, instead of
+leaving it to lazy per-user fetches.
+
+Symbols are fetched concurrently under one global rate limit, with retries.
+Each (symbol, interval) is checkpointed in backfill_progress as soon as it
+lands, so re-running after an interruption skips what is already done.
+Daily bars go to the same store the app reads (daily_bars, depth "max"),
+as traded, along with the symbol's splits and dividends.
+No streamlit imports here.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from bvc_core import corporate_actions, db, history, market_data
+
+logger = logging.getLogger(__name__)
+
+DAILY = "1d"
+# Longest range Yahoo serves for each intraday interval
+INTRADAY_RANGES = {"1m": "7d", "5m": "60d", "15m": "60d", "30m": "60d", "60m": "730d", "1h": "730d"}
+
+# Statuses that count as finished on a resumed run ("empty": a well-formed chart
+# with no timestamps, i.e. the source has no bars for it)
+FINISHED = ("done", "empty")
+
+
+class RateLimiter:
+    """Token bucket shared by every worker: at most `rate` calls per second, bursts up to `burst`."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def fetch_bars(symbol, interval=DAILY, timeout=30):
+    """
+    All bars the source has for one symbol and interval, plus its corporate
+    actions (daily only). Returns (bars, actions); bars is empty only for a
+    chart with no timestamps. Raises on HTTP errors and on missing or
+    malformed payloads (no chart, or timestamps without prices), which are
+    transient more often than not and must not be checkpointed as empty.
+    """
+    if interval == DAILY:
+        url = market_data.chart_url(symbol, range="max", interval=interval, events="div,splits")
+    else:
+        url = market_data.chart_url(symbol, range=INTRADAY_RANGES[interval], interval=interval)
+    results = market_data.post_chart_urls([url], timeout=timeout, kind="backfill")
+    payload = results[0] if results else None
+    chart = market_data.chart_result(payload)
+    if not chart.get('meta'):
+        error = ((payload or {}).get('chart') or {}).get('error')
+        raise ValueError(f"no chart payload for {symbol}" + (f": {error}" if error else ""))
+
+    frame = market_data.parse_ohlcv(payload)[1]
+    if not frame.empty:
+        frame = frame.dropna(subset=["Close"])
+    if frame.empty and chart.get('timestamp'):
+        raise ValueError(f"chart for {symbol} has timestamps but no prices")
+    actions = market_data.parse_corporate_actions(payload) if interval == DAILY else None
+    return frame, actions
+
+
+def backfill_symbol(symbol, interval, limiter, retries=3):
+    """Fetches, stores and checkpoints one (symbol, interval). Returns (status, bars, error)."""
+    error = None
+    for attempt in range(retries):
+        limiter.acquire()
+        try:
+            frame, actions = fetch_bars(symbol, interval)
+            break
+        except Exception as e:
+            error = str(e)
+            logger.warning(f"Backfill {symbol} {interval} attempt {attempt + 1} failed: {e}")
+            time.sleep(2 ** attempt)
+    else:
+        db.save_backfill_progress(symbol, interval, "failed", error=error)
+        return "failed", 0, error
+
+    if frame.empty:
+        status = "empty"
+    elif interval == DAILY:
+        status = "done"
+        db.save_daily_bars({symbol: corporate_actions.unadjust(history.by_day(frame), actions)}, "max", time.time())
+        if actions is not None and not actions.empty:
+            db.save_corporate_actions({symbol: actions})
+    else:
+        status = "done"
+        db.save_intraday_bars(symbol, interval, frame)
+    db.save_backfill_progress(symbol, interval, status, bars=len(frame))
+    return status, len(frame), None
+
+
+def run(symbols, intervals=(DAILY,), workers=4, rate=2.0, retries=3, force=False, progress=None):
+    """
+    Backfills every (symbol, interval) not checkpointed as finished (all of
+    them with force=True). `progress(done, total, symbol, interval, status,
+    bars, error)` is called as each one completes. Returns status counts,
+    including 'skipped' for checkpoints left from earlier runs.
+    """
+    for interval in intervals:
+        if interval != DAILY and interval not in INTRADAY_RANGES:
+            raise ValueError(f"Unsupported interval: {interval}")
+
+    if force:
+        db.clear_backfill_progress()
+    checkpoints = db.get_backfill_progress()
+    symbols = list(dict.fromkeys(symbols))
+    jobs = [
+        (symbol, interval) for symbol in symbols for interval in intervals
+        if checkpoints.get((symbol, interval), {}).get("status") not in FINISHED
+    ]
+    counts = Counter(skipped=len(symbols) * len(intervals) - len(jobs))
+
+    limiter = RateLimiter(rate, burst=workers)
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {pool.submit(backfill_symbol, s, i, limiter, retries): (s, i) for s, i in jobs}
+        for done, future in enumerate(as_completed(futures), start=1):
+            symbol, interval = futures[future]
+            try:
+                status, bars, error = future.result()
+            except Exception as e:
+                status, bars, error = "failed", 0, str(e)
+            counts[status] += 1
+            if progress:
+                progress(done, len(jobs), symbol, interval, status, bars, error)
+    except KeyboardInterrupt:
+        # Finished symbols are already checkpointed; drop the queued ones
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+    return dict(counts)
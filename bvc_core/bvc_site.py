@@ -0,0 +1,424 @@
+"""
+Bolsa de Caracas website (bolsadecaracas.com) as a second quote source.
+
+The home page publishes the official IBC and the stock table. It is fetched
+with conditional GETs (ETag / Last-Modified), so an unchanged page costs a
+304 and no parsing, and at most once per MIN_INTERVAL however many callers
+ask. Rows are parsed into the same schema as market_data.fetch_quotes, and
+merge_quotes() combines both sources symbol by symbol, falling back to the
+site for whatever the proxy did not price. fetch_merged() also hedges the
+proxy with the site when the proxy is slower than usual.
+
+Parsing uses lxml when it is installed and a single-pass stdlib parser
+otherwise. No streamlit imports here.
+"""
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import Future
+from datetime import datetime
+from html.parser import HTMLParser
+
+import pandas as pd
+import requests
+
+from bvc_core import market_data
+from bvc_core.config import BVC_URL, SYMBOLS, VET
+from bvc_core.hedge import Hedger
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between two requests for the page (its quotes move slower than that)
+MIN_INTERVAL = 30
+
+SOURCE_PROXY = "yahoo"
+SOURCE_SITE = "bvc"
+
+# Quote columns recognized by header text (accents stripped, lowercase), most specific first
+HEADER_KEYWORDS = [
+    ("Symbol", ("simbolo", "symbol", "codigo", "ticker")),
+    ("Name", ("nombre", "empresa", "emisora", "descripcion")),
+    ("ChangePercent", ("var %", "var. %", "var.%", "variacion %", "% var", "%")),
+    ("Change", ("variacion", "var.", "var", "cambio")),
+    ("Open", ("apertura", "abre")),
+    ("DayHigh", ("maximo", "max")),
+    ("DayLow", ("minimo", "min")),
+    ("Volume", ("volumen", "cantidad", "titulos")),
+    ("Price", ("precio", "ultimo", "cierre")),
+]
+
+# Text the IBC value follows (or precedes) on the page
+IBC_ANCHORS = ("ibc", "indice bursatil caracas", "indices")
+
+_THOUSANDS = re.compile(r"^\d{1,3}(\.\d{3})+$")
+
+
+def _plain(text):
+    """Lowercase text without accents or repeated whitespace, for matching labels."""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    return " ".join(text.lower().split())
+
+
+def parse_number(text):
+    """
+    Number in the site's es-VE format ("3.358,29", "-1,25 %", "1.200") or
+    plain ("12.5"). None when the text isn't one.
+    """
+    text = (text or "").replace("%", "").replace("Bs", "").replace("\xa0", "").replace(" ", "").lstrip("+")
+    if not text:
+        return None
+    if "," in text:
+        text = text.replace(".", "").replace(",", ".")
+    elif _THOUSANDS.match(text.lstrip("-")):
+        text = text.replace(".", "")
+    try:
+        value = float(text)
+    except ValueError:
+        return None
+    return value if math.isfinite(value) else None
+
+
+def yahoo_symbol(code):
+    """The site's ticker ("MVZ.A", "BNC") as the proxy's symbol ("MVZ-A.CR", "BNC.CR")."""
+    code = code.strip().upper()
+    if code.endswith(".CR"):
+        return code
+    return re.sub(r"[.\s]+", "-", code) + ".CR"
+
+
+class _PageParser(HTMLParser):
+    """Stdlib fallback: collects table rows (cell texts) and the page's text tokens in one pass."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.tables = []
+        self.tokens = []
+        self._row = None
+        self._cell = None
+        self._skip = 0 # depth inside script/style
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("script", "style"):
+            self._skip += 1
+        elif tag == "table":
+            self.tables.append([])
+        elif tag == "tr" and self.tables:
+            self._row = []
+            self.tables[-1].append(self._row)
+        elif tag in ("td", "th") and self._row is not None:
+            self._cell = []
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style"):
+            self._skip = max(0, self._skip - 1)
+        elif tag in ("td", "th") and self._cell is not None:
+            self._row.append(" ".join("".join(self._cell).split()))
+            self._cell = None
+        elif tag == "tr":
+            self._row = None
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        if self._cell is not None:
+            self._cell.append(data)
+        text = data.strip()
+        if text:
+            self.tokens.append(text)
+
+
+def _extract(content):
+    """(tables as lists of row cell texts, text tokens in document order) of an HTML page."""
+    # Decoded here for both parsers: lxml would read bytes without a <meta charset> as latin-1
+    text = content.decode("utf-8", "replace") if isinstance(content, bytes) else content
+    try:
+        import lxml.html
+    except ImportError:
+        parser = _PageParser()
+        parser.feed(text)
+        parser.close()
+        return parser.tables, parser.tokens
+
+    doc = lxml.html.fromstring(text)
+    tables = [
+        [[" ".join(cell.text_content().split()) for cell in row.xpath("./th|./td")] for row in table.xpath(".//tr")]
+        for table in doc.xpath("//table")
+    ]
+    tokens = [t.strip() for t in doc.xpath("//text()[normalize-space() and not(ancestor::script) and not(ancestor::style)]")]
+    return tables, tokens
+
+
+def _columns(header):
+    """Maps quote fields to positions in a header row (each field and position used once)."""
+    labels = [_plain(h) for h in header]
+    found = {}
+    for field, keywords in HEADER_KEYWORDS:
+        for keyword in keywords:
+            position = next((i for i, label in enumerate(labels) if i not in found.values() and keyword in label), None)
+            if position is not None:
+                found[field] = position
+                break
+    return found
+
+
+def _quote_rows(tables):
+    """Quote rows of every table that has a symbol and a price column."""
+    rows = []
+    for table in tables:
+        header_at = next((i for i, row in enumerate(table) if {"Symbol", "Price"} <= set(_columns(row))), None)
+        if header_at is None:
+            continue
+        columns = _columns(table[header_at])
+        for cells in table[header_at + 1:]:
+            if len(cells) <= max(columns.values()):
+                continue
+            values = {field: cells[i] for field, i in columns.items()}
+            price = parse_number(values["Price"])
+            if not values["Symbol"] or not price:
+                continue
+            rows.append(_quote_row(values, price))
+    return rows
+
+
+def _quote_row(values, price):
+    """A row in market_data.parse_quote's schema; missing fields are derived or defaulted like there."""
+    def number(field):
+        return parse_number(values[field]) if field in values else None
+
+    change, change_pct = number("Change"), number("ChangePercent")
+    if change is None and change_pct is not None:
+        change = price - price / (1 + change_pct / 100)
+    elif change_pct is None and change is not None and price != change:
+        change_pct = change / (price - change) * 100
+    prev_close = price - (change or 0.0)
+    symbol = yahoo_symbol(values["Symbol"])
+    return {
+        "Symbol": symbol,
+        "Name": (values.get("Name") or symbol).title(),
+        "Price": price,
+        "Change": change or 0.0,
+        "ChangePercent": change_pct or 0.0,
+        "Volume": number("Volume") or 0,
+        "Open": number("Open") or prev_close,
+        "DayHigh": number("DayHigh") or 0.0,
+        "DayLow": number("DayLow") or 0.0,
+    }
+
+
+def _ibc(tokens):
+    """The official IBC ({'value', 'change_pct'}) from the text next to its label, or None."""
+    plain = [_plain(t) for t in tokens]
+    for anchor in IBC_ANCHORS:
+        for i, text in enumerate(plain):
+            if not re.search(rf"\b{anchor}\b", text):
+                continue
+            # The level is the first large number after the label (or just before it)
+            window = list(range(i + 1, min(i + 7, len(tokens)))) + list(range(i - 1, max(i - 4, -1), -1))
+            for j in window:
+                value = parse_number(tokens[j])
+                if value is not None and value >= 100 and "%" not in tokens[j]:
+                    pct = next((parse_number(tokens[k]) for k in range(j + 1, min(j + 4, len(tokens))) if "%" in tokens[k]), None)
+                    return {"value": value, "change_pct": pct or 0.0}
+    return None
+
+
+def parse_page(content):
+    """Quote rows (market_data.parse_quote schema) and the official IBC of the home page HTML."""
+    tables, tokens = _extract(content)
+    return _quote_rows(tables), _ibc(tokens)
+
+
+class PageSource:
+    """
+    One page fetched conditionally: keeps the last validators and parsed
+    result, asks at most once per min_interval, and coalesces concurrent
+    refreshes into one, run on its own thread so callers may skip waiting
+    for it. A 304 reuses the parsed result as is.
+    """
+
+    def __init__(self, url, parse, min_interval=MIN_INTERVAL, timeout=10):
+        self.url = url
+        self.parse = parse
+        self.min_interval = min_interval
+        self.timeout = timeout
+        self._validators = {} # ETag / Last-Modified of the parsed version
+        self._parsed = None
+        self._checked_at = 0.0
+        self._pending = None # Future of the refresh in flight, shared by every caller
+        self._lock = threading.Lock()
+        self.downloads = 0
+        self.not_modified = 0
+        self.throttled = 0
+
+    def get(self, wait=True):
+        """
+        The parsed page, refreshed if min_interval has passed. Raises on
+        network or HTTP errors. With wait=False a due refresh runs in the
+        background (callers that wait later join it) and the last parsed
+        page, or None, is returned at once.
+        """
+        with self._lock:
+            if self._parsed is not None and time.monotonic() - self._checked_at < self.min_interval:
+                self.throttled += 1
+                return self._parsed
+            pending = self._pending
+            if pending is None:
+                pending = self._pending = Future()
+                threading.Thread(target=self._background, args=(pending,), name="bvc-site", daemon=True).start()
+            if not wait:
+                return self._parsed
+        return pending.result()
+
+    def _background(self, pending):
+        try:
+            result = self._refresh()
+        except Exception as e:
+            logger.error(f"Error refreshing {self.url}: {e}")
+            with self._lock:
+                self._pending = None
+            pending.set_exception(e)
+            return
+        with self._lock:
+            self._pending = None
+        pending.set_result(result)
+
+    def _refresh(self):
+        with self._lock:
+            headers = {"User-Agent": market_data.HEADERS["User-Agent"]}
+            if self._parsed is not None and "ETag" in self._validators:
+                headers["If-None-Match"] = self._validators["ETag"]
+            if self._parsed is not None and "Last-Modified" in self._validators:
+                headers["If-Modified-Since"] = self._validators["Last-Modified"]
+
+        response = requests.get(self.url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304 and self._parsed is not None:
+            with self._lock:
+                self._checked_at = time.monotonic()
+                self.not_modified += 1
+                return self._parsed
+        response.raise_for_status()
+
+        parsed = self.parse(response.content)
+        with self._lock:
+            self._validators = {k: response.headers[k] for k in ("ETag", "Last-Modified") if k in response.headers}
+            self._parsed = parsed
+            self._checked_at = time.monotonic()
+            self.downloads += 1
+        return parsed
+
+    def metrics(self):
+        with self._lock:
+            return {"downloads": self.downloads, "not_modified": self.not_modified, "throttled": self.throttled}
+
+
+home_page = PageSource(BVC_URL, parse_page)
+
+
+def fetch_quotes(symbols=SYMBOLS, wait=True):
+    """
+    Quote snapshot from the site, shaped like market_data.fetch_quotes, plus
+    'ibc' (the official index, None when not found). With wait=False the
+    last parsed page is used and a due refresh runs in the background.
+    """
+    now = datetime.now(VET)
+    try:
+        page = home_page.get(wait)
+    except Exception as e:
+        logger.error(f"Error fetching bolsadecaracas.com: {e}")
+        return {"status": "error", "error": str(e), "stocks": pd.DataFrame(), "date": now.strftime("%d/%m/%Y"), "ibc": None}
+    if page is None:
+        return {"status": "error", "error": "page not loaded yet", "stocks": pd.DataFrame(), "date": now.strftime("%d/%m/%Y"), "ibc": None}
+    rows, ibc = page
+
+    wanted = set(symbols)
+    return {
+        "status": "online",
+        "stocks": pd.DataFrame([r for r in rows if r["Symbol"] in wanted]),
+        "date": now.strftime("%d/%m/%Y %H:%M:%S"),
+        "ibc": ibc,
+    }
+
+
+def _priced(stocks):
+    """Rows with a usable price."""
+    if "Price" not in stocks.columns:
+        return pd.Series(False, index=stocks.index, dtype=bool)
+    price = pd.to_numeric(stocks["Price"], errors="coerce")
+    return price.notna() & (price > 0)
+
+
+def merge_quotes(primary, secondary, symbols=None):
+    """
+    Combines two snapshots symbol by symbol: a symbol's row comes from
+    primary when primary priced it, else from secondary; a 'Source' column
+    says which. Online when either snapshot was. 'ibc' comes from secondary.
+    Rows follow `symbols` order when given.
+    """
+    p_stocks = primary["stocks"] if primary.get("status") == "online" else pd.DataFrame()
+    s_stocks = secondary["stocks"] if secondary.get("status") == "online" else pd.DataFrame()
+    p_ok, s_ok = _priced(p_stocks), _priced(s_stocks)
+
+    parts = []
+    if p_ok.any():
+        parts.append(p_stocks[p_ok].assign(Source=SOURCE_PROXY))
+    covered = set(p_stocks["Symbol"][p_ok]) if p_ok.any() else set()
+    if s_ok.any():
+        fallback = s_stocks[s_ok & ~s_stocks["Symbol"].isin(covered)]
+        parts.append(fallback.assign(Source=SOURCE_SITE))
+        covered.update(fallback["Symbol"])
+    if not p_stocks.empty:
+        # Unpriced everywhere: keep the proxy's row so the symbol still shows
+        parts.append(p_stocks[~p_ok & ~p_stocks["Symbol"].isin(covered)].assign(Source=SOURCE_PROXY))
+
+    stocks = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+    if symbols is not None and not stocks.empty:
+        order = {s: i for i, s in enumerate(symbols)}
+        stocks = stocks.sort_values("Symbol", key=lambda s: s.map(order).fillna(len(order)), kind="stable", ignore_index=True)
+
+    online = [d for d in (primary, secondary) if d.get("status") == "online"]
+    if not online:
+        return {
+            "status": "error",
+            "error": "; ".join(str(d.get("error")) for d in (primary, secondary)),
+            "stocks": stocks,
+            "date": primary.get("date", ""),
+            "ibc": None,
+        }
+    return {"status": "online", "stocks": stocks, "date": online[0]["date"], "ibc": secondary.get("ibc")}
+
+
+# Proxy first, the site once the proxy has taken longer than its p95; see quote_hedge.metrics()
+quote_hedge = Hedger()
+
+
+def _usable(data):
+    return data.get("status") == "online" and not data["stocks"].empty
+
+
+def fetch_merged(symbols=SYMBOLS):
+    """
+    Proxy quotes with per-symbol failover to the site, plus the official IBC.
+    If the proxy is slower than usual (e.g. a cold start) the site is asked
+    too, and when it answers first its snapshot is used on its own.
+
+    The site is never waited for after the proxy unless the proxy left
+    symbols unpriced: its page refreshes in the background, overlapping the
+    proxy call, and the last parsed copy supplies the IBC.
+    """
+    home_page.get(wait=False)
+    source, data = quote_hedge.run([
+        (SOURCE_PROXY, lambda: market_data.fetch_quotes(symbols)),
+        (SOURCE_SITE, lambda: fetch_quotes(symbols)),
+    ], valid=_usable, kind="quotes", timeout=10)
+    if not _usable(data):
+        # Neither source answered: run() reports the proxy's outcome, keep its error
+        return {**data, "ibc": None}
+    if source == SOURCE_PROXY:
+        priced = set(data["stocks"]["Symbol"][_priced(data["stocks"])])
+        # Joins the refresh started above when the site has symbols to fill in
+        return merge_quotes(data, fetch_quotes(symbols, wait=not priced.issuperset(symbols)), symbols)
+    proxy = {"status": "error", "error": "proxy unavailable or slower than the site", "stocks": pd.DataFrame(), "date": data["date"]}
+    return merge_quotes(proxy, data, symbols)
@@ -0,0 +1,316 @@
+"""
+Shared cache for the data-fetch functions, so every worker process on a host
+(or every replica, with Redis) reuses one cached copy instead of holding and
+fetching its own.
+
+The backend speaks a small Redis-compatible subset: get, set(ex=, nx=),
+delete, exists, flushdb. CACHE_URL selects it:
+
+    sqlite:///path/to/cache.db   local file store with TTLs, a size limit and LRU eviction (default)
+    redis://host:6379/0          a Redis server (needs the `redis` package)
+    none                         disabled: calls go straight to the function
+
+On a miss, one caller takes a short lock key and computes the value while
+the others wait for it, so upstream calls are deduplicated across workers.
+
+Values are pickled and signed with CACHE_SECRET (HMAC-SHA256); entries
+whose signature doesn't verify are treated as misses, so whoever can write
+to a shared Redis can't make the app unpickle arbitrary data. Redis
+requires CACHE_SECRET; the SQLite file is as trusted as the app directory,
+so there it is optional. No streamlit imports here.
+"""
+import functools
+import hashlib
+import hmac
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+
+from bvc_core.db import DB_DIR
+
+logger = logging.getLogger(__name__)
+
+CACHE_URL = os.environ.get("CACHE_URL") or f"sqlite:///{os.path.join(DB_DIR, 'cache.db')}"
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# A hit refreshes the entry's LRU position only if it is older than this, so
+# hot keys read by every worker don't each take the write lock
+LRU_TOUCH_SECONDS = 60
+KEY_PREFIX = "bvc:"
+CACHE_SECRET = os.environ.get("CACHE_SECRET", "")
+_SIGNATURE_BYTES = hashlib.sha256().digest_size
+
+_MISS = object()
+
+
+class SQLiteCache:
+    """
+    File-backed cache with per-key TTLs, a total size limit and LRU eviction.
+    Access times are only as fine as LRU_TOUCH_SECONDS.
+    """
+
+    def __init__(self, path, max_bytes=CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+
+    def _conn(self):
+        # One connection per thread; WAL lets readers in other processes proceed during writes
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute("SELECT value, expires_at, accessed_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] is not None and row[1] <= now:
+            conn.execute("DELETE FROM cache WHERE key = ? AND expires_at <= ?", (key, now))
+            return None
+        if now - row[2] > LRU_TOUCH_SECONDS:
+            conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key, value, ex=None, nx=False):
+        """Stores value (bytes) for ex seconds. With nx=True only if the key is absent; returns whether it was set."""
+        if isinstance(value, str):
+            value = value.encode()
+        now = time.time()
+        expires_at = now + ex if ex else None
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if nx:
+                conn.execute("DELETE FROM cache WHERE key = ? AND expires_at <= ?", (key, now))
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO cache (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value), expires_at, now)
+                )
+                stored = cursor.rowcount == 1
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value), expires_at, now)
+                )
+                stored = True
+            if stored:
+                self._evict(conn, now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return stored
+
+    def _evict(self, conn, now):
+        """Drops expired entries, then the least recently used ones until under max_bytes."""
+        conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM cache ORDER BY accessed_at"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM cache WHERE key = ?", victims)
+
+    def delete(self, *keys):
+        conn = self._conn()
+        removed = 0
+        for key in keys:
+            removed += conn.execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount
+        return removed
+
+    def delete_if(self, key, value):
+        """Deletes key only while it still holds value (bytes or str); returns whether it did."""
+        if isinstance(value, str):
+            value = value.encode()
+        return self._conn().execute("DELETE FROM cache WHERE key = ? AND value = ?", (key, value)).rowcount == 1
+
+    def exists(self, *keys):
+        return sum(1 for key in keys if self.get(key) is not None)
+
+    def scan_iter(self, match="*"):
+        pattern = match.replace("*", "%")
+        return [row[0] for row in self._conn().execute("SELECT key FROM cache WHERE key LIKE ?", (pattern,))]
+
+    def flushdb(self):
+        self._conn().execute("DELETE FROM cache")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """The process-wide backend for CACHE_URL (None when caching is disabled or unavailable)."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = _connect(CACHE_URL) or False
+        return _backend or None
+
+
+def _connect(url):
+    try:
+        if url == "none":
+            return None
+        if url.startswith("redis://") or url.startswith("rediss://"):
+            if not CACHE_SECRET:
+                logger.error("CACHE_SECRET is required to cache in Redis; caching disabled")
+                return None
+            import redis
+            return redis.Redis.from_url(url)
+        if url.startswith("sqlite:///"):
+            return SQLiteCache(url[len("sqlite:///"):])
+        logger.error(f"Unsupported CACHE_URL: {url}")
+    except Exception as e:
+        logger.error(f"Cache backend unavailable ({e}); caching disabled")
+    return None
+
+
+def _key(name, args, kwargs):
+    digest = hashlib.sha1(pickle.dumps((args, sorted(kwargs.items())))).hexdigest()
+    return f"{KEY_PREFIX}{name}:{digest}"
+
+
+# Redis counterpart of SQLiteCache.delete_if, atomic on the server
+_DELETE_IF_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _release(backend, lock_key, token):
+    """Drops a single-flight lock only if it is still ours (it may have expired and been taken by another worker)."""
+    if isinstance(backend, SQLiteCache):
+        backend.delete_if(lock_key, token)
+    else:
+        backend.eval(_DELETE_IF_SCRIPT, 1, lock_key, token)
+
+
+def _sign(payload):
+    return hmac.new(CACHE_SECRET.encode(), payload, hashlib.sha256).digest()
+
+
+def _dumps(value):
+    payload = pickle.dumps(value)
+    return _sign(payload) + payload
+
+
+def _loads(raw):
+    """Unpickles a _dumps() entry; raises ValueError, without unpickling, if its signature doesn't match."""
+    signature, payload = raw[:_SIGNATURE_BYTES], raw[_SIGNATURE_BYTES:]
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise ValueError("signature mismatch")
+    return pickle.loads(payload)
+
+
+def _read(backend, key):
+    try:
+        raw = backend.get(key)
+        return _loads(raw) if raw is not None else _MISS
+    except Exception as e:
+        logger.error(f"Cache read failed for {key}: {e}")
+        return _MISS
+
+
+def cached(ttl, lock_timeout=30):
+    """
+    Caches a function's (picklable) result in the shared backend for ttl
+    seconds, keyed by its qualified name and arguments. The wrapper's
+    clear(*args, **kwargs) drops the entry of those arguments only.
+    """
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            backend = get_backend()
+            if backend is None:
+                return func(*args, **kwargs)
+
+            key = _key(name, args, kwargs)
+            value = _read(backend, key)
+            if value is not _MISS:
+                return value
+
+            # Single flight across workers: whoever sets the lock computes, the rest wait for its result
+            lock_key, token = f"{key}:lock", uuid.uuid4().hex
+            deadline = time.time() + lock_timeout
+            owns_lock = False
+            try:
+                while not (owns_lock := backend.set(lock_key, token, ex=lock_timeout, nx=True)):
+                    time.sleep(0.1)
+                    value = _read(backend, key)
+                    if value is not _MISS:
+                        return value
+                    if time.time() > deadline:
+                        break
+            except Exception as e:
+                logger.error(f"Cache lock failed for {key}: {e}")
+
+            try:
+                value = func(*args, **kwargs)
+                try:
+                    backend.set(key, _dumps(value), ex=ttl)
+                except Exception as e:
+                    logger.error(f"Cache write failed for {key}: {e}")
+                return value
+            finally:
+                if owns_lock:
+                    try:
+                        _release(backend, lock_key, token)
+                    except Exception:
+                        pass
+
+        def clear_entry(*args, **kwargs):
+            backend = get_backend()
+            if backend is None:
+                return
+            try:
+                backend.delete(_key(name, args, kwargs))
+            except Exception as e:
+                logger.error(f"Cache clear failed for {name}: {e}")
+
+        wrapper.clear = clear_entry
+        return wrapper
+    return decorator
+
+
+def clear():
+    """Drops every entry written by cached() (other keys in a shared Redis are left alone)."""
+    backend = get_backend()
+    if backend is None:
+        return
+    try:
+        keys = list(backend.scan_iter(match=f"{KEY_PREFIX}*"))
+        if keys:
+            backend.delete(*keys)
+    except Exception as e:
+        logger.error(f"Cache clear failed: {e}")
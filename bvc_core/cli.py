@@ -0,0 +1,153 @@
+"""
+Command-line interface: python -m bvc_core <command> [options]
+
+    quotes      Print the current quote table
+    portfolio   Value the portfolio stored in the DB at current prices
+    backfill    Seed the local history store with maximum-range bars
+
+quotes and portfolio accept --format table|json|csv and --output FILE to export a
+report. Heavy modules (pandas, requests) are imported inside the commands so
+`--help` and argument errors return instantly.
+"""
+import argparse
+import json
+import logging
+import sys
+
+QUOTE_COLUMNS = ["Symbol", "Name", "Price", "Change", "ChangePercent", "Volume", "Open", "DayHigh", "DayLow"]
+POSITION_COLUMNS = ["Symbol", "Cantidad", "Precio Mercado", "Costo Prom.", "Valor Total", "Ganancia/Pérdida", "G/P %", "Cambio Diario %", "purchase_date"]
+
+
+def _emit(frame, fmt, output, extra=None):
+    """Writes a DataFrame as a text table, JSON records or CSV to stdout or a file."""
+    if fmt == "json":
+        payload = {"rows": json.loads(frame.to_json(orient="records"))}
+        if extra:
+            payload.update(extra)
+        text = json.dumps(payload, indent=2, ensure_ascii=False)
+    elif fmt == "csv":
+        text = frame.to_csv(index=False)
+    else:
+        text = frame.to_string(index=False, float_format=lambda v: f"{v:,.2f}")
+        if extra:
+            text += "\n\n" + "\n".join(f"{k}: {v:,.2f}" if isinstance(v, float) else f"{k}: {v}" for k, v in extra.items())
+
+    if output:
+        with open(output, "w", encoding="utf-8", newline="") as f:
+            f.write(text if text.endswith("\n") else text + "\n")
+    else:
+        print(text)
+
+
+def cmd_quotes(args):
+    from bvc_core import bvc_site
+    from bvc_core.config import SYMBOLS
+
+    symbols = [s if s.endswith(".CR") else f"{s}.CR" for s in args.symbols] if args.symbols else SYMBOLS
+    data = bvc_site.fetch_merged(symbols)
+    if data["status"] != "online":
+        print(f"Error fetching quotes: {data.get('error')}", file=sys.stderr)
+        return 1
+
+    stocks = data["stocks"]
+    if not stocks.empty:
+        stocks = stocks[QUOTE_COLUMNS].sort_values(args.sort, ascending=args.ascending)
+    _emit(stocks, args.format, args.output, {"date": data["date"]} if args.format == "json" else None)
+    return 0
+
+
+def cmd_portfolio(args):
+    import pandas as pd
+    from bvc_core import corporate_actions, db, market_data, valuation
+
+    db.init_db()
+    # Quantities and costs in today's shares (splits since purchase)
+    holdings = corporate_actions.adjust_holdings(db.get_holdings(), corporate_actions.ActionBook(persist=db))
+    if not holdings:
+        print("Portfolio is empty.", file=sys.stderr)
+        return 0
+
+    symbols = list(dict.fromkeys(h["symbol"] for h in holdings))
+    data = market_data.fetch_quotes(symbols)
+    if data["status"] != "online":
+        print(f"Warning: quotes unavailable ({data.get('error')}); valuing at cost.", file=sys.stderr)
+
+    positions, totals = valuation.value_portfolio(holdings, data["stocks"])
+    usd_rate = market_data.fetch_bcv_rate() if args.usd else None
+
+    frame = pd.DataFrame(positions)[POSITION_COLUMNS]
+    extra = {
+        "Total Value (Bs)": totals["value"],
+        "Total Cost (Bs)": totals["cost"],
+        "Gain (Bs)": totals["gain"],
+        "Gain %": totals["gain_pct"],
+    }
+    if usd_rate:
+        extra["BCV rate"] = usd_rate
+        extra["Total Value ($)"] = valuation.to_usd(totals["value"], usd_rate)
+    _emit(frame, args.format, args.output, extra)
+    return 0
+
+
+def cmd_backfill(args):
+    from bvc_core import backfill, db
+    from bvc_core.config import SYMBOLS
+
+    symbols = [s if s.endswith(".CR") else f"{s}.CR" for s in args.symbols] if args.symbols else SYMBOLS
+    intervals = [backfill.DAILY] + [i for i in args.intraday if i != backfill.DAILY]
+    db.init_db()
+
+    def progress(done, total, symbol, interval, status, bars, error):
+        detail = f"{bars} bars" if status != "failed" else error
+        print(f"[{done}/{total}] {symbol} {interval}: {status} ({detail})", file=sys.stderr)
+
+    try:
+        counts = backfill.run(
+            symbols, intervals, workers=args.workers, rate=args.rate,
+            retries=args.retries, force=args.force, progress=progress
+        )
+    except KeyboardInterrupt:
+        print("Interrupted; run again to resume from the last checkpoint.", file=sys.stderr)
+        return 130
+    print(", ".join(f"{status}: {n}" for status, n in sorted(counts.items())))
+    return 1 if counts.get("failed") else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="bvc_core", description="Mercado de Valores (BVC) headless tools.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log fetch details to stderr")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_output_args(p):
+        p.add_argument("-f", "--format", choices=["table", "json", "csv"], default="table")
+        p.add_argument("-o", "--output", help="write the report to this file instead of stdout")
+
+    p_quotes = sub.add_parser("quotes", help="print current quotes")
+    p_quotes.add_argument("symbols", nargs="*", help="symbols (default: all listed symbols); .CR is optional")
+    p_quotes.add_argument("--sort", choices=QUOTE_COLUMNS, default="ChangePercent")
+    p_quotes.add_argument("--ascending", action="store_true")
+    add_output_args(p_quotes)
+    p_quotes.set_defaults(func=cmd_quotes)
+
+    p_pf = sub.add_parser("portfolio", help="value the portfolio stored in the DB")
+    p_pf.add_argument("--usd", action="store_true", help="also convert totals at the BCV rate")
+    add_output_args(p_pf)
+    p_pf.set_defaults(func=cmd_portfolio)
+
+    p_bf = sub.add_parser("backfill", help="seed the local history store (resumable)")
+    p_bf.add_argument("symbols", nargs="*", help="symbols (default: all listed symbols); .CR is optional")
+    p_bf.add_argument("--intraday", action="append", default=[], metavar="INTERVAL",
+                      help="also store intraday bars at this interval (e.g. 60m; repeatable)")
+    p_bf.add_argument("--workers", type=int, default=4, help="concurrent fetches (default: 4)")
+    p_bf.add_argument("--rate", type=float, default=2.0, help="max proxy calls per second across workers (default: 2)")
+    p_bf.add_argument("--retries", type=int, default=3)
+    p_bf.add_argument("--force", action="store_true", help="ignore checkpoints and refetch everything")
+    p_bf.set_defaults(func=cmd_backfill)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, stream=sys.stderr)
+    sys.exit(args.func(args))
@@ -0,0 +1,32 @@
+"""Static configuration shared by the app, the CLI and helper scripts."""
+from datetime import timedelta, timezone
+
+# Venezuela Timezone (UTC-4)
+VET = timezone(timedelta(hours=-4))
+
+# Interbono's Yahoo Finance proxy: POST {"urls": [...]} -> {"data": [chart, ...]}
+PROXY_URL = "https://getmarketvalues-hdiyird7fq-uc.a.run.app"
+YAHOO_CHART_URL = "https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
+
+# Bolsa de Caracas home page (official IBC and stock table), the second quote source
+BVC_URL = "https://www.bolsadecaracas.com/"
+
+BCV_RATE_URL = "https://ve.dolarapi.com/v1/dolares/oficial"
+BCV_HISTORY_URL = "https://api.dolarvzla.com/public/exchange-rate/list"
+BINANCE_P2P_URL = "https://p2p.binance.com/bapi/c2c/v2/friendly/c2c/adv/search"
+
+HEADERS = {
+    "Content-Type": "application/json",
+    "User-Agent": "Mozilla/5.0"
+}
+
+# List of symbols derived from Interbono's website
+SYMBOLS = [
+    "ABC-A.CR", "BEX.CR", "BNC.CR", "BPV.CR", "BVE.CR", "BVCC.CR", "BVL.CR",
+    "CCP-B.CR", "CCR.CR", "CGQ.CR", "CIE.CR", "CRM-A.CR", "DOM.CR",
+    "EFE.CR", "ENV.CR", "FNC.CR", "FNV.CR", "FVIA.CR", "FVIB.CR",
+    "GMC-B.CR", "GZL.CR", "ICP-B.CR", "INV.CR", "IVC-A.CR", "IVC-B.CR",
+    "MPA.CR", "MVZ-A.CR", "MVZ-B.CR", "PCP-B.CR", "PER.CR", "PGR.CR", "PIV-B.CR",
+    "PTN.CR", "RFM.CR", "RST.CR", "RST-B.CR", "SVS.CR", "TDV-D.CR",
+    "TPG.CR", "VNA-B.CR"
+]
@@ -0,0 +1,197 @@
+"""
+Corporate actions (splits, stock dividends, cash dividends) and the
+back-adjustment they imply.
+
+Daily bars are stored as traded; corporate actions are stored as events per
+symbol. A symbol's adjusted history is its stored bars times one factor
+column derived from its events:
+
+    Price  = product over the events after the bar of 1 / ratio (splits)
+             and 1 - amount / previous close (cash dividends)
+    Shares = product of the split ratios after the bar (volumes, holdings)
+
+A new event therefore only recomputes that symbol's factor column: the
+stored bars stay valid and nothing has to be downloaded again. Yahoo serves
+bars already split-adjusted; unadjust() turns a fetched payload back into
+traded prices using the splits it came with. No streamlit imports here.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from bvc_core.market_data import DIVIDEND, SPLIT
+
+PRICE_FIELDS = ["Open", "High", "Low", "Close"]
+
+_NO_EVENTS = pd.DataFrame(
+    {"Kind": pd.Series(dtype=object), "Value": pd.Series(dtype=float)},
+    index=pd.DatetimeIndex([], name="Date")
+)
+
+
+def _after(index, dates, multipliers):
+    """For each bar of `index`, the product of the multipliers of events dated after it."""
+    per_row = np.ones(len(index) + 1)
+    # An event lands on its ex-date's bar and applies to the bars before it
+    np.multiply.at(per_row, index.searchsorted(dates, side="left"), multipliers)
+    return np.cumprod(per_row[::-1])[::-1][1:]
+
+
+def _kind(events, kind):
+    """Events of one kind (an empty frame for a symbol without events)."""
+    if events is None:
+        return _NO_EVENTS
+    return events[events["Kind"] == kind]
+
+
+def factors(bars, events):
+    """
+    Back-adjustment factor columns (Price, Shares) for one symbol's daily bars,
+    aligned to their index. Dividend amounts are split-adjusted (as Yahoo
+    states them), so they are compared with split-adjusted closes.
+    """
+    index = bars.index
+    splits = _kind(events, SPLIT)
+    shares = _after(index, splits.index, splits["Value"].to_numpy(dtype=float))
+    price = 1 / shares
+
+    dividends = _kind(events, DIVIDEND)
+    if not dividends.empty and len(index):
+        close = bars["Close"].ffill().to_numpy(dtype=float) / shares
+        rows = index.searchsorted(dividends.index, side="left")
+        previous = np.where(rows > 0, close[np.maximum(rows - 1, 0)], np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            multipliers = 1 - dividends["Value"].to_numpy(dtype=float) / previous
+        # Dividends without a usable previous close (or larger than it) are ignored
+        multipliers = np.where(np.isfinite(multipliers) & (multipliers > 0), multipliers, 1.0)
+        price = price * _after(index, dividends.index, multipliers)
+
+    return pd.DataFrame({"Price": price, "Shares": shares}, index=index)
+
+
+def adjust(bars, factor_columns, dividends=True):
+    """
+    Bars back-adjusted with factors(): prices times Price, volume times Shares.
+    With dividends=False prices are only split-adjusted (1 / Shares), which is
+    what share counts in today's units (adjust_holdings) are valued at.
+    """
+    price = factor_columns["Price"] if dividends else 1 / factor_columns["Shares"]
+    adjusted = bars.copy()
+    adjusted[PRICE_FIELDS] = bars[PRICE_FIELDS].to_numpy() * price.to_numpy()[:, None]
+    adjusted["Volume"] = bars["Volume"].to_numpy() * factor_columns["Shares"].to_numpy()
+    return adjusted
+
+
+def unadjust(bars, events):
+    """Split-adjusted bars (as Yahoo serves them) back to traded prices, using the payload's splits."""
+    splits = _kind(events, SPLIT)
+    if splits.empty or bars.empty:
+        return bars
+    shares = _after(bars.index, splits.index, splits["Value"].to_numpy(dtype=float))
+    raw = bars.copy()
+    raw[PRICE_FIELDS] = bars[PRICE_FIELDS].to_numpy() * shares[:, None]
+    raw["Volume"] = bars["Volume"].to_numpy() / shares
+    return raw
+
+
+def _merge(old, new):
+    if old is None or old.empty:
+        return new.sort_index()
+    merged = pd.concat([old, new])
+    keys = pd.MultiIndex.from_arrays([merged.index, merged["Kind"]])
+    return merged[~keys.duplicated(keep="last")].sort_index(kind="stable")
+
+
+class ActionBook:
+    """
+    Corporate action events per symbol, in memory and optionally in a
+    persistent store (`persist` provides load_corporate_actions and
+    save_corporate_actions, e.g. bvc_core.db). `version` changes whenever a
+    symbol gains or revises an event.
+    """
+
+    def __init__(self, persist=None):
+        self.persist = persist
+        self.version = 0
+        self._events = {} # symbol -> events frame (Kind, Value) indexed by ex-date
+        self._known = set() # symbols already looked up in the persistent store
+        self._lock = threading.Lock()
+
+    def ensure(self, symbols):
+        """Loads stored events for symbols not looked up yet."""
+        with self._lock:
+            unknown = [s for s in dict.fromkeys(symbols) if s not in self._known]
+        if not unknown:
+            return
+        loaded = self.persist.load_corporate_actions(unknown) if self.persist is not None else {}
+        with self._lock:
+            for symbol in unknown:
+                if symbol not in self._known and symbol in loaded:
+                    self._events[symbol] = _merge(self._events.get(symbol), loaded[symbol])
+                self._known.add(symbol)
+
+    def events(self, symbol):
+        """The symbol's events (None when it has none)."""
+        with self._lock:
+            return self._events.get(symbol)
+
+    def record(self, actions):
+        """
+        Merges fetched events ({symbol: parse_corporate_actions frame}) in and
+        persists them. Returns the symbols whose events changed, i.e. whose
+        adjusted history has to be restated.
+        """
+        if not actions:
+            return []
+        self.ensure(actions)
+        changed = {}
+        with self._lock:
+            for symbol, frame in actions.items():
+                old = self._events.get(symbol)
+                merged = _merge(old, frame)
+                if old is None or not merged.equals(old):
+                    self._events[symbol] = merged
+                    changed[symbol] = frame
+            if changed:
+                self.version += 1
+        if changed and self.persist is not None:
+            self.persist.save_corporate_actions(changed)
+        return list(changed)
+
+    def share_factors(self, symbols, dates):
+        """
+        Splits since each date, one per (symbol, date) pair: shares held then
+        times the factor gives shares held now. Unknown dates get 1.
+        """
+        symbols = np.asarray(list(symbols), dtype=object)
+        self.ensure(symbols)
+        days = pd.to_datetime(pd.Series(list(dates), dtype=object), errors="coerce").dt.normalize().to_numpy()
+        result = np.ones(len(symbols))
+        for symbol in set(symbols):
+            splits = _kind(self.events(symbol), SPLIT)
+            if splits.empty:
+                continue
+            # suffix[k]: product of the ratios of splits k onwards
+            suffix = np.append(np.cumprod(splits["Value"].to_numpy(dtype=float)[::-1])[::-1], 1.0)
+            mask = symbols == symbol
+            # Bought on the ex-date means bought after the split; NaT sorts last (factor 1)
+            result[mask] = suffix[splits.index.searchsorted(days[mask], side="right")]
+        return result
+
+
+def adjust_holdings(holdings, book):
+    """
+    Holdings (as returned by db.get_holdings()) in today's shares: each lot's
+    quantity times the splits since its purchase date and its average cost
+    divided by the same factor, so the amount invested is unchanged. Value
+    them with split-only adjusted prices (adjust(..., dividends=False)):
+    dividends were cash paid out, not a change in the cost basis.
+    """
+    if not holdings:
+        return holdings
+    split_factors = book.share_factors([h['symbol'] for h in holdings], [h.get('purchase_date') for h in holdings])
+    return [
+        {**h, 'qty': h['qty'] * f, 'avg_cost': h['avg_cost'] / f}
+        for h, f in zip(holdings, split_factors.tolist())
+    ]
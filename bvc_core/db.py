@@ -0,0 +1,806 @@
+"""
+Persistence for holdings, schema migrations and market index series.
+Works with PostgreSQL (DATABASE_URL) and falls back to a local SQLite file.
+No streamlit imports here: the app passes Streamlit secrets in via configure().
+"""
+import sqlite3
+import os
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+def _normalize_url(db_url):
+    # Fix for psycopg2: it prefers 'postgresql://' over 'postgres://'
+    if db_url and db_url.startswith("postgres://"):
+        db_url = db_url.replace("postgres://", "postgresql://", 1)
+    return db_url
+
+DB_URL = _normalize_url(os.environ.get("DATABASE_URL"))
+
+# Local SQLite fallback (next to the app, unless SQLITE_PATH is set)
+DB_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SQLITE_PATH = os.environ.get("SQLITE_PATH") or os.path.join(DB_DIR, "portfolio.db")
+
+DB_NAME = "PostgreSQL (Cloud)" if DB_URL else SQLITE_PATH
+
+# Optional callback(message) invoked when PostgreSQL is unreachable
+on_connection_error = None
+
+def configure(db_url):
+    """Sets the database URL (e.g. from Streamlit secrets) when DATABASE_URL is not set."""
+    global DB_URL, DB_NAME
+    DB_URL = _normalize_url(db_url)
+    DB_NAME = "PostgreSQL (Cloud)" if DB_URL else SQLITE_PATH
+
+def get_connection():
+    """Tries to connect to PostgreSQL, falls back to SQLite if it fails."""
+    if DB_URL:
+        try:
+            import psycopg2
+            # We add a connection timeout to avoid hanging
+            conn = psycopg2.connect(DB_URL, connect_timeout=5)
+            return conn, True
+        except Exception as e:
+            logger.error(f"PostgreSQL connection failed: {e}. Falling back to SQLite.")
+            # Let the caller surface the error (the app shows it in the UI)
+            if on_connection_error is not None:
+                on_connection_error(str(e))
+            return sqlite3.connect(SQLITE_PATH), False
+    else:
+        return sqlite3.connect(SQLITE_PATH), False
+
+# --- Schema Migrations ---
+# Ordered list of (version, description, step). Each step must be idempotent so
+# databases created before versioning existed can be brought up to date safely.
+
+def _m001_create_holdings(cursor, is_postgres):
+    auto_inc = "SERIAL" if is_postgres else "INTEGER PRIMARY KEY AUTOINCREMENT"
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS holdings (
+            id {auto_inc},
+            symbol TEXT NOT NULL,
+            quantity REAL NOT NULL,
+            avg_cost REAL NOT NULL,
+            purchase_date TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def _m002_holdings_purchase_date(cursor, is_postgres):
+    # Legacy databases were created without purchase_date
+    if is_postgres:
+        cursor.execute("SELECT column_name FROM information_schema.columns WHERE table_name='holdings'")
+    else:
+        cursor.execute("PRAGMA table_info(holdings)")
+    columns = [row[0] if is_postgres else row[1] for row in cursor.fetchall()]
+
+    if "purchase_date" not in columns:
+        cursor.execute("ALTER TABLE holdings ADD COLUMN purchase_date TEXT")
+        if is_postgres:
+            cursor.execute("UPDATE holdings SET purchase_date = CAST(created_at AS DATE)::text WHERE purchase_date IS NULL")
+        else:
+            cursor.execute("UPDATE holdings SET purchase_date = date(created_at) WHERE purchase_date IS NULL")
+
+def _m003_market_index_series(cursor, is_postgres):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS index_intraday (
+            index_name TEXT NOT NULL,
+            ts TIMESTAMP NOT NULL,
+            value REAL NOT NULL,
+            change_pct REAL NOT NULL,
+            PRIMARY KEY (index_name, ts)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS index_daily (
+            index_name TEXT NOT NULL,
+            day TEXT NOT NULL,
+            value REAL NOT NULL,
+            change_pct REAL NOT NULL,
+            PRIMARY KEY (index_name, day)
+        )
+    """)
+
+def _m004_alerts(cursor, is_postgres):
+    auto_inc = "SERIAL PRIMARY KEY" if is_postgres else "INTEGER PRIMARY KEY AUTOINCREMENT"
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS alert_rules (
+            id {auto_inc},
+            kind TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            direction TEXT NOT NULL,
+            threshold REAL NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # One event per rule and day; the rule's fields are copied so history survives deletes
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS alert_events (
+            id {auto_inc},
+            rule_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            direction TEXT NOT NULL,
+            threshold REAL NOT NULL,
+            value REAL NOT NULL,
+            day TEXT NOT NULL,
+            fired_at TIMESTAMP NOT NULL,
+            UNIQUE (rule_id, day)
+        )
+    """)
+
+def _m005_daily_bars(cursor, is_postgres):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_bars (
+            symbol TEXT NOT NULL,
+            day TEXT NOT NULL,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            volume REAL,
+            PRIMARY KEY (symbol, day)
+        )
+    """)
+    # How far back each symbol's bars go (a history range such as "5y") and when they were fetched
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS bar_depth (
+            symbol TEXT PRIMARY KEY,
+            depth TEXT NOT NULL,
+            fetched_at REAL NOT NULL
+        )
+    """)
+
+def _m006_backfill(cursor, is_postgres):
+    # Bars finer than a day, kept apart from the daily store
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS intraday_bars (
+            symbol TEXT NOT NULL,
+            bar_interval TEXT NOT NULL,
+            ts REAL NOT NULL,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            volume REAL,
+            PRIMARY KEY (symbol, bar_interval, ts)
+        )
+    """)
+    # Per-symbol checkpoints of the backfill job, so an interrupted run resumes
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS backfill_progress (
+            symbol TEXT NOT NULL,
+            bar_interval TEXT NOT NULL,
+            status TEXT NOT NULL,
+            bars INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (symbol, bar_interval)
+        )
+    """)
+
+def _m007_corporate_actions(cursor, is_postgres):
+    # Splits (value: new shares per old share) and dividends (value: cash per share) by ex-date
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS corporate_actions (
+            symbol TEXT NOT NULL,
+            day TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            value REAL NOT NULL,
+            PRIMARY KEY (symbol, day, kind)
+        )
+    """)
+    # Daily bars stored until now came split-adjusted from Yahoo, but are read as
+    # traded from here on: drop them (and their depth and backfill checkpoints)
+    # so they are fetched again as traded instead of being adjusted twice
+    cursor.execute("DELETE FROM daily_bars")
+    cursor.execute("DELETE FROM bar_depth")
+    cursor.execute("DELETE FROM backfill_progress WHERE bar_interval = '1d'")
+
+def _m008_portfolio_version(cursor, is_postgres):
+    # One-row counter bumped in the same transaction as every holdings write,
+    # so all workers and replicas see the same portfolio version
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS portfolio_version (
+            id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("INSERT INTO portfolio_version (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING")
+
+def _m009_alerts_version(cursor, is_postgres):
+    # Same as portfolio_version, bumped with every alert rule write
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS alerts_version (
+            id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("INSERT INTO alerts_version (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING")
+
+MIGRATIONS = [
+    (1, "create holdings", _m001_create_holdings),
+    (2, "holdings.purchase_date", _m002_holdings_purchase_date),
+    (3, "market index series", _m003_market_index_series),
+    (4, "alert rules and events", _m004_alerts),
+    (5, "daily bar store", _m005_daily_bars),
+    (6, "intraday bars and backfill checkpoints", _m006_backfill),
+    (7, "corporate actions", _m007_corporate_actions),
+    (8, "portfolio version", _m008_portfolio_version),
+    (9, "alert rules version", _m009_alerts_version),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# Arbitrary key for pg_advisory_xact_lock, shared by every app instance
+_MIGRATION_LOCK_ID = 724_153_001
+_migration_lock = threading.Lock()
+
+def _current_schema_version(conn, is_postgres):
+    """Returns the applied schema version, or 0 if versioning was never set up."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+        row = cursor.fetchone()
+        return (row[0] or 0) if row else 0
+    except Exception:
+        # Missing table aborts the transaction on PostgreSQL
+        conn.rollback()
+        return 0
+
+def _apply_migrations(conn, is_postgres):
+    """Applies pending migrations inside a single locked transaction."""
+    placeholder = "%s" if is_postgres else "?"
+    cursor = conn.cursor()
+
+    # Serialize concurrent workers: the lock is released on commit/rollback
+    if is_postgres:
+        cursor.execute(f"SELECT pg_advisory_xact_lock({placeholder})", (_MIGRATION_LOCK_ID,))
+    else:
+        cursor.execute("BEGIN IMMEDIATE")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Another worker may have migrated while we waited for the lock
+    cursor.execute("SELECT MAX(version) FROM schema_version")
+    row = cursor.fetchone()
+    current = (row[0] or 0) if row else 0
+
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+        logger.info(f"Applying migration {version}: {description}")
+        step(cursor, is_postgres)
+        cursor.execute(
+            f"INSERT INTO schema_version (version, description) VALUES ({placeholder}, {placeholder})",
+            (version, description)
+        )
+
+    conn.commit()
+
+def init_db():
+    """
+    Brings the database schema up to date.
+    When the schema is already current this costs a single version query.
+    """
+    with _migration_lock:
+        conn, is_postgres = get_connection()
+        try:
+            if _current_schema_version(conn, is_postgres) >= SCHEMA_VERSION:
+                return
+            _apply_migrations(conn, is_postgres)
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Database init error: {e}")
+        finally:
+            conn.close()
+
+# --- Holdings Repository ---
+# Version counter stored in the DB and bumped by every write, in the same
+# transaction. Readers (the app's session cache, portfolio history) key cached
+# results by this version, so writes from other workers invalidate them too.
+
+def _read_version(table):
+    """Returns the counter of a one-row version table, or None if unreadable."""
+    conn, _ = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT version FROM {table} WHERE id = 1")
+        row = cursor.fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        logger.error(f"Error reading {table}: {e}")
+        return None
+    finally:
+        conn.close()
+
+def get_portfolio_version():
+    """Returns the current portfolio version (changes on every holdings write), or None if unreadable."""
+    return _read_version("portfolio_version")
+
+def _bump_portfolio_version(cursor):
+    cursor.execute("UPDATE portfolio_version SET version = version + 1 WHERE id = 1")
+
+def add_holding(symbol, quantity, avg_cost, purchase_date):
+    conn, is_postgres = get_connection()
+    placeholder = "%s" if is_postgres else "?"
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"INSERT INTO holdings (symbol, quantity, avg_cost, purchase_date) VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder})",
+            (symbol, float(quantity), float(avg_cost), purchase_date)
+        )
+        _bump_portfolio_version(cursor)
+        conn.commit()
+    finally:
+        conn.close()
+
+def update_holding(holding_id, symbol, quantity, avg_cost, purchase_date):
+    """Updates an existing holding in the database."""
+    conn, is_postgres = get_connection()
+    placeholder = "%s" if is_postgres else "?"
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"UPDATE holdings SET symbol = {placeholder}, quantity = {placeholder}, avg_cost = {placeholder}, purchase_date = {placeholder} WHERE id = {placeholder}",
+            (symbol, float(quantity), float(avg_cost), purchase_date, holding_id)
+        )
+        _bump_portfolio_version(cursor)
+        conn.commit()
+    finally:
+        conn.close()
+
+def delete_holding(holding_id):
+    conn, is_postgres = get_connection()
+    placeholder = "%s" if is_postgres else "?"
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"DELETE FROM holdings WHERE id = {placeholder}", (holding_id,))
+        _bump_portfolio_version(cursor)
+        conn.commit()
+    finally:
+        conn.close()
+
+def query_holdings():
+    """Reads all holdings from the DB. Returns (holdings, ok)."""
+    holdings = []
+    conn, is_postgres = get_connection()
+    try:
+        if is_postgres:
+            from psycopg2.extras import RealDictCursor
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+        else:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            
+        cursor.execute("SELECT * FROM holdings ORDER BY created_at DESC")
+        rows = cursor.fetchall()
+        
+        for row in rows:
+            holdings.append({
+                "id": row["id"],
+                "symbol": row["symbol"],
+                "qty": row["quantity"] if is_postgres else row["quantity"], # names might differ slightly in dict
+                "avg_cost": row["avg_cost"],
+                "purchase_date": row["purchase_date"]
+            })
+        return holdings, True
+    except Exception as e:
+        logger.error(f"Error fetching: {e}")
+        return holdings, False
+    finally:
+        conn.close()
+
+def get_holdings():
+    """Returns all holdings straight from the DB ([] on error)."""
+    return query_holdings()[0]
+
+# --- Market Index Series ---
+
+def save_index_values(values, ts, day=None):
+    """
+    Persists one snapshot of market index values ({name: {'value', 'change_pct'}}).
+    Appends to the intraday series and upserts the row of `day` (the trading
+    session, defaults to ts's date) in the daily series.
+    """
+    if not values:
+        return
+    conn, is_postgres = get_connection()
+    placeholder = "%s" if is_postgres else "?"
+    ts_str = ts.strftime("%Y-%m-%d %H:%M:%S")
+    day_str = (day or ts).strftime("%Y-%m-%d")
+    try:
+        cursor = conn.cursor()
+        for name, v in values.items():
+            cursor.execute(
+                f"INSERT INTO index_intraday (index_name, ts, value, change_pct) VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}) "
+                "ON CONFLICT (index_name, ts) DO NOTHING",
+                (name, ts_str, float(v['value']), float(v['change_pct']))
+            )
+            cursor.execute(
+                f"INSERT INTO index_daily (index_name, day, value, change_pct) VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}) "
+                "ON CONFLICT (index_name, day) DO UPDATE SET value = excluded.value, change_pct = excluded.change_pct",
+                (name, day_str, float(v['value']), float(v['change_pct']))
+            )
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Error saving index values: {e}")
+    finally:
+        conn.close()
+
+def get_last_index_closes(before_day):
+    """Returns {index_name: value} of the latest daily close strictly before before_day (YYYY-MM-DD)."""
+    conn, is_postgres = get_connection()
+    placeholder = "%s" if is_postgres else "?"
+    closes = {}
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"""SELECT d.index_name, d.value FROM index_daily d
+                JOIN (SELECT index_name, MAX(day) AS day FROM index_daily WHERE day < {placeholder} GROUP BY index_name) last
+                ON d.index_name = last.index_name AND d.day = last.day""",
+            (before_day,)
+        )
+        closes = {name: value for name, value in cursor.fetchall()}
+    except Exception as e:
+        logger.error(f"Error reading index closes: {e}")
+    finally:
+        conn.close()
+    return closes
+
+def get_index_series(index_name, intraday=False, since=None):
+    """Returns [(ts_or_day, value, change_pct), ...] in chronological order."""
+    conn, is_postgres = get_connection()
+    placeholder = "%s" if is_postgres else "?"
+    table, col = ("index_intraday", "ts") if intraday else ("index_daily", "day")
+    rows = []
+    try:
+        cursor = conn.cursor()
+        query = f"SELECT {col}, value, change_pct FROM {table} WHERE index_name = {placeholder}"
+        params = [index_name]
+        if since is not None:
+            query += f" AND {col} >= {placeholder}"
+            params.append(since)
+        cursor.execute(query + f" ORDER BY {col}", params)
+        rows = cursor.fetchall()
+    except Exception as e:
+        logger.error(f"Error reading index series: {e}")
+    finally:
+        conn.close()
+    return rows
+
+# --- Daily Bars ---
+
+def save_daily_bars(bars, depth, fetched_at):
+    """
+    Upserts daily OHLCV frames ({symbol: DataFrame indexed by day}) and records
+    the range they cover. Existing days are overwritten with the new values.
+    """
+    if not bars:
+        return
+    conn, is_postgres = get_connection()
+    placeholder = "%s" if is_postgres else "?"
+    try:
+        cursor = conn.cursor()
+        for symbol, frame in bars.items():
+            rows = [
+                (symbol, day.strftime("%Y-%m-%d"), *[None if v != v else float(v) for v in values])
+                for day, values in zip(frame.index, frame[["Open", "High", "Low", "Close", "Volume"]].to_numpy())
+            ]
+            cursor.executemany(
+                f"INSERT INTO daily_bars (symbol, day, open, high, low, close, volume) VALUES ({', '.join([placeholder] * 7)}) "
+                "ON CONFLICT (symbol, day) DO UPDATE SET open = excluded.open, high = excluded.high, "
+                "low = excluded.low, close = excluded.close, volume = excluded.volume",
+                rows
+            )
+            cursor.execute(
+                f"INSERT INTO bar_depth (symbol, depth, fetched_at) VALUES ({placeholder}, {placeholder}, {placeholder}) "
+                "ON CONFLICT (symbol) DO UPDATE SET depth = excluded.depth, fetched_at = excluded.fetched_at",
+                (symbol, depth, float(fetched_at))
+            )
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Error saving daily bars: {e}")
+    finally:
+        conn.close()
+
+def load_daily_bars(symbols):
+    """
+    Returns {symbol: (DataFrame, depth, fetched_at)} for the symbols with
+    stored bars; the frame has Open/High/Low/Close/Volume indexed by day.
+    """
+    import pandas as pd
+
+    symbols = list(symbols)
+    if not symbols:
+        return {}
+    conn, is_postgres = get_connection()
+    placeholder = "%s" if is_postgres else "?"
+    marks = ", ".join([placeholder] * len(symbols))
+    loaded = {}
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT symbol, depth, fetched_at FROM bar_depth WHERE symbol IN ({marks})", symbols)
+        depths = {symbol: (depth, fetched_at) for symbol, depth, fetched_at in cursor.fetchall()}
+        if not depths:
+            return {}
+        cursor.execute(
+            f"SELECT symbol, day, open, high, low, close, volume FROM daily_bars WHERE symbol IN ({marks}) ORDER BY symbol, day",
+            symbols
+        )
+        rows = pd.DataFrame(cursor.fetchall(), columns=["symbol", "Date", "Open", "High", "Low", "Close", "Volume"])
+        rows["Date"] = pd.to_datetime(rows["Date"])
+        for symbol, frame in rows.groupby("symbol"):
+            if symbol in depths:
+                loaded[symbol] = (frame.drop(columns="symbol").set_index("Date").astype(float), *depths[symbol])
+    except Exception as e:
+        logger.error(f"Error loading daily bars: {e}")
+    finally:
+        conn.close()
+    return loaded
+
+def save_intraday_bars(symbol, interval, frame):
+    """Upserts intraday OHLCV bars (DataFrame indexed by timestamp) for one symbol and interval."""
+    if frame is None or frame.empty:
+        return
+    conn, is_postgres = get_connection()
+    placeholder = "%s" if is_postgres else "?"
+    try:
+        rows = [
+            (symbol, interval, ts.timestamp(), *[None if v != v else float(v) for v in values])
+            for ts, values in zip(frame.index, frame[["Open", "High", "Low", "Close", "Volume"]].to_numpy())
+        ]
+        cursor = conn.cursor()
+        cursor.executemany(
+            f"INSERT INTO intraday_bars (symbol, bar_interval, ts, open, high, low, close, volume) VALUES ({', '.join([placeholder] * 8)}) "
+            "ON CONFLICT (symbol, bar_interval, ts) DO UPDATE SET open = excluded.open, high = excluded.high, "
+            "low = excluded.low, close = excluded.close, volume = excluded.volume",
+            rows
+        )
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Error saving intraday bars: {e}")
+    finally:
+        conn.close()
+
+def load_intraday_bars(symbol, interval):
+    """Stored intraday bars for one symbol and interval as a DataFrame indexed by timestamp (UTC)."""
+    import pandas as pd
+
+    conn, is_postgres = get_connection()
+    placeholder = "%s" if is_postgres else "?"
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT ts, open, high, low, close, volume FROM intraday_bars WHERE symbol = {placeholder} AND bar_interval = {placeholder} ORDER BY ts",
+            (symbol, interval)
+        )
+        frame = pd.DataFrame(cursor.fetchall(), columns=["Date", "Open", "High", "Low", "Close", "Volume"])
+    except Exception as e:
+        logger.error(f"Error loading intraday bars: {e}")
+        return pd.DataFrame()
+    finally:
+        conn.close()
+    frame["Date"] = pd.to_datetime(frame["Date"], unit="s")
+    return frame.set_index("Date").astype(float)
+
+# --- Corporate actions ---
+
+def save_corporate_actions(actions):
+    """Upserts corporate action events ({symbol: DataFrame indexed by ex-date with Kind and Value})."""
+    if not actions:
+        return
+    conn, is_postgres = get_connection()
+    placeholder = "%s" if is_postgres else "?"
+    try:
+        rows = [
+            (symbol, day.strftime("%Y-%m-%d"), kind, float(value))
+            for symbol, frame in actions.items()
+            for day, kind, value in zip(frame.index, frame["Kind"], frame["Value"])
+        ]
+        cursor = conn.cursor()
+        cursor.executemany(
+            f"INSERT INTO corporate_actions (symbol, day, kind, value) VALUES ({', '.join([placeholder] * 4)}) "
+            "ON CONFLICT (symbol, day, kind) DO UPDATE SET value = excluded.value",
+            rows
+        )
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Error saving corporate actions: {e}")
+    finally:
+        conn.close()
+
+def load_corporate_actions(symbols):
+    """Returns {symbol: DataFrame indexed by ex-date with Kind and Value} for the symbols with stored events."""
+    import pandas as pd
+
+    symbols = list(symbols)
+    if not symbols:
+        return {}
+    conn, is_postgres = get_connection()
+    placeholder = "%s" if is_postgres else "?"
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT symbol, day, kind, value FROM corporate_actions WHERE symbol IN ({', '.join([placeholder] * len(symbols))}) ORDER BY symbol, day",
+            symbols
+        )
+        rows = pd.DataFrame(cursor.fetchall(), columns=["symbol", "Date", "Kind", "Value"])
+    except Exception as e:
+        logger.error(f"Error loading corporate actions: {e}")
+        return {}
+    finally:
+        conn.close()
+    rows["Date"] = pd.to_datetime(rows["Date"])
+    rows["Value"] = rows["Value"].astype(float)
+    return {symbol: frame.drop(columns="symbol").set_index("Date") for symbol, frame in rows.groupby("symbol")}
+
+# --- Backfill checkpoints ---
+
+def get_backfill_progress():
+    """Returns {(symbol, interval): {'status', 'bars', 'error', 'updated_at'}}."""
+    conn, _ = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT symbol, bar_interval, status, bars, error, updated_at FROM backfill_progress")
+        return {
+            (symbol, interval): {"status": status, "bars": bars, "error": error, "updated_at": updated_at}
+            for symbol, interval, status, bars, error, updated_at in cursor.fetchall()
+        }
+    except Exception as e:
+        logger.error(f"Error reading backfill progress: {e}")
+        return {}
+    finally:
+        conn.close()
+
+def save_backfill_progress(symbol, interval, status, bars=0, error=None, updated_at=None):
+    """Records one symbol's backfill checkpoint (status: done, empty or failed)."""
+    conn, is_postgres = get_connection()
+    placeholder = "%s" if is_postgres else "?"
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"INSERT INTO backfill_progress (symbol, bar_interval, status, bars, error, updated_at) VALUES ({', '.join([placeholder] * 6)}) "
+            "ON CONFLICT (symbol, bar_interval) DO UPDATE SET status = excluded.status, bars = excluded.bars, "
+            "error = excluded.error, updated_at = excluded.updated_at",
+            (symbol, interval, status, int(bars), error, float(updated_at if updated_at is not None else time.time()))
+        )
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Error saving backfill progress: {e}")
+    finally:
+        conn.close()
+
+def clear_backfill_progress():
+    conn, _ = get_connection()
+    try:
+        conn.cursor().execute("DELETE FROM backfill_progress")
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Error clearing backfill progress: {e}")
+    finally:
+        conn.close()
+
+# --- Alerts ---
+# Rule writes bump their own version, stored in the DB like the portfolio's,
+# so every worker's alert engine rebuilds its index.
+
+def get_alerts_version():
+    """Returns the current alert rules version (changes on every rule write), or None if unreadable."""
+    return _read_version("alerts_version")
+
+def _bump_alerts_version(cursor):
+    cursor.execute("UPDATE alerts_version SET version = version + 1 WHERE id = 1")
+
+def add_alert_rule(kind, symbol, direction, threshold):
+    conn, is_postgres = get_connection()
+    placeholder = "%s" if is_postgres else "?"
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"INSERT INTO alert_rules (kind, symbol, direction, threshold) VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder})",
+            (kind, symbol, direction, float(threshold))
+        )
+        _bump_alerts_version(cursor)
+        conn.commit()
+    finally:
+        conn.close()
+
+def delete_alert_rule(rule_id):
+    conn, is_postgres = get_connection()
+    placeholder = "%s" if is_postgres else "?"
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"DELETE FROM alert_rules WHERE id = {placeholder}", (rule_id,))
+        _bump_alerts_version(cursor)
+        conn.commit()
+    finally:
+        conn.close()
+
+def get_alert_rules():
+    """Returns all alert rules as dicts (id, kind, symbol, direction, threshold)."""
+    conn, is_postgres = get_connection()
+    rules = []
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, kind, symbol, direction, threshold FROM alert_rules ORDER BY id")
+        rules = [
+            {"id": r[0], "kind": r[1], "symbol": r[2], "direction": r[3], "threshold": r[4]}
+            for r in cursor.fetchall()
+        ]
+    except Exception as e:
+        logger.error(f"Error reading alert rules: {e}")
+    finally:
+        conn.close()
+    return rules
+
+def record_alert_events(events):
+    """
+    Stores fired alerts. A rule fires at most once per day, also across app
+    instances: events already recorded are skipped. Returns the new events.
+    """
+    if not events:
+        return []
+    conn, is_postgres = get_connection()
+    placeholder = "%s" if is_postgres else "?"
+    recorded = []
+    try:
+        cursor = conn.cursor()
+        for e in events:
+            cursor.execute(
+                f"INSERT INTO alert_events (rule_id, kind, symbol, direction, threshold, value, day, fired_at) "
+                f"VALUES ({', '.join([placeholder] * 8)}) ON CONFLICT (rule_id, day) DO NOTHING",
+                (e['rule_id'], e['kind'], e['symbol'], e['direction'], float(e['threshold']),
+                 float(e['value']), e['day'], e['fired_at'].strftime("%Y-%m-%d %H:%M:%S"))
+            )
+            if cursor.rowcount:
+                recorded.append(e)
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Error saving alert events: {e}")
+    finally:
+        conn.close()
+    return recorded
+
+def get_fired_alert_ids(day):
+    """Returns the ids of rules that already fired on day (YYYY-MM-DD)."""
+    conn, is_postgres = get_connection()
+    placeholder = "%s" if is_postgres else "?"
+    fired = set()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT rule_id FROM alert_events WHERE day = {placeholder}", (day,))
+        fired = {row[0] for row in cursor.fetchall()}
+    except Exception as e:
+        logger.error(f"Error reading alert events: {e}")
+    finally:
+        conn.close()
+    return fired
+
+def get_alert_events(limit=20):
+    """Returns the most recent fired alerts, newest first."""
+    conn, is_postgres = get_connection()
+    placeholder = "%s" if is_postgres else "?"
+    events = []
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT id, rule_id, kind, symbol, direction, threshold, value, day, fired_at FROM alert_events "
+            f"ORDER BY fired_at DESC, id DESC LIMIT {placeholder}",
+            (limit,)
+        )
+        keys = ["id", "rule_id", "kind", "symbol", "direction", "threshold", "value", "day", "fired_at"]
+        events = [dict(zip(keys, row)) for row in cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"Error reading alert events: {e}")
+    finally:
+        conn.close()
+    return events
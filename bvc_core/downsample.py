@@ -0,0 +1,71 @@
+"""
+Server-side downsampling for charts, so the points sent to the browser stay
+bounded whatever the range:
+
+- OHLC bars are bucketed into runs of consecutive bars (first open, highest
+  high, lowest low, last close, summed volume), which keeps every extreme.
+- Line series use Largest-Triangle-Three-Buckets (LTTB), which keeps the
+  visual shape (peaks and troughs) with a fixed number of points.
+
+No streamlit or plotly imports here.
+"""
+import math
+
+import numpy as np
+
+from bvc_core import history
+
+MAX_POINTS = 2000 # per series sent to the browser
+
+
+def bucket_ohlcv(panel, max_points=MAX_POINTS):
+    """
+    A (field, symbol) daily bar panel reduced to at most max_points bars by
+    merging runs of consecutive bars (each bar labeled with its last day).
+    """
+    if len(panel) <= max_points:
+        return panel
+    return history.resample_ohlcv(panel, f"{math.ceil(len(panel) / max_points)}d")
+
+
+def lttb(x, y, threshold=MAX_POINTS):
+    """
+    Indices of the points LTTB keeps out of (x, y): the first and last
+    points, plus, per bucket, the one forming the largest triangle with the
+    previously kept point and the average of the next bucket. x may be
+    datetimes; NaN values of y are never picked.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x)
+    x = x.astype("datetime64[ns]").astype(np.int64).astype(float) if np.issubdtype(x.dtype, np.datetime64) else x.astype(float)
+    y = np.asarray(y, dtype=float)
+
+    # Interior points split into threshold-2 buckets: [edges[i], edges[i+1])
+    edges = (np.arange(threshold - 1) * (n - 2) / (threshold - 2)).astype(int) + 1
+    edges[-1] = n - 1
+
+    kept = np.empty(threshold, dtype=int)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # The next bucket's average (the last point for the final bucket)
+        nlo, nhi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x = x[nlo:nhi].mean()
+        avg_y = np.nanmean(y[nlo:nhi]) if np.isfinite(y[nlo:nhi]).any() else y[a]
+
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        area[~np.isfinite(area)] = -1.0
+        a = lo + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def lttb_frame(frame, column, threshold=MAX_POINTS):
+    """Rows of a date-indexed frame kept by LTTB on one column (every column follows the same rows)."""
+    if len(frame) <= threshold:
+        return frame
+    return frame.iloc[lttb(frame.index.to_numpy(), frame[column].to_numpy(), threshold)]
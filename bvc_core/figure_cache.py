@@ -0,0 +1,93 @@
+"""
+Memoized Plotly figure construction. Figures are keyed by a cheap
+fingerprint of their input arrays (plus anything else that shapes them,
+like the theme) and stored as serialized JSON in a bounded LRU, so a rerun
+with unchanged data skips building and validating the figure again.
+
+    figures = FigureCache()
+    fig = figures.get(("sparkline", "dark", series, color), lambda: build_sparkline(series, color))
+
+On a hit the stored JSON is loaded back into a figure without re-running
+Plotly's validation (it was validated when first built). Every hit returns
+a fresh figure, so callers may modify it. No streamlit imports here.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+_MAX_FIGURES = 64
+
+
+def _feed(h, part):
+    if isinstance(part, (pd.DataFrame, pd.Series)):
+        h.update(b"P")
+        _feed(h, part.index.to_numpy())
+        if isinstance(part, pd.DataFrame):
+            _feed(h, tuple(map(str, part.columns)))
+        _feed(h, part.to_numpy())
+    elif isinstance(part, np.ndarray):
+        h.update(f"A{part.dtype}{part.shape}".encode())
+        if part.dtype == object:
+            h.update(repr(part.tolist()).encode())
+        else:
+            h.update(np.ascontiguousarray(part).tobytes())
+    elif isinstance(part, (list, tuple)):
+        h.update(f"L{len(part)}".encode())
+        for item in part:
+            _feed(h, item)
+    elif isinstance(part, dict):
+        _feed(h, sorted(part.items(), key=lambda kv: str(kv[0])))
+    else:
+        h.update(f"S{type(part).__name__}:{part!r}".encode())
+
+
+def fingerprint(parts):
+    """Digest of arrays, frames, series and plain values (nested in tuples, lists, dicts)."""
+    h = hashlib.blake2b(digest_size=16)
+    _feed(h, parts)
+    return h.hexdigest()
+
+
+class FigureCache:
+    def __init__(self, maxsize=_MAX_FIGURES):
+        self.maxsize = maxsize
+        self._specs = OrderedDict() # fingerprint -> figure JSON
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, parts, build):
+        """The figure for `parts`: rebuilt from its stored JSON, or from build() on a miss."""
+        key = fingerprint(parts)
+        with self._lock:
+            spec = self._specs.get(key)
+            if spec is not None:
+                self._specs.move_to_end(key)
+                self.hits += 1
+
+        if spec is not None:
+            import plotly.graph_objects as go
+            # Already validated when it was built
+            return go.Figure(json.loads(spec), _validate=False)
+
+        fig = build()
+        spec = fig.to_json()
+        with self._lock:
+            self.misses += 1
+            self._specs[key] = spec
+            while len(self._specs) > self.maxsize:
+                self._specs.popitem(last=False)
+        return fig
+
+    def stats(self):
+        with self._lock:
+            return {
+                "figures": len(self._specs),
+                "bytes": sum(len(s) for s in self._specs.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,155 @@
+"""
+Hedged requests: ask the primary source, and if it hasn't answered within
+its usual (p95) latency, ask the next one too; the first valid answer wins.
+The delay tunes itself from the latencies recorded per request class and
+source; failed or invalid attempts count as taking the full timeout.
+
+    hedger = Hedger()
+    name, result = hedger.run([("a", fetch_a), ("b", fetch_b)], valid=lambda r: r is not None,
+                              kind="quotes", timeout=10)
+
+Requests already on the wire can't be aborted: a losing attempt is
+abandoned (its result is discarded, its latency still recorded) and
+attempts not started yet are cancelled. No streamlit imports here.
+"""
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+
+QUANTILE = 95
+MIN_SAMPLES = 20 # below this the default delay is used
+DEFAULT_DELAY = 1.0
+MIN_DELAY = 0.1
+MAX_DELAY = 5.0
+_WINDOW = 256 # latencies kept per source
+
+
+class LatencyTracker:
+    """Recent latencies (seconds) per key, e.g. (request class, source), with percentiles over them."""
+
+    def __init__(self, window=_WINDOW):
+        self._samples = {}
+        self._window = window
+        self._lock = threading.Lock()
+
+    def record(self, source, seconds):
+        with self._lock:
+            self._samples.setdefault(source, deque(maxlen=self._window)).append(seconds)
+
+    def percentile(self, source, q):
+        """q-th percentile of the source's recent latencies (None without samples)."""
+        with self._lock:
+            samples = list(self._samples.get(source, ()))
+        return float(np.percentile(samples, q)) if samples else None
+
+    def count(self, source):
+        with self._lock:
+            return len(self._samples.get(source, ()))
+
+    def summary(self):
+        """{key: {'n', 'p50', 'p95', 'p99'}} in milliseconds."""
+        with self._lock:
+            samples = {source: np.asarray(values) for source, values in self._samples.items()}
+        return {
+            source: {"n": len(values), **{f"p{q}": float(np.percentile(values, q)) * 1000 for q in (50, 95, 99)}}
+            for source, values in samples.items() if len(values)
+        }
+
+
+class Hedger:
+    def __init__(self, quantile=QUANTILE, default_delay=DEFAULT_DELAY, min_delay=MIN_DELAY, max_delay=MAX_DELAY, workers=8):
+        self.quantile = quantile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.latency = LatencyTracker()
+        # Own pool, so hedgers nested in each other's attempts can't starve one another;
+        # abandoned attempts finish (or time out) in the background
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hedge")
+        self._lock = threading.Lock()
+        self.hedges = 0 # backup attempts fired
+        self.wins = Counter() # source -> races won
+
+    def delay(self, source, kind=None):
+        """How long to wait on `source` before hedging a `kind` request: its p95 latency, clamped."""
+        key = (kind, source)
+        if self.latency.count(key) < MIN_SAMPLES:
+            return self.default_delay
+        return min(self.max_delay, max(self.min_delay, self.latency.percentile(key, self.quantile)))
+
+    def _timed(self, key, fn, valid, timeout):
+        start = time.monotonic()
+        ok = False
+        try:
+            result = fn()
+            ok = valid(result)
+            return result
+        finally:
+            elapsed = time.monotonic() - start
+            # A failure is as bad as waiting out the timeout, whenever it came
+            self.latency.record(key, elapsed if ok or timeout is None else max(elapsed, timeout))
+
+    def run(self, attempts, valid=bool, kind=None, timeout=None):
+        """
+        Runs attempts ([(source, fn), ...], in order of preference), starting
+        each next one when the previous has taken longer than its delay or has
+        failed. Returns (source, result) of the first valid result. If none is
+        valid, the most preferred attempt's outcome is reported: its invalid
+        result, or its error re-raised. Latencies are tracked per `kind`
+        (request class); failures are recorded as `timeout` seconds.
+        """
+        if len(attempts) == 1:
+            source, fn = attempts[0]
+            return source, self._timed((kind, source), fn, valid, timeout)
+
+        running = {}
+        launched = 0
+        outcomes = {} # attempt position -> (source, result, error) of attempts without a valid result
+
+        def launch():
+            nonlocal launched
+            source, fn = attempts[launched]
+            running[self._pool.submit(self._timed, (kind, source), fn, valid, timeout)] = (launched, source)
+            launched += 1
+
+        launch()
+        while running:
+            more = launched < len(attempts)
+            patience = self.delay(attempts[launched - 1][0], kind) if more else None
+            done, _ = wait(running, timeout=patience, return_when=FIRST_COMPLETED)
+            if not done:
+                with self._lock:
+                    self.hedges += 1
+                launch()
+                continue
+
+            for future in done:
+                position, source = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    outcomes[position] = (source, None, e)
+                    continue
+                if valid(result):
+                    for other in running:
+                        other.cancel()
+                    with self._lock:
+                        self.wins[source] += 1
+                    return source, result
+                outcomes[position] = (source, result, None)
+
+            # Everything started so far failed: go to the next source right away
+            if not running and launched < len(attempts):
+                launch()
+
+        source, result, error = outcomes[min(outcomes)]
+        if error is not None:
+            raise error
+        return source, result
+
+    def metrics(self):
+        with self._lock:
+            return {"hedges": self.hedges, "wins": dict(self.wins), "latency": self.latency.summary()}
@@ -0,0 +1,276 @@
+"""
+Local history store: keeps the finest bars fetched for each symbol (daily) and
+derives other ranges and intervals from them, so a new chart range or
+interval does not mean a new proxy call.
+
+    store = HistoryStore()
+    store.closes(["BNC.CR", "MVZ-A.CR"], "6mo")     # close matrix, like fetch_multi_history
+    store.bars(["BNC.CR"], "1wk", "2y")             # weekly OHLCV
+    store.bars(["BNC.CR"], "5d", "1y")              # 5-trading-day bars
+
+Resampled frames are memoized by (symbols, interval, range) until the
+underlying bars are refreshed. Returned frames are shared: don't mutate them.
+With an ActionBook, bars are held as traded and served back-adjusted for
+splits and dividends (see corporate_actions), or for splits only with
+dividends=False, e.g. to value holdings.
+No streamlit imports here.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from bvc_core import corporate_actions, market_data
+
+# Ranges from shortest to longest; a symbol held at a range serves all shorter ones
+RANGES = ["1mo", "3mo", "6mo", "ytd", "1y", "2y", "5y", "10y", "max"]
+RANGE_OFFSETS = {
+    "1mo": pd.DateOffset(months=1),
+    "3mo": pd.DateOffset(months=3),
+    "6mo": pd.DateOffset(months=6),
+    "1y": pd.DateOffset(years=1),
+    "2y": pd.DateOffset(years=2),
+    "5y": pd.DateOffset(years=5),
+    "10y": pd.DateOffset(years=10),
+}
+
+# Chart range selector labels
+RANGE_LABELS = {"1M": "1mo", "3M": "3mo", "YTD": "ytd", "1Y": "1y", "5Y": "5y", "MAX": "max"}
+
+# Calendar intervals as pandas resample rules; "<n>d" means n trading days
+INTERVAL_RULES = {"1wk": "W-FRI", "1mo": "ME"}
+
+_AGG = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+_MEMO_SIZE = 32
+
+
+def slice_range(frame, range_str):
+    """Rows of a date-indexed frame within range_str of its last row (binary search on the index)."""
+    if frame.empty or range_str == "max":
+        return frame
+    last = frame.index[-1]
+    if range_str == "ytd":
+        start = pd.Timestamp(year=last.year, month=1, day=1)
+    else:
+        start = last - RANGE_OFFSETS[range_str]
+    return frame.iloc[frame.index.searchsorted(start):]
+
+
+def resample_ohlcv(panel, interval):
+    """
+    Aggregates a (field, symbol) column panel of daily bars to `interval`:
+    "1d" (as is), "<n>d" (n trading days, anchored so the latest bar is
+    complete), "1wk" or "1mo". Each field is aggregated for every symbol at once.
+    """
+    if interval == "1d" or panel.empty:
+        return panel
+
+    if interval in INTERVAL_RULES:
+        rule = INTERVAL_RULES[interval]
+        parts = {field: getattr(panel[field].resample(rule), how)() for field, how in _AGG.items()}
+        frame = pd.concat(parts, axis=1)
+        # Periods with no bars at all (e.g. holidays) are dropped
+        return frame.dropna(how="all", subset=frame.columns[frame.columns.get_level_values(0) == "Close"])
+
+    if not interval.endswith("d") or not interval[:-1].isdigit():
+        raise ValueError(f"Unsupported interval: {interval}")
+    n = int(interval[:-1])
+    groups = (np.arange(len(panel))[::-1] // n)[::-1]
+    keys = pd.Index(groups, name="bar")
+    parts = {field: getattr(panel[field].groupby(keys), how)() for field, how in _AGG.items()}
+    # Label each bar with its last day
+    labels = panel.index.to_series().groupby(keys).last()
+    frame = pd.concat(parts, axis=1)
+    frame.index = pd.DatetimeIndex(labels.loc[frame.index].to_numpy(), name=panel.index.name)
+    return frame
+
+
+def by_day(frame):
+    """Bars keyed by calendar day (the latest bar wins when a day repeats)."""
+    frame = frame.set_axis(frame.index.normalize())
+    return frame[~frame.index.duplicated(keep="last")].sort_index()
+
+
+def _merge(old, new):
+    if old is None or old.empty:
+        return new
+    merged = pd.concat([old, new])
+    return merged[~merged.index.duplicated(keep="last")].sort_index()
+
+
+def _delta_range(last_day):
+    """Shortest range reaching back past last_day, so a refresh only fetches recent bars (None: too far behind)."""
+    today = pd.Timestamp.now().normalize()
+    for range_str in ("1mo", "3mo", "6mo", "1y"):
+        if today - RANGE_OFFSETS[range_str] < last_day:
+            return range_str
+    return None
+
+
+class HistoryStore:
+    """
+    Daily bars per symbol, in memory and optionally in a persistent store
+    (`persist` provides load_daily_bars/save_daily_bars, e.g. bvc_core.db).
+    With a persistent store, long ranges load from it and stale symbols only
+    fetch the bars missing since their last stored day.
+    `on_update`, if given, is called with {symbol: daily frame} whenever bars
+    land (loaded or fetched), e.g. to keep derived statistics current.
+    `actions` (a corporate_actions.ActionBook) turns on split and dividend
+    adjustment: `fetch` is then called with with_actions=True, and
+    `on_restate`, if given, is called with the symbols whose whole adjusted
+    history changed because of a new event (before on_update sees it).
+    """
+
+    def __init__(self, fetch=market_data.fetch_ohlcv, ttl=3600, persist=None, on_update=None,
+                 actions=None, on_restate=None):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.persist = persist
+        self.on_update = on_update
+        self.actions = actions
+        self.on_restate = on_restate
+        self._bars = {} # symbol -> daily OHLCV frame indexed by day (as traded when adjusting)
+        self._depth = {} # symbol -> (range index held, fetched_at)
+        self._factors = {} # symbol -> back-adjustment factor columns of its bars
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _adjusted(self, symbol, dividends=True):
+        """The symbol's bars back-adjusted for its corporate actions (as held when it has none)."""
+        with self._lock:
+            frame = self._bars.get(symbol)
+            factors = self._factors.get(symbol)
+        events = self.actions.events(symbol) if self.actions is not None else None
+        if frame is None or events is None:
+            return frame
+        if factors is None or not factors.index.equals(frame.index):
+            factors = corporate_actions.factors(frame, events)
+            with self._lock:
+                self._factors[symbol] = factors
+        return corporate_actions.adjust(frame, factors, dividends)
+
+    def _load_persisted(self, symbols):
+        if self.actions is not None:
+            self.actions.ensure(symbols)
+        loaded = self.persist.load_daily_bars(symbols)
+        with self._lock:
+            for symbol, (frame, depth, fetched_at) in loaded.items():
+                if depth in RANGES and symbol not in self._depth:
+                    self._bars[symbol] = frame
+                    self._depth[symbol] = (RANGES.index(depth), fetched_at)
+        if self.on_update is not None and loaded:
+            self.on_update({symbol: self._adjusted(symbol) for symbol in loaded})
+
+    def _fetch(self, symbols, range_str, now, depth=None):
+        """Fetches bars for the symbols and merges them into what is held."""
+        restated = []
+        if self.actions is not None:
+            bars, actions = self.fetch(list(symbols), range_str, with_actions=True)
+            # Held as traded, so a later event only changes the factor column
+            fetched = {s: corporate_actions.unadjust(by_day(f), actions.get(s)) for s, f in bars.items()}
+            restated = self.actions.record(actions)
+        else:
+            fetched = {s: by_day(f) for s, f in self.fetch(list(symbols), range_str).items()}
+        with self._lock:
+            for symbol in symbols:
+                if symbol in fetched:
+                    self._bars[symbol] = _merge(self._bars.get(symbol), fetched[symbol])
+                # Symbols without data are remembered too, so they aren't refetched on every call
+                held = self._depth.get(symbol, (0, 0))[0]
+                self._depth[symbol] = (max(held, RANGES.index(depth or range_str)), now)
+            for symbol in set(fetched).union(restated):
+                self._factors.pop(symbol, None)
+        if self.persist is not None and fetched:
+            self.persist.save_daily_bars(fetched, depth or range_str, now)
+        if self.on_restate is not None and restated:
+            self.on_restate(restated)
+        if self.on_update is not None and fetched:
+            self.on_update({symbol: self._adjusted(symbol) for symbol in fetched})
+
+    def _ensure(self, symbols, range_str):
+        """
+        Makes sure every symbol is held at least back to range_str and is no
+        older than ttl: loads the persistent store first, then fetches what is
+        missing (full range) or stale (only the recent bars).
+        """
+        wanted = RANGES.index(range_str)
+        now = time.time()
+        if self.persist is not None:
+            with self._lock:
+                unknown = [s for s in symbols if s not in self._depth]
+            if unknown:
+                self._load_persisted(unknown)
+
+        with self._lock:
+            shallow, stale = [], []
+            for symbol in symbols:
+                depth, fetched_at = self._depth.get(symbol, (-1, 0))
+                if depth < wanted or (symbol not in self._bars and now - fetched_at > self.ttl):
+                    shallow.append(symbol)
+                elif now - fetched_at > self.ttl:
+                    stale.append(symbol)
+            deepest = max([wanted] + [self._depth[s][0] for s in shallow if s in self._depth])
+            deltas = {}
+            for s in stale:
+                deltas.setdefault(_delta_range(self._bars[s].index[-1]), []).append(s)
+
+        if shallow:
+            self._fetch(shallow, RANGES[deepest], now)
+        for delta, group in deltas.items():
+            with self._lock:
+                depth = RANGES[max(self._depth[s][0] for s in group)]
+            # Too far behind for a delta: refetch at the depth already held
+            self._fetch(group, delta or depth, now, depth=depth)
+
+        changed = set(shallow).union(stale)
+        if changed:
+            with self._lock:
+                for key in [k for k in self._memo if changed.intersection(k[0])]:
+                    del self._memo[key]
+
+    def _memoized(self, key, build):
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                return self._memo[key]
+        value = build()
+        with self._lock:
+            self._memo[key] = value
+            while len(self._memo) > _MEMO_SIZE:
+                self._memo.popitem(last=False)
+        return value
+
+    def _panel(self, symbols, interval, range_str, dividends=True):
+        def build():
+            held = {s: frame for s in symbols if (frame := self._adjusted(s, dividends)) is not None}
+            if not held:
+                return pd.DataFrame()
+            panel = pd.concat(held, axis=1).swaplevel(axis=1).sort_index(axis=1)
+            return resample_ohlcv(slice_range(panel, range_str), interval)
+
+        return self._memoized((symbols, interval, range_str, dividends), build)
+
+    def bars(self, symbols, interval="1d", range_str="1y", dividends=True):
+        """
+        OHLCV bars for the symbols as one frame with (field, symbol) columns,
+        sliced to range_str and resampled to interval.
+        """
+        symbols = tuple(dict.fromkeys(symbols))
+        self._ensure(symbols, range_str)
+        return self._panel(symbols, interval, range_str, dividends)
+
+    def closes(self, symbols, range_str="1y", interval="1d", dividends=True):
+        """Close matrix (one column per symbol, gaps filled) like market_data.fetch_multi_history."""
+        symbols = tuple(dict.fromkeys(symbols))
+        self._ensure(symbols, range_str)
+
+        def build():
+            frame = self._panel(symbols, interval, range_str, dividends)
+            if frame.empty:
+                return frame
+            close = frame["Close"]
+            return close[[s for s in symbols if s in close.columns]].ffill().bfill()
+
+        return self._memoized((symbols, interval, range_str, dividends, "close"), build)
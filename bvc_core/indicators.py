@@ -0,0 +1,244 @@
+"""
+Technical indicators (SMA, EMA, RSI, MACD, Bollinger bands, ATR) computed in
+NumPy over a (bars x symbols) matrix, so every symbol of a panel is handled
+in one pass instead of one series at a time.
+
+    engine = IndicatorEngine()
+    closes = store.closes(["BNC.CR", "MVZ-A.CR"], "1y")
+    engine.compute("rsi", closes)["rsi"]                 # DataFrame: day x symbol
+    engine.compute("macd", closes, fast=12, slow=26)     # columns (output, symbol)
+    engine.compute("atr", store.bars(symbols, "1d", "1y"))  # needs OHLC bars
+
+Results are memoized per (symbols, indicator, params, range). When the same panel
+comes back with new bars appended (or the last bar revised), only the rows
+from the last committed bar on are recomputed: windowed indicators re-read
+their lookback, recursive ones (EMA, RSI, MACD, ATR) resume from the state
+kept at that bar. Returned frames are shared: don't mutate them.
+No streamlit imports here.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+_MEMO_SIZE = 64
+
+
+# --- Kernels: rows of a (T, N) matrix at a time ---
+
+def _window_sums(x, start, window):
+    """Sums of each `window`-row window ending at rows start.. of x (NaN where the window is incomplete)."""
+    lo = max(start - window + 1, 0)
+    c = np.vstack([np.zeros((1, x.shape[1])), np.cumsum(x[lo:], axis=0)])
+    ends = np.arange(start, len(x)) - lo + 1
+    sums = c[ends] - c[np.maximum(ends - window, 0)]
+    sums[np.arange(start, len(x)) < window - 1] = np.nan
+    return sums
+
+
+def _ema_rows(x, alpha, prev):
+    """
+    Exponential smoothing of the rows of x, continuing from prev (one value
+    per column, NaN: seed from the column's first value). NaN inputs hold the
+    previous value. Returns the smoothed rows and the state before the last row.
+    """
+    out = np.empty_like(x)
+    before_last = prev
+    for t in range(len(x)):
+        if t == len(x) - 1:
+            before_last = prev
+        row = x[t]
+        prev = np.where(np.isnan(row), prev, np.where(np.isnan(prev), row, prev + alpha * (row - prev)))
+        out[t] = prev
+    return out, before_last
+
+
+def _warmup(out, start, rows):
+    """Blanks the outputs for absolute rows below `rows` (not enough history yet)."""
+    if start < rows:
+        out[:rows - start] = np.nan
+    return out
+
+
+def _previous(x, start):
+    """x[t-1] for rows start.. (NaN for row 0)."""
+    if start == 0:
+        return np.vstack([np.full((1, x.shape[1]), np.nan), x[:-1]])
+    return x[start - 1:-1]
+
+
+def _nan_state(n):
+    return np.full(n, np.nan)
+
+
+# --- Indicators: (inputs, start, state, **params) -> ({output: rows start..}, state) ---
+
+def sma(inputs, start, state, window=20):
+    close = inputs["Close"]
+    return {"sma": _window_sums(close, start, window) / window}, None
+
+
+def ema(inputs, start, state, span=20):
+    close = inputs["Close"]
+    prev = state if state is not None else _nan_state(close.shape[1])
+    out, state = _ema_rows(close[start:], 2.0 / (span + 1), prev)
+    return {"ema": _warmup(out, start, span - 1)}, state
+
+
+def rsi(inputs, start, state, period=14):
+    """Wilder's RSI: gains and losses smoothed with alpha = 1/period."""
+    close = inputs["Close"]
+    n = close.shape[1]
+    gain_prev, loss_prev = state if state is not None else (_nan_state(n), _nan_state(n))
+    delta = close[start:] - _previous(close, start)
+    gain, gain_state = _ema_rows(np.where(np.isnan(delta), np.nan, np.maximum(delta, 0.0)), 1.0 / period, gain_prev)
+    loss, loss_state = _ema_rows(np.where(np.isnan(delta), np.nan, np.maximum(-delta, 0.0)), 1.0 / period, loss_prev)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        value = np.where(loss > 0, 100.0 - 100.0 / (1.0 + gain / loss), np.where(gain > 0, 100.0, 50.0))
+    value[np.isnan(gain) | np.isnan(loss)] = np.nan
+    return {"rsi": _warmup(value, start, period)}, (gain_state, loss_state)
+
+
+def macd(inputs, start, state, fast=12, slow=26, signal=9):
+    close = inputs["Close"]
+    n = close.shape[1]
+    fast_prev, slow_prev, signal_prev = state if state is not None else (_nan_state(n),) * 3
+    fast_ema, fast_state = _ema_rows(close[start:], 2.0 / (fast + 1), fast_prev)
+    slow_ema, slow_state = _ema_rows(close[start:], 2.0 / (slow + 1), slow_prev)
+    line = fast_ema - slow_ema
+    signal_line, signal_state = _ema_rows(line, 2.0 / (signal + 1), signal_prev)
+    hist = line - signal_line
+    return {
+        "macd": _warmup(line, start, slow - 1),
+        "signal": _warmup(signal_line, start, slow + signal - 2),
+        "hist": _warmup(hist, start, slow + signal - 2),
+    }, (fast_state, slow_state, signal_state)
+
+
+def bollinger(inputs, start, state, window=20, k=2.0):
+    close = inputs["Close"]
+    mean = _window_sums(close, start, window) / window
+    mean_sq = _window_sums(close * close, start, window) / window
+    std = np.sqrt(np.maximum(mean_sq - mean * mean, 0.0))
+    return {"mid": mean, "upper": mean + k * std, "lower": mean - k * std}, None
+
+
+def atr(inputs, start, state, period=14):
+    """Wilder's average true range."""
+    high, low, close = inputs["High"], inputs["Low"], inputs["Close"]
+    prev_close = _previous(close, start)
+    hl = high[start:] - low[start:]
+    true_range = np.fmax(hl, np.fmax(np.abs(high[start:] - prev_close), np.abs(low[start:] - prev_close)))
+    prev = state if state is not None else _nan_state(close.shape[1])
+    out, state = _ema_rows(true_range, 1.0 / period, prev)
+    return {"atr": _warmup(out, start, period - 1)}, state
+
+
+# name -> (function, input fields, default params)
+INDICATORS = {
+    "sma": (sma, ("Close",), {"window": 20}),
+    "ema": (ema, ("Close",), {"span": 20}),
+    "rsi": (rsi, ("Close",), {"period": 14}),
+    "macd": (macd, ("Close",), {"fast": 12, "slow": 26, "signal": 9}),
+    "bollinger": (bollinger, ("Close",), {"window": 20, "k": 2.0}),
+    "atr": (atr, ("High", "Low", "Close"), {"period": 14}),
+}
+
+
+def _inputs(frame, name, fields):
+    """
+    Input matrices from a (field, symbol) bar panel, or from a close matrix
+    (one column per symbol) for close-only indicators.
+    """
+    if isinstance(frame.columns, pd.MultiIndex):
+        symbols = tuple(frame["Close"].columns)
+        return {f: frame[f][list(symbols)].to_numpy(dtype=float) for f in fields}, symbols
+    if fields != ("Close",):
+        raise ValueError(f"{name} needs OHLC bars, not a close matrix")
+    return {"Close": frame.to_numpy(dtype=float)}, tuple(frame.columns)
+
+
+class _Entry:
+    __slots__ = ("index", "last", "outputs", "state", "frame")
+
+    def __init__(self, index, last, outputs, state, frame):
+        self.index = index
+        self.last = last # input rows of the last bar, to detect a revision
+        self.outputs = outputs
+        self.state = state # recursive state before the last bar
+        self.frame = frame
+
+
+class IndicatorEngine:
+    """Memoizing front end over INDICATORS; safe to share between threads."""
+
+    def __init__(self, maxsize=_MEMO_SIZE):
+        self.maxsize = maxsize
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compute(self, name, frame, **params):
+        """
+        Indicator `name` for every symbol of `frame` (a close matrix or a
+        (field, symbol) bar panel, indexed by date). Returns a DataFrame with
+        (output, symbol) columns aligned to frame's index.
+        """
+        func, fields, defaults = INDICATORS[name]
+        params = {**defaults, **params}
+        inputs, symbols = _inputs(frame, name, fields)
+        index = frame.index
+        # The first bar stands for the range: panels over different ranges keep separate entries
+        key = (symbols, name, tuple(sorted(params.items())), index[0] if len(index) else None)
+        last = tuple(inputs[f][-1].tobytes() for f in fields) if len(index) else ()
+
+        with self._lock:
+            entry = self._memo.get(key)
+            if entry is not None:
+                self._memo.move_to_end(key)
+
+        start, state, head = 0, None, None
+        if entry is not None:
+            if entry.index.equals(index) and entry.last == last:
+                return entry.frame
+            # Everything before the cached last bar is final: resume from there
+            committed = len(entry.index) - 1
+            if 0 < committed < len(index) and index[:committed].equals(entry.index[:committed]):
+                start, state = committed, entry.state
+                head = {out: rows[:committed] for out, rows in entry.outputs.items()}
+
+        if len(index) == 0:
+            rows, state = {}, None
+        else:
+            rows, state = func(inputs, start, state, **params)
+        outputs = {out: np.vstack([head[out], r]) if head else r for out, r in rows.items()}
+
+        columns = pd.MultiIndex.from_product([list(outputs), list(symbols)])
+        data = np.hstack(list(outputs.values())) if outputs else np.empty((len(index), 0))
+        result = pd.DataFrame(data, index=index, columns=columns)
+
+        with self._lock:
+            self._memo[key] = _Entry(index, last, outputs, state, result)
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.maxsize:
+                self._memo.popitem(last=False)
+        return result
+
+    def invalidate(self, symbols):
+        """
+        Drops memoized results involving the symbols. Needed when their past
+        bars change (e.g. restated for a split), since resuming only checks
+        that the dates still line up.
+        """
+        symbols = set(symbols)
+        with self._lock:
+            for key in [k for k in self._memo if symbols.intersection(k[0])]:
+                del self._memo[key]
+
+    def latest(self, name, frame, output=None, **params):
+        """Last value per symbol of one output (default: the indicator's first), as a Series."""
+        result = self.compute(name, frame, **params)
+        if result.empty:
+            return pd.Series(dtype=float)
+        output = output or result.columns.get_level_values(0)[0]
+        return result[output].iloc[-1]
@@ -0,0 +1,331 @@
+"""
+Market data fetching and parsing: BVC quotes and history through the Yahoo
+Finance proxy, plus BCV and Binance P2P exchange rates.
+
+These are the uncached implementations; the Streamlit app wraps them with
+bvc_core.cache.cached (shared by every worker) and the CLI calls them directly.
+"""
+import logging
+import os
+from datetime import datetime
+from urllib.parse import urlencode
+
+import pandas as pd
+import requests
+
+from bvc_core import rates
+from bvc_core.hedge import Hedger
+from bvc_core.config import (
+    BCV_HISTORY_URL, BCV_RATE_URL, HEADERS, PROXY_URL, SYMBOLS, VET, YAHOO_CHART_URL
+)
+from bvc_core.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Bar columns and the chart payload's indicator key for each
+OHLCV_FIELDS = {"Open": "open", "High": "high", "Low": "low", "Close": "close", "Volume": "volume"}
+
+# Corporate action kinds (chart payloads requested with events="div,splits")
+SPLIT = "split"
+DIVIDEND = "dividend"
+
+
+# --- Proxy protocol ---
+
+def chart_url(symbol, **params):
+    """Yahoo chart URL for a symbol, e.g. chart_url("BNC.CR", range="1y", interval="1d")."""
+    url = YAHOO_CHART_URL.format(symbol=symbol)
+    return f"{url}?{urlencode(params)}" if params else url
+
+
+# Identical proxy calls in flight at the same time (e.g. every session refreshing
+# an expired cache entry at once) share one request; see proxy_flight.metrics()
+proxy_flight = SingleFlight()
+
+# Extra deployments of the same proxy (comma-separated PROXY_FALLBACK_URLS), asked
+# when the main one is slower than usual, e.g. during a cold start
+PROXY_URLS = [PROXY_URL] + [u.strip() for u in os.environ.get("PROXY_FALLBACK_URLS", "").split(",") if u.strip()]
+proxy_hedge = Hedger()
+
+
+def _post_charts(endpoint, urls, timeout):
+    response = requests.post(endpoint, json={"urls": urls}, headers=HEADERS, timeout=timeout)
+    response.raise_for_status()
+    return response.json().get('data', [])
+
+
+def post_chart_urls(urls, timeout=10, kind="chart"):
+    """
+    Sends a batch of Yahoo chart URLs through the proxy and returns the list of
+    chart payloads, in request order. Raises on HTTP errors.
+    Concurrent calls for the same set of URLs are coalesced into one POST, and
+    the POST is hedged across PROXY_URLS (see proxy_hedge.metrics()), with
+    latencies tracked per `kind` of request (quotes, history, ...).
+    """
+    urls = list(urls)
+
+    def post():
+        attempts = [(endpoint, lambda endpoint=endpoint: _post_charts(endpoint, urls, timeout)) for endpoint in PROXY_URLS]
+        return urls, proxy_hedge.run(attempts, kind=kind, timeout=timeout)[1]
+
+    sent, payloads = proxy_flight.do((PROXY_URL, frozenset(urls)), post)
+    if sent == urls:
+        return payloads
+    # Coalesced with a call that listed the same URLs in another order
+    position = {url: i for i, url in enumerate(sent)}
+    return [payloads[position[url]] if position[url] < len(payloads) else None for url in urls]
+
+
+def chart_result(result):
+    """First `chart.result` entry of a proxy payload ({} when missing)."""
+    return (((result or {}).get('chart') or {}).get('result') or [{}])[0] or {}
+
+
+def parse_quote(result, fallback_symbol):
+    """Builds a quote-table row from a chart payload's `meta`."""
+    meta = chart_result(result).get('meta', {})
+
+    symbol = meta.get('symbol', fallback_symbol)
+    price = meta.get('regularMarketPrice', 0.0)
+    prev_close = meta.get('chartPreviousClose', meta.get('previousClose', price))
+
+    # Extra fields for table
+    open_price = meta.get('regularMarketOpen', 0.0) # Might be missing
+    if open_price == 0.0:
+        open_price = prev_close # Fallback ensuring UI doesn't look broken
+
+    day_high = meta.get('regularMarketDayHigh', 0.0)
+    day_low = meta.get('regularMarketDayLow', 0.0)
+
+    # Calculate change
+    change_amount = price - prev_close
+    change_percent = (change_amount / prev_close * 100) if prev_close else 0.0
+
+    # Get name mapping
+    api_name = meta.get('shortName', meta.get('longName', symbol))
+    name = api_name.title()
+
+    return {
+        "Symbol": symbol,
+        "Name": name,
+        "Price": price,
+        "Change": change_amount,
+        "ChangePercent": change_percent,
+        "Volume": meta.get('regularMarketVolume', 0),
+        "Open": open_price,
+        "DayHigh": day_high,
+        "DayLow": day_low,
+        # Exchange time of the last trade (epoch seconds): the session the quote belongs to
+        "MarketTime": meta.get('regularMarketTime'),
+    }
+
+
+# --- Quotes ---
+
+def fetch_quotes(symbols=SYMBOLS):
+    """
+    Fetches the current quote snapshot.
+    Returns a dictionary with status, a DataFrame of stocks and the snapshot date;
+    on failure status is "error" and "error" holds the message.
+    """
+    try:
+        results = post_chart_urls([chart_url(s) for s in symbols], timeout=10, kind="quotes")
+
+        stocks_list = []
+        for i, result in enumerate(results):
+            try:
+                stocks_list.append(parse_quote(result, symbols[i]))
+            except Exception as e:
+                logger.error(f"Error parsing result for {symbols[i]}: {e}")
+                continue
+
+        return {
+            "status": "online",
+            "stocks": pd.DataFrame(stocks_list),
+            "date": datetime.now(VET).strftime("%d/%m/%Y %H:%M:%S")
+        }
+
+    except Exception as e:
+        logger.error(f"Error fetching data: {e}")
+        # Fallback empty structure
+        return {
+            "status": "error",
+            "error": str(e),
+            "stocks": pd.DataFrame(),
+            "date": datetime.now(VET).strftime("%d/%m/%Y")
+        }
+
+
+# --- History ---
+
+def fetch_historical_price(symbol, target_date):
+    """
+    Fetches the historical close price for a symbol on a specific date.
+    target_date should be a datetime.date object.
+    """
+    # Convert date to timestamp range (start and end of the day)
+    dt = datetime.combine(target_date, datetime.min.time())
+    p1 = int(dt.timestamp())
+    p2 = p1 + 86400 # +24 hours
+
+    try:
+        results = post_chart_urls([chart_url(symbol, period1=p1, period2=p2, interval="1d")], timeout=10, kind="price")
+        if results:
+            chart = chart_result(results[0])
+
+            # Try to get the close price from indicators
+            indicators = chart.get('indicators', {}).get('quote', [{}])[0]
+            closes = indicators.get('close', [])
+
+            # Filter out None values and get the first valid close
+            valid_closes = [c for c in closes if c is not None]
+            if valid_closes:
+                return valid_closes[0]
+
+            # Fallback to adjclose if necessary
+            adjcloses = chart.get('indicators', {}).get('adjclose', [{}])[0].get('adjclose', [])
+            valid_adj = [c for c in adjcloses if c is not None]
+            if valid_adj:
+                return valid_adj[0]
+
+        return None
+    except Exception as e:
+        logger.error(f"Error fetching historical price for {symbol}: {e}")
+        return None
+
+
+def parse_ohlcv(result):
+    """
+    Daily (or whatever interval was requested) bars of a chart payload as a
+    DataFrame with Open, High, Low, Close and Volume, indexed by 'Date'.
+    Returns (symbol, frame); the frame is empty when the payload has no bars.
+    """
+    chart = chart_result(result)
+    symbol = chart.get('meta', {}).get('symbol')
+    timestamps = chart.get('timestamp', [])
+    quote = chart.get('indicators', {}).get('quote', [{}])[0]
+    if not timestamps or not quote.get('close'):
+        return symbol, pd.DataFrame()
+
+    index = pd.to_datetime(timestamps, unit='s')
+    index.name = 'Date'
+    frame = pd.DataFrame(
+        {field: pd.Series(quote.get(key) or [None] * len(timestamps), dtype=float).to_numpy()
+         for field, key in OHLCV_FIELDS.items()},
+        index=index
+    )
+    return symbol, frame
+
+
+def parse_corporate_actions(result):
+    """
+    Splits and dividends of a chart payload requested with events="div,splits",
+    as a DataFrame indexed by ex-date ('Date') with Kind (SPLIT or DIVIDEND)
+    and Value: new shares per old share for a split, cash per share for a
+    dividend (Yahoo states amounts in today's split-adjusted shares).
+    """
+    events = chart_result(result).get('events') or {}
+    rows = []
+    for split in (events.get('splits') or {}).values():
+        numerator, denominator = split.get('numerator'), split.get('denominator')
+        if numerator and denominator:
+            rows.append((split['date'], SPLIT, float(numerator) / float(denominator)))
+    for dividend in (events.get('dividends') or {}).values():
+        if dividend.get('amount'):
+            rows.append((dividend['date'], DIVIDEND, float(dividend['amount'])))
+
+    frame = pd.DataFrame(rows, columns=['Date', 'Kind', 'Value'])
+    frame['Date'] = pd.to_datetime(frame['Date'], unit='s').dt.normalize()
+    return frame.set_index('Date').sort_index()
+
+
+def fetch_ohlcv(symbols, range_str="1y", interval="1d", with_actions=False):
+    """
+    Fetches OHLCV bars for multiple symbols in one proxy call.
+    Returns {symbol: DataFrame}; symbols without data are left out.
+    With with_actions=True the payloads also carry splits and dividends and
+    (bars, actions) is returned, actions being {symbol: parse_corporate_actions
+    frame} for the symbols that have any.
+    """
+    if not symbols:
+        return ({}, {}) if with_actions else {}
+
+    unique_symbols = list(dict.fromkeys(symbols))
+    params = {"range": range_str, "interval": interval}
+    if with_actions:
+        params["events"] = "div,splits"
+    bars, actions = {}, {}
+    try:
+        results = post_chart_urls([chart_url(s, **params) for s in unique_symbols], timeout=15, kind="history")
+        for i, result in enumerate(results):
+            try:
+                symbol, frame = parse_ohlcv(result)
+                symbol = symbol or unique_symbols[i]
+                if not frame.empty:
+                    bars[symbol] = frame
+                if with_actions:
+                    events = parse_corporate_actions(result)
+                    if not events.empty:
+                        actions[symbol] = events
+            except Exception:
+                continue
+    except Exception as e:
+        logger.error(f"Error fetching OHLCV history: {e}")
+    return (bars, actions) if with_actions else bars
+
+
+def fetch_multi_history(symbols, range_str="1y"):
+    """
+    Fetches daily close history for multiple symbols.
+    Returns a DataFrame indexed by date with one column per symbol.
+    """
+    bars = fetch_ohlcv(symbols, range_str)
+    if not bars:
+        return pd.DataFrame()
+    # Clean None values
+    return pd.DataFrame({symbol: frame['Close'].ffill().bfill() for symbol, frame in bars.items()})
+
+
+# --- Exchange rates ---
+
+def fetch_bcv_rate():
+    """
+    Fetches the official BCV USD/VES exchange rate.
+    """
+    try:
+        response = requests.get(BCV_RATE_URL, timeout=5)
+        response.raise_for_status()
+        data = response.json()
+        return data.get('promedio', 1.0) # Fallback to 1.0 if not found
+    except Exception as e:
+        logger.error(f"Error fetching BCV rate: {e}")
+        return 1.0
+
+
+def fetch_historical_bcv_rate(target_date):
+    """
+    Fetches historical BCV rate for a specific date using api.dolarvzla.com.
+    """
+    str_date = target_date.strftime('%Y-%m-%d')
+    try:
+        response = requests.get(f"{BCV_HISTORY_URL}?from={str_date}&to={str_date}", timeout=5)
+        if response.status_code == 200:
+            data = response.json()
+            if 'rates' in data and len(data['rates']) > 0:
+                return float(data['rates'][0]['usd'])
+    except Exception as e:
+        logger.error(f"Error fetching historical BCV: {e}")
+    return None
+
+
+def fetch_binance_rate():
+    """
+    Fetches the Binance P2P VES/USDT rate: the robust headline rate of the
+    BUY side over the first pages of merchant ads (see bvc_core.rates).
+    """
+    try:
+        stats = rates.robust_rates(rates.fetch_p2p_book(sides=("BUY",))["BUY"])
+        return stats[rates.HEADLINE] if stats else None
+    except Exception as e:
+        logger.error(f"Error fetching Binance rate: {e}")
+        return None
@@ -0,0 +1,184 @@
+"""
+Weighted market indices for the BVC.
+
+MarketIndexEngine keeps running weighted sums per index and, on each quote
+snapshot, only adjusts the contribution of the symbols whose price, previous
+close or volume changed. Sessions follow the trading day the quotes belong
+to, not the wall clock, so snapshots replayed on weekends and holidays
+revise the last session instead of chaining a new one. No streamlit imports
+here; persistence is left to the caller (see bvc_core.db.save_index_values).
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+BASE_LEVEL = 1000.0
+
+VOLUME_WEIGHTED = "volume"
+CAP_WEIGHTED = "cap"
+# Official IBC as published by the exchange (see bvc_site); recorded next to the computed ones
+OFFICIAL_IBC = "ibc"
+
+# Shares used to weight the cap-weighted index. Symbols not listed weigh as
+# a single share (price-weighted). Fill in free-float counts as they are known.
+SHARES_OUTSTANDING = {}
+
+
+def cap_label(shares=None):
+    """Short label for the CAP_WEIGHTED index: only cap-weighted once share counts are known."""
+    shares = SHARES_OUTSTANDING if shares is None else shares
+    return "Cap." if shares else "Precio"
+
+
+def benchmark_label(shares=None):
+    """Short label for the weighted_history benchmark."""
+    shares = SHARES_OUTSTANDING if shares is None else shares
+    return "Cap." if shares else "Igual pond."
+
+
+def session_day(stocks):
+    """
+    Trading day (UTC date, like the daily bars) of the latest quote in a
+    snapshot, from its MarketTime; None when no quote carries a time.
+    """
+    if stocks is None or 'MarketTime' not in stocks.columns:
+        return None
+    times = pd.to_numeric(stocks['MarketTime'], errors='coerce').dropna()
+    if times.empty:
+        return None
+    return pd.to_datetime(times.max(), unit='s').date()
+
+
+class MarketIndexEngine:
+    """
+    Incremental volume-weighted and cap-weighted market indices.
+
+    constituents: iterable of symbols to include (None = every symbol seen).
+    shares: symbol -> share count used by the cap-weighted index.
+    base_levels: index name -> previous close level to chain from.
+    closes: callable(day 'YYYY-MM-DD') -> {index name: level} of the last
+        closes before that day (e.g. db.get_last_index_closes); when given,
+        each new session starts from them instead of from base_levels.
+    """
+
+    def __init__(self, constituents=None, shares=None, base_levels=None, closes=None):
+        self.constituents = set(constituents) if constituents else None
+        self.shares = dict(SHARES_OUTSTANDING if shares is None else shares)
+        self.base_levels = {VOLUME_WEIGHTED: BASE_LEVEL, CAP_WEIGHTED: BASE_LEVEL}
+        self.base_levels.update(base_levels or {})
+        self.closes = closes
+        self.values = {}
+        self.day = None # trading day of the current session
+        self._last = {}  # symbol -> (price, prev_close, volume)
+        # Running sums: sum(w*P), sum(w*Prev), sum(V), sum(V*chg%), sum(chg%), count
+        self._cap_now = 0.0
+        self._cap_prev = 0.0
+        self._vol = 0.0
+        self._vol_chg = 0.0
+        self._chg = 0.0
+        self._n = 0
+        self._lock = threading.Lock()
+
+    def _apply(self, symbol, row, sign):
+        price, prev, volume = row
+        w = self.shares.get(symbol, 1.0)
+        chg = (price / prev - 1.0) * 100 if prev else 0.0
+        self._cap_now += sign * w * price
+        self._cap_prev += sign * w * prev
+        self._vol += sign * volume
+        self._vol_chg += sign * volume * chg
+        if prev:
+            self._chg += sign * chg
+            self._n += int(sign)
+
+    def update(self, stocks, day=None):
+        """
+        Folds a snapshot DataFrame (Symbol, Price, Change, Volume, MarketTime)
+        into the running sums and returns {index_name: {'value': level,
+        'change_pct': pct}}. The session is `day` when given, else the
+        snapshot's session_day(); a new one opens only when the day advances.
+        Snapshots without times stay in the current session.
+        """
+        if stocks is None or stocks.empty:
+            return self.values
+
+        with self._lock:
+            return self._update(stocks, day)
+
+    def _update(self, stocks, day):
+        day = day if day is not None else session_day(stocks)
+        if day is not None and (self.day is None or day > self.day):
+            # New session: chain its levels from the previous session's closes
+            chained = {name: v['value'] for name, v in self.values.items()} if self.day is not None else {}
+            if self.closes is not None:
+                chained.update(self.closes(day.strftime("%Y-%m-%d")))
+            self.base_levels.update(chained)
+            self.day = day
+
+        symbols = stocks['Symbol'].to_numpy()
+        prices = stocks['Price'].to_numpy(dtype=float)
+        prevs = prices - stocks['Change'].to_numpy(dtype=float)
+        volumes = np.nan_to_num(stocks['Volume'].to_numpy(dtype=float))
+
+        # Symbols missing from this snapshot no longer count (no stale prices)
+        for symbol in self._last.keys() - set(symbols):
+            self._apply(symbol, self._last.pop(symbol), -1.0)
+
+        for symbol, price, prev, volume in zip(symbols, prices, prevs, volumes):
+            if self.constituents is not None and symbol not in self.constituents:
+                continue
+            row = (float(price), float(prev), float(volume))
+            old = self._last.get(symbol)
+            if old == row:
+                continue
+            if old is not None:
+                self._apply(symbol, old, -1.0)
+            self._apply(symbol, row, 1.0)
+            self._last[symbol] = row
+
+        cap_chg = (self._cap_now / self._cap_prev - 1.0) * 100 if self._cap_prev else 0.0
+        if self._vol:
+            vol_chg = self._vol_chg / self._vol
+        else:
+            # No volume traded yet this session: equal-weighted until there is
+            vol_chg = self._chg / self._n if self._n else 0.0
+
+        self.values = {
+            VOLUME_WEIGHTED: {
+                'value': self.base_levels[VOLUME_WEIGHTED] * (1 + vol_chg / 100),
+                'change_pct': vol_chg,
+            },
+            CAP_WEIGHTED: {
+                'value': self.base_levels[CAP_WEIGHTED] * (1 + cap_chg / 100),
+                'change_pct': cap_chg,
+            },
+        }
+        return self.values
+
+
+def weighted_history(hist_df, shares=None, constituents=None):
+    """
+    Market index level over a close-price history frame (dates x symbols),
+    rebased to BASE_LEVEL on the first date. Used as the market benchmark.
+    Cap-weighted once share counts are known; until then equal-weighted
+    (chained mean daily return), since weighting by price alone would let
+    the highest-priced stocks dominate. See benchmark_label().
+    """
+    if hist_df is None or hist_df.empty:
+        return pd.Series(dtype=float)
+    shares = SHARES_OUTSTANDING if shares is None else shares
+    cols = [c for c in hist_df.columns if constituents is None or c in constituents]
+    prices = hist_df[cols].ffill().bfill().to_numpy(dtype=float)
+    prices = np.nan_to_num(prices)
+    if not shares:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rets = prices[1:] / prices[:-1] - 1.0
+        rets[~np.isfinite(rets)] = 0.0
+        mean = rets.mean(axis=1) if rets.size else np.zeros(len(rets))
+        level = BASE_LEVEL * np.concatenate(([1.0], np.cumprod(1.0 + mean)))
+        return pd.Series(level, index=hist_df.index, name="BVC")
+    weights = np.array([shares.get(c, 1.0) for c in cols])
+    cap = prices @ weights
+    level = cap / cap[0] * BASE_LEVEL if cap[0] else cap
+    return pd.Series(level, index=hist_df.index, name="BVC")
@@ -0,0 +1,116 @@
+"""
+Portfolio history reconstruction.
+
+Builds a quantity-held matrix (dates x symbols) from the holding lots, honoring
+each lot's purchase_date, and multiplies it with the aligned close-price matrix
+in a single vectorized operation. No streamlit imports here.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Small LRU of computed histories keyed by (holdings_version, prices_version)
+_CACHE_SIZE = 8
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def prices_fingerprint(hist_df):
+    """Cheap version key for a history frame (shape, columns, last bar)."""
+    if hist_df is None or hist_df.empty:
+        return None
+    last_row = hist_df.iloc[-1].to_numpy(dtype=float)
+    return (
+        hist_df.shape,
+        tuple(hist_df.columns),
+        hist_df.index[0].value,
+        hist_df.index[-1].value,
+        float(np.nansum(last_row)),
+    )
+
+
+def _lot_rows(index, holdings):
+    """Row in `index` from which each lot is held (0 when the date is unknown)."""
+    days = index.normalize()
+    rows = []
+    for item in holdings:
+        try:
+            purchase = pd.Timestamp(item.get('purchase_date'))
+        except (TypeError, ValueError):
+            purchase = None
+        if purchase is None or pd.isna(purchase):
+            rows.append(0)
+        else:
+            rows.append(int(days.searchsorted(purchase.normalize(), side='left')))
+    return np.asarray(rows, dtype=np.int64)
+
+
+def build_quantity_matrix(holdings, index, symbols):
+    """
+    Returns (qty_matrix, cost_matrix) of shape (len(index), len(symbols)).
+    qty_matrix[t, j] is the number of shares of symbols[j] held at date t;
+    cost_matrix holds the matching invested amount (avg_cost * qty).
+    """
+    n_dates, n_symbols = len(index), len(symbols)
+    qty_deltas = np.zeros((n_dates + 1, n_symbols))
+    cost_deltas = np.zeros((n_dates + 1, n_symbols))
+
+    col_of = {s: j for j, s in enumerate(symbols)}
+    lots = [h for h in holdings if h['symbol'] in col_of]
+    if lots:
+        rows = _lot_rows(index, lots)
+        cols = np.fromiter((col_of[h['symbol']] for h in lots), dtype=np.int64, count=len(lots))
+        qtys = np.fromiter((float(h['qty']) for h in lots), dtype=float, count=len(lots))
+        costs = np.fromiter((float(h['avg_cost']) for h in lots), dtype=float, count=len(lots))
+        # Lots bought after the last bar land in the spare row and are dropped
+        np.add.at(qty_deltas, (rows, cols), qtys)
+        np.add.at(cost_deltas, (rows, cols), qtys * costs)
+
+    qty_matrix = np.cumsum(qty_deltas[:-1], axis=0)
+    cost_matrix = np.cumsum(cost_deltas[:-1], axis=0)
+    return qty_matrix, cost_matrix
+
+
+def compute_portfolio_history(holdings, hist_df):
+    """
+    Reconstructs the portfolio over the dates in hist_df.
+    Returns a DataFrame indexed by date with 'Value', 'Cost' and 'PnL' columns.
+    Holdings whose symbol has no history are left out of all three series.
+    """
+    if hist_df is None or hist_df.empty or not holdings:
+        return pd.DataFrame(columns=['Value', 'Cost', 'PnL'])
+
+    symbols = sorted({h['symbol'] for h in holdings if h['symbol'] in hist_df.columns})
+    prices = hist_df[symbols].ffill().bfill().to_numpy(dtype=float)
+    prices = np.nan_to_num(prices, nan=0.0)
+
+    qty_matrix, cost_matrix = build_quantity_matrix(holdings, hist_df.index, symbols)
+
+    value = np.einsum('ij,ij->i', qty_matrix, prices)
+    cost = cost_matrix.sum(axis=1)
+    return pd.DataFrame({'Value': value, 'Cost': cost, 'PnL': value - cost}, index=hist_df.index)
+
+
+def get_portfolio_history(holdings, hist_df, holdings_version, prices_version=None):
+    """
+    Cached compute_portfolio_history keyed by (holdings_version, prices_version).
+    prices_version defaults to prices_fingerprint(hist_df).
+    """
+    if prices_version is None:
+        prices_version = prices_fingerprint(hist_df)
+    key = (holdings_version, prices_version)
+
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    result = compute_portfolio_history(holdings, hist_df)
+
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
@@ -0,0 +1,201 @@
+"""
+Local quote hub: holds the latest quote snapshot and pushes only the symbols
+that changed to subscribed browsers over Server-Sent Events (SSE).
+
+One poller thread per process fetches snapshots while at least one browser
+is subscribed (and, given an `active` check, only during market hours);
+each change is diffed and serialized once and fanned out to every
+subscriber, so server work scales with price changes instead of with the
+number of viewers. No streamlit imports here.
+"""
+import json
+import logging
+import math
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+QUOTE_FIELDS = ["Name", "Price", "Change", "ChangePercent", "Volume", "Open", "DayHigh", "DayLow"]
+
+# A client that falls this many messages behind is resynced with a full snapshot
+SUBSCRIBER_QUEUE_SIZE = 32
+KEEPALIVE_SECONDS = 15
+
+
+def _clean(value):
+    """JSON-safe scalar (NaN/inf become None, numpy scalars become Python)."""
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n".encode()
+
+
+class QuoteHub:
+    """Latest-snapshot store with diff-based fan-out to SSE subscribers."""
+
+    def __init__(self, fetch=None, interval=20, active=None):
+        self.fetch = fetch
+        self.interval = interval
+        self.active = active # callable() -> bool: whether quotes can move now (market hours)
+        self.quotes = {}
+        self.version = 0
+        self.updated_at = None
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._watched = threading.Condition(self._lock) # notified when subscribers come or go
+        self._stop = threading.Event()
+        self._server = None
+
+    # --- Snapshot / diff ---
+
+    def publish(self, stocks, updated_at=None):
+        """
+        Folds a snapshot DataFrame into the hub and pushes the changed symbols.
+        Returns the {symbol: row} dict of changes (empty when nothing moved).
+        """
+        if stocks is None or stocks.empty:
+            return {}
+
+        rows = {
+            rec["Symbol"]: {f: _clean(rec.get(f)) for f in QUOTE_FIELDS}
+            for rec in stocks.to_dict("records")
+        }
+
+        with self._lock:
+            changed = {s: row for s, row in rows.items() if self.quotes.get(s) != row}
+            if not changed:
+                return changed
+            self.quotes.update(changed)
+            self.version += 1
+            self.updated_at = updated_at
+            message = _sse("update", {"version": self.version, "date": updated_at, "quotes": changed})
+            subscribers = list(self._subscribers)
+
+        for q in subscribers:
+            self._offer(q, message)
+        return changed
+
+    def snapshot_message(self):
+        with self._lock:
+            return _sse("snapshot", {"version": self.version, "date": self.updated_at, "quotes": dict(self.quotes)})
+
+    # --- Subscribers ---
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        q.put(self.snapshot_message())
+        with self._lock:
+            self._subscribers.add(q)
+            self._watched.notify_all()
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+            self._watched.notify_all()
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def _offer(self, q, message):
+        try:
+            q.put_nowait(message)
+        except queue.Full:
+            # Slow client: drop its backlog and resync with the full snapshot
+            while True:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    break
+            q.put_nowait(self.snapshot_message())
+
+    # --- Background workers ---
+
+    def _wait_for_subscribers(self):
+        """Blocks while nobody is subscribed. Returns False once the hub is stopped."""
+        with self._lock:
+            while not self._subscribers and not self._stop.is_set():
+                self._watched.wait()
+        return not self._stop.is_set()
+
+    def _poll_loop(self):
+        while self._wait_for_subscribers():
+            # Off hours quotes don't move: only fetch once so new viewers get a snapshot
+            if self.active is None or self.active() or not self.quotes:
+                try:
+                    data = self.fetch()
+                    if data and data.get("status") == "online":
+                        self.publish(data["stocks"], data.get("date"))
+                except Exception as e:
+                    logger.error(f"Quote hub poll failed: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self, host="127.0.0.1", port=8765, allowed_origins=()):
+        """
+        Starts the poller and the SSE server. Returns False when the port is
+        already bound (another worker on this host is serving the stream).
+        Binds to loopback unless told otherwise; cross-origin reads are only
+        allowed from `allowed_origins` (the app's origins).
+        """
+        hub = self
+        allowed_origins = frozenset(allowed_origins)
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/stream":
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                origin = self.headers.get("Origin")
+                if origin in allowed_origins:
+                    self.send_header("Access-Control-Allow-Origin", origin)
+                    self.send_header("Vary", "Origin")
+                self.end_headers()
+
+                q = hub.subscribe()
+                try:
+                    while not hub._stop.is_set():
+                        try:
+                            message = q.get(timeout=KEEPALIVE_SECONDS)
+                        except queue.Empty:
+                            message = b": ping\n\n"
+                        self.wfile.write(message)
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    hub.unsubscribe(q)
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            logger.info(f"Quote hub port {port} unavailable ({e}); assuming another worker serves it.")
+            return False
+        self._server.daemon_threads = True
+
+        threading.Thread(target=self._server.serve_forever, name="quote-hub-sse", daemon=True).start()
+        if self.fetch is not None:
+            threading.Thread(target=self._poll_loop, name="quote-hub-poll", daemon=True).start()
+        logger.info(f"Quote hub streaming on {host}:{port}/stream")
+        return True
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            self._watched.notify_all()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
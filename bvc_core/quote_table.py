@@ -0,0 +1,86 @@
+"""
+Read-only, column-oriented view of one quote snapshot, built once and shared
+by every session: symbols as a categorical, numeric columns as read-only
+float arrays, one read-only record per row, and the ascending/descending
+row order of every sortable column computed up front. Rendering a sorted
+table is then a walk over a precomputed permutation; sessions only keep a
+reference and their sort key. No streamlit imports here.
+"""
+import threading
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+# Columns the market table can sort by
+SORTABLE = ("Symbol", "Price", "Change", "ChangePercent", "Open", "Volume", "DayHigh")
+
+
+def _frozen(values):
+    values.setflags(write=False)
+    return values
+
+
+class QuoteTable:
+    def __init__(self, stocks, digest=None):
+        self.digest = digest
+        self.symbols = pd.Categorical(stocks['Symbol']) if 'Symbol' in stocks.columns else pd.Categorical([])
+        self.columns = MappingProxyType({
+            name: _frozen(stocks[name].to_numpy(dtype=float, copy=True))
+            for name in stocks.columns if pd.api.types.is_numeric_dtype(stocks[name])
+        })
+        self.records = tuple(MappingProxyType(r) for r in stocks.to_dict('records'))
+        self._positions = MappingProxyType({s: i for i, s in enumerate(stocks['Symbol'])}) if 'Symbol' in stocks.columns else {}
+
+        orders = {}
+        for name in SORTABLE:
+            if name == "Symbol":
+                keys = self.symbols.codes.astype(float) # categories are sorted, so codes sort like the text
+            elif name in self.columns:
+                keys = self.columns[name]
+            else:
+                continue
+            # Stable sorts, NaN last in both directions (like DataFrame.sort_values)
+            orders[(name, True)] = _frozen(np.argsort(keys, kind="stable"))
+            orders[(name, False)] = _frozen(np.argsort(-keys, kind="stable"))
+        self._orders = MappingProxyType(orders)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def empty(self):
+        return not self.records
+
+    def order(self, column, ascending=True):
+        """Row permutation for a sort (None for a column that isn't sortable)."""
+        return self._orders.get((column, ascending))
+
+    def rows(self, column=None, ascending=True):
+        """Records in sort order (snapshot order when column isn't sortable)."""
+        order = self.order(column, ascending) if column else None
+        if order is None:
+            return iter(self.records)
+        return (self.records[i] for i in order)
+
+    def row(self, symbol):
+        position = self._positions.get(symbol)
+        return self.records[position] if position is not None else None
+
+
+class QuotePublisher:
+    """Holds the current QuoteTable; publishing an unchanged snapshot returns the existing one."""
+
+    def __init__(self):
+        self._table = None
+        self._lock = threading.Lock()
+
+    def publish(self, stocks):
+        digest = int(pd.util.hash_pandas_object(stocks, index=False).sum()) if not stocks.empty else 0
+        with self._lock:
+            if self._table is not None and self._table.digest == digest:
+                return self._table
+        table = QuoteTable(stocks, digest)
+        with self._lock:
+            self._table = table
+        return table
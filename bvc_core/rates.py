@@ -0,0 +1,230 @@
+"""
+VES exchange-rate aggregation. Samples the BUY and SELL sides of the Binance
+P2P book over several pages concurrently, reduces each side to robust rates
+(volume-weighted, trimmed mean, median) and keeps the results in a bounded
+time series persisted locally, so the app reads precomputed values instead of
+calling out on every render. No streamlit imports here.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import requests
+
+from bvc_core.config import BINANCE_P2P_URL, HEADERS
+from bvc_core.db import DB_DIR
+
+logger = logging.getLogger(__name__)
+
+SIDES = ("BUY", "SELL")
+P2P_PAGES = 3
+P2P_ROWS = 20 # Binance serves at most 20 ads per page
+TRIM = 0.1 # fraction cut from each end before averaging
+
+# Rate shown as "the" P2P rate
+HEADLINE = "median"
+
+SERIES_PATH = os.environ.get("RATE_SERIES_PATH") or os.path.join(DB_DIR, "rate_series.json")
+SERIES_MAXLEN = 2016 # one week of 5-minute samples
+
+
+# --- Binance P2P book ---
+
+def fetch_p2p_page(trade_type, page, rows=P2P_ROWS):
+    """One page of merchant ads as a list of (price, tradable USDT) tuples."""
+    payload = {
+        "asset": "USDT",
+        "fiat": "VES",
+        "merchantCheck": True,
+        "page": page,
+        "payTypes": [],
+        "publisherType": "merchant",
+        "rows": rows,
+        "tradeType": trade_type
+    }
+    response = requests.post(BINANCE_P2P_URL, json=payload, headers=HEADERS, timeout=5)
+    response.raise_for_status()
+    ads = response.json().get('data') or []
+    return [(float(ad['adv']['price']), float(ad['adv'].get('tradableQuantity') or 0)) for ad in ads]
+
+
+def fetch_p2p_book(sides=SIDES, pages=P2P_PAGES, rows=P2P_ROWS):
+    """
+    Fetches the first `pages` pages of each side concurrently.
+    Returns {side: [(price, qty), ...]}; pages that fail are logged and skipped.
+    """
+    jobs = [(side, page) for side in sides for page in range(1, pages + 1)]
+    book = {side: [] for side in sides}
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        futures = [(side, page, pool.submit(fetch_p2p_page, side, page, rows)) for side, page in jobs]
+        for side, page, future in futures:
+            try:
+                book[side].extend(future.result())
+            except Exception as e:
+                logger.error(f"Error fetching Binance P2P {side} page {page}: {e}")
+    return book
+
+
+def robust_rates(ads, trim=TRIM):
+    """
+    Reduces a list of (price, qty) ads to {'vwap', 'trimmed_mean', 'median', 'count'}.
+    The VWAP only weighs ads inside the trimmed price range, so one large
+    off-market ad cannot drag it. Returns None for an empty side.
+    """
+    if not ads:
+        return None
+
+    prices = np.array([p for p, _ in ads], dtype=float)
+    qty = np.array([q for _, q in ads], dtype=float)
+
+    ordered = np.sort(prices)
+    k = int(len(ordered) * trim)
+    kept = ordered[k:len(ordered) - k] if len(ordered) > 2 * k else ordered
+    in_range = (prices >= kept[0]) & (prices <= kept[-1])
+
+    weights = qty[in_range]
+    vwap = np.average(prices[in_range], weights=weights) if weights.sum() > 0 else kept.mean()
+
+    return {
+        "vwap": float(vwap),
+        "trimmed_mean": float(kept.mean()),
+        "median": float(np.median(prices)),
+        "count": int(len(prices)),
+    }
+
+
+# --- Time series ---
+
+class RateSeries:
+    """Bounded ring buffer of rate samples, persisted to a local JSON file."""
+
+    def __init__(self, path=SERIES_PATH, maxlen=SERIES_MAXLEN):
+        self.path = path
+        self.points = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self._mtime = None
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.points.extend(json.load(f))
+            self._mtime = os.path.getmtime(self.path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Error loading rate series: {e}")
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(list(self.points), f)
+            os.replace(tmp_path, self.path)
+            self._mtime = os.path.getmtime(self.path)
+        except Exception as e:
+            logger.error(f"Error saving rate series: {e}")
+
+    def reload(self):
+        """Re-reads the file if another process on this host has written it since."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        with self._lock:
+            if mtime != self._mtime:
+                self.points.clear()
+                self.load()
+
+    def append(self, point):
+        with self._lock:
+            self.points.append(point)
+            self.save()
+
+    def latest(self):
+        with self._lock:
+            return self.points[-1] if self.points else None
+
+    def to_frame(self):
+        """Samples as a DataFrame indexed by sample time (naive UTC)."""
+        with self._lock:
+            frame = pd.DataFrame(list(self.points))
+        if frame.empty:
+            return frame
+        frame.index = pd.to_datetime(frame.pop("ts"), unit="s")
+        return frame
+
+
+def build_point(book, official=None, ts=None):
+    """
+    Flattens one sample: buy_/sell_ rates for each statistic, the BUY/SELL
+    spread and the brecha (headline P2P BUY rate over the official rate), in %.
+    """
+    point = {"ts": ts if ts is not None else time.time(), "bcv": official}
+    for side in SIDES:
+        stats = robust_rates(book.get(side, []))
+        for key in ("vwap", "trimmed_mean", "median", "count"):
+            point[f"{side.lower()}_{key}"] = stats[key] if stats else None
+
+    buy, sell = point[f"buy_{HEADLINE}"], point[f"sell_{HEADLINE}"]
+    point["spread_pct"] = (buy - sell) / sell * 100 if buy and sell else None
+    point["brecha_pct"] = (buy / official - 1) * 100 if buy and official and official > 1 else None
+    return point
+
+
+class RateAggregator:
+    """Samples the P2P book (and the official rate) on a background thread."""
+
+    def __init__(self, fetch_official=None, series=None, interval=300, pages=P2P_PAGES):
+        self.fetch_official = fetch_official
+        self.series = series if series is not None else RateSeries()
+        self.interval = interval
+        self.pages = pages
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        """Takes one sample and appends it to the series. Returns the point, or None when both sides failed."""
+        book = fetch_p2p_book(pages=self.pages)
+        if not any(book.values()):
+            return None
+
+        official = None
+        if self.fetch_official:
+            try:
+                official = self.fetch_official()
+            except Exception as e:
+                logger.error(f"Error fetching official rate: {e}")
+
+        point = build_point(book, official)
+        self.series.append(point)
+        return point
+
+    def latest(self):
+        return self.series.latest()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                # Every worker on the host shares the series file: skip if another one just sampled
+                self.series.reload()
+                latest = self.series.latest()
+                if latest is None or time.time() - latest['ts'] >= self.interval * 0.9:
+                    self.sample()
+            except Exception as e:
+                logger.error(f"Rate aggregator sample failed: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="rate-aggregator", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
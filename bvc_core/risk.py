@@ -0,0 +1,211 @@
+"""
+Risk analytics over an aligned price-history matrix (dates x symbols), such as
+the frame returned by fetch_multi_history.
+
+Return statistics are derived from running sums of daily returns (sum, cross
+products). The history is a rolling window, so each new session both appends
+a bar and drops the oldest one: the returns that leave the window are
+subtracted and the new ones added, in O(symbols^2) per changed bar instead of
+O(days x symbols^2) for the whole history. Drawdowns are recomputed, which is
+only linear in the window. No streamlit imports here.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252
+MARKET_COLUMN = "BVC"
+PORTFOLIO_COLUMN = "Portafolio"
+MAX_SLIDE = 5 # bars the window may move between updates and still be updated incrementally
+
+
+def daily_returns(prices):
+    """Simple daily returns of a (T x N) price array. Gaps and zero prices yield 0."""
+    prices = np.asarray(prices, dtype=float)
+    prev = prices[:-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rets = prices[1:] / prev - 1.0
+    rets[~np.isfinite(rets)] = 0.0
+    return rets
+
+
+def portfolio_index(history):
+    """
+    Converts a portfolio history frame ('Value', 'Cost') into a price-like index
+    using time-weighted daily returns, so new purchases don't count as gains.
+    """
+    value = history['Value'].to_numpy(dtype=float)
+    flows = np.diff(history['Cost'].to_numpy(dtype=float), prepend=0.0)
+    prev = np.concatenate(([np.nan], value[:-1]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rets = (value - flows) / prev - 1.0
+    rets[~np.isfinite(rets)] = 0.0
+    return pd.Series(np.cumprod(1.0 + rets), index=history.index, name=PORTFOLIO_COLUMN)
+
+
+def with_market(hist_df, market=None):
+    """
+    Returns hist_df with a MARKET_COLUMN appended. Uses the given market series
+    when provided, otherwise an equal-weighted index of the constituents.
+    """
+    frame = hist_df.ffill()
+    if market is not None:
+        frame[MARKET_COLUMN] = market.reindex(frame.index).ffill()
+    else:
+        rets = daily_returns(frame.to_numpy(dtype=float))
+        frame[MARKET_COLUMN] = np.concatenate(([1.0], np.cumprod(1.0 + rets.mean(axis=1))))
+    return frame
+
+
+class RiskEngine:
+    """Incrementally maintained return moments and drawdowns for a fixed column set."""
+
+    def __init__(self, columns, risk_free=0.0):
+        self.columns = list(columns)
+        self.risk_free = risk_free
+        self.prices = None
+
+    # --- Running state ---
+
+    def _reset(self, rets):
+        self.n = rets.shape[0]
+        self.s1 = rets.sum(axis=0)
+        self.cross = rets.T @ rets
+
+    def _add_returns(self, rets, sign=1.0):
+        self.n += int(sign) * len(rets)
+        self.s1 += sign * rets.sum(axis=0)
+        self.cross += sign * (rets.T @ rets)
+
+    def _overlap(self, rets):
+        """
+        How many returns dropped off the front of the window since the last
+        update, if the new returns continue the old ones (the old last return
+        may have been revised); None otherwise. Compared as returns, so
+        columns rebased to the window's first bar still match.
+        """
+        old = self.rets
+        for dropped in range(min(MAX_SLIDE, len(old)) + 1):
+            keep = len(old) - dropped - 1
+            if keep < 0 or keep > len(rets):
+                continue
+            if np.allclose(rets[:keep], old[dropped:dropped + keep], rtol=1e-9, atol=1e-12, equal_nan=True):
+                return dropped
+        return None
+
+    def update(self, prices):
+        """
+        Feeds the latest (T x N) price matrix. When the window slid forward
+        by up to MAX_SLIDE bars (and/or its last bar was revised), returns
+        that left it are removed from the moments and new ones added;
+        anything else triggers a full rebuild. Drawdowns are recomputed from
+        the prices, which is linear in the window. Returns True when the
+        state changed.
+        """
+        prices = np.asarray(prices, dtype=float)
+        old = self.prices
+        if old is not None and prices.shape == old.shape and np.array_equal(prices, old, equal_nan=True):
+            return False
+
+        rets = daily_returns(prices)
+        dropped = None
+        if old is not None and prices.shape[1] == old.shape[1] and len(rets) and len(self.rets):
+            dropped = self._overlap(rets)
+        if dropped is None:
+            self._reset(rets)
+        else:
+            keep = len(self.rets) - dropped - 1
+            # Out: returns that slid off the front and the old last one; in: everything after the overlap
+            self._add_returns(np.concatenate([self.rets[:dropped], self.rets[-1:]]), -1.0)
+            self._add_returns(rets[keep:])
+
+        self.prices = prices
+        self.rets = rets
+        peaks = np.fmax.accumulate(prices, axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dd = prices / peaks - 1.0
+        self.mdd = np.nanmin(np.where(np.isfinite(dd), dd, 0.0), axis=0)
+        return True
+
+    # --- Statistics ---
+
+    def covariance(self):
+        n = max(self.n, 2)
+        mean = self.s1 / self.n if self.n else np.zeros_like(self.s1)
+        return (self.cross - self.n * np.outer(mean, mean)) / (n - 1)
+
+    def report(self, market_column=MARKET_COLUMN):
+        """
+        Returns (stats, corr): stats is a DataFrame indexed by column with
+        annualized return/volatility, Sharpe, max drawdown and beta; corr is
+        the full correlation matrix of daily returns.
+        """
+        cov = self.covariance()
+        var = np.clip(np.diag(cov), 0.0, None)
+        std = np.sqrt(var)
+        mean = self.s1 / self.n if self.n else np.zeros_like(self.s1)
+
+        ann_ret = mean * TRADING_DAYS
+        ann_vol = std * np.sqrt(TRADING_DAYS)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sharpe = np.where(ann_vol > 0, (ann_ret - self.risk_free) / ann_vol, np.nan)
+            corr = cov / np.outer(std, std)
+        np.fill_diagonal(corr, 1.0)
+
+        beta = np.full(len(self.columns), np.nan)
+        if market_column in self.columns:
+            m = self.columns.index(market_column)
+            if var[m] > 0:
+                beta = cov[:, m] / var[m]
+
+        stats = pd.DataFrame({
+            'AnnReturn': ann_ret,
+            'AnnVolatility': ann_vol,
+            'Sharpe': sharpe,
+            'MaxDrawdown': self.mdd,
+            'Beta': beta,
+        }, index=self.columns)
+        corr_df = pd.DataFrame(corr, index=self.columns, columns=self.columns)
+        return stats, corr_df
+
+
+# One engine per column set; the report is cached per trading day / last bar
+_engines = {}
+_reports = {}
+_lock = threading.Lock()
+
+
+def get_risk_report(hist_df, portfolio_history=None, market=None, risk_free=0.0):
+    """
+    Risk report for every column of hist_df, plus the market and (optionally)
+    the portfolio. Returns (stats, corr) DataFrames, or (None, None) if there
+    is not enough history.
+    """
+    if hist_df is None or len(hist_df) < 3:
+        return None, None
+
+    frame = with_market(hist_df, market)
+    if portfolio_history is not None and not portfolio_history.empty:
+        frame[PORTFOLIO_COLUMN] = portfolio_index(portfolio_history).reindex(frame.index).ffill()
+
+    columns = tuple(frame.columns)
+    prices = frame.to_numpy(dtype=float)
+    trading_day = frame.index[-1].normalize()
+    report_key = (columns, trading_day, prices[-1].tobytes(), len(prices))
+
+    with _lock:
+        if report_key in _reports:
+            return _reports[report_key]
+
+        engine = _engines.get(columns)
+        if engine is None or engine.risk_free != risk_free:
+            engine = _engines[columns] = RiskEngine(columns, risk_free)
+        engine.update(prices)
+        result = engine.report()
+
+        # Keep only today's reports
+        for key in [k for k in _reports if k[1] != trading_day]:
+            del _reports[key]
+        _reports[report_key] = result
+    return result
@@ -0,0 +1,54 @@
+"""
+In-process request coalescing ("single flight"): while a call for a key is in
+flight, other callers for the same key wait for its result instead of
+issuing an identical request. Once it finishes the key is released, so
+later callers fetch fresh data. No streamlit imports here.
+"""
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {} # key -> Future of the in-flight call
+        self._lock = threading.Lock()
+        self.requests = 0 # calls made through do()
+        self.coalesced = 0 # calls served by another caller's request
+
+    def do(self, key, fn):
+        """
+        Returns fn()'s result; concurrent callers with the same key share one
+        call of fn (and its exception). The shared result must not be mutated.
+        """
+        with self._lock:
+            self.requests += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return call.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                del self._calls[key]
+            call.set_exception(e)
+            raise
+        with self._lock:
+            del self._calls[key]
+        call.set_result(result)
+        return result
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "executed": self.requests - self.coalesced,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }
@@ -0,0 +1,70 @@
+"""
+Last-known quote snapshot on local disk, so a cold worker can paint the market
+view immediately while its first live fetch is still in flight.
+"""
+import json
+import logging
+import os
+import time
+
+import pandas as pd
+
+from bvc_core.db import DB_DIR
+
+logger = logging.getLogger(__name__)
+
+# Next to the SQLite file by default; point it at a persistent volume on hosts
+# that scale to zero
+SNAPSHOT_PATH = os.environ.get("QUOTE_SNAPSHOT_PATH") or os.path.join(DB_DIR, "last_quotes.json")
+
+
+def save_snapshot(data, usd_rate=None, path=SNAPSHOT_PATH):
+    """
+    Persists an online quote snapshot (as returned by fetch_quotes, plus the
+    app's market index fields). Written atomically; errors are logged only.
+    """
+    if data.get('status') != 'online' or data['stocks'].empty:
+        return False
+
+    payload = {
+        "saved_at": time.time(),
+        "date": data['date'],
+        "stocks": data['stocks'].to_dict(orient="records"),
+        "market_avg_change": data.get('market_avg_change', 0.0),
+        "market_index": data.get('market_index', {}),
+        "usd_rate": usd_rate,
+    }
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, default=float)
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        logger.error(f"Error saving quote snapshot: {e}")
+        return False
+
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    """
+    Loads the last saved snapshot in the same shape as a live fetch, with
+    status "snapshot" and 'saved_at' (epoch seconds). None when there is none.
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            payload = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"Error loading quote snapshot: {e}")
+        return None
+
+    return {
+        "status": "snapshot",
+        "stocks": pd.DataFrame(payload.get("stocks", [])),
+        "date": payload.get("date", ""),
+        "market_avg_change": payload.get("market_avg_change", 0.0),
+        "market_index": payload.get("market_index", {}),
+        "usd_rate": payload.get("usd_rate"),
+        "saved_at": payload.get("saved_at", 0.0),
+    }
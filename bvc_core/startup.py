@@ -0,0 +1,56 @@
+"""
+Startup profiling: named checkpoints timed from the first import of this
+module, giving an import-time and first-render breakdown for a cold worker.
+In the app that is the start of the script's first run: the server has
+already imported streamlit by then, so that import is only measured by
+bench_startup.py, which times a fresh interpreter.
+Streamlit re-executes the app script on every rerun, so only the first pass
+through the checkpoints is recorded.
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_T0 = time.perf_counter()
+
+
+class StartupProfile:
+    def __init__(self, start=None):
+        self.start = _T0 if start is None else start
+        self.marks = []
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def mark(self, step):
+        """Records a checkpoint (ignored once the first render has finished)."""
+        with self._lock:
+            if not self.finished:
+                self.marks.append((step, time.perf_counter() - self.start))
+
+    def finish(self, step="first render"):
+        """Records the last checkpoint and logs the breakdown once."""
+        with self._lock:
+            if self.finished:
+                return
+            self.marks.append((step, time.perf_counter() - self.start))
+            self.finished = True
+        logger.info("Startup: " + ", ".join(f"{r['step']} {r['delta_ms']:.0f}ms" for r in self.breakdown())
+                    + f" (total {self.total_ms():.0f}ms)")
+
+    def breakdown(self):
+        """List of {'step', 'at_ms', 'delta_ms'} in checkpoint order."""
+        rows = []
+        prev = 0.0
+        for step, at in self.marks:
+            rows.append({"step": step, "at_ms": at * 1000, "delta_ms": (at - prev) * 1000})
+            prev = at
+        return rows
+
+    def total_ms(self):
+        return self.marks[-1][1] * 1000 if self.marks else 0.0
+
+
+# Process-wide profile used by the app
+profile = StartupProfile()
@@ -0,0 +1,181 @@
+"""
+Per-symbol statistics materialized on ingest: 52-week high/low, average
+volume, SMA-50/200 and distance from the 52-week high.
+
+Each symbol keeps rolling windows over its committed daily bars (running sums
+for averages, monotonic deques for extremes), so a new bar costs O(1)
+amortized instead of a pass over the history. The latest bar stays
+provisional: it is revised in place as intraday quotes arrive and is only
+pushed into the windows once a newer day shows up. No streamlit imports here.
+"""
+import math
+import threading
+from collections import deque
+
+import pandas as pd
+
+YEAR_BARS = 252
+AVG_VOLUME_BARS = 50
+SMA_SHORT = 50
+SMA_LONG = 200
+
+STAT_COLUMNS = ["High52w", "Low52w", "AvgVolume", "SMA50", "SMA200", "FromHighPct"]
+
+
+class RollingMean:
+    """Running sum over a bounded window of committed values."""
+
+    def __init__(self, size):
+        self.values = deque(maxlen=size)
+        self.total = 0.0
+
+    def push(self, value):
+        if len(self.values) == self.values.maxlen:
+            self.total -= self.values[0]
+        self.values.append(value)
+        self.total += value
+
+    def mean_with(self, value):
+        """Mean of the committed values plus a provisional one (None until that fills the window)."""
+        size = self.values.maxlen + 1
+        if len(self.values) + 1 < size:
+            return None
+        return (self.total + value) / size
+
+
+class RollingExtreme:
+    """Max (or min) of the last `size` values via a monotonic deque of (position, value)."""
+
+    def __init__(self, size, highest=True):
+        self.size = size
+        self.sign = 1.0 if highest else -1.0
+        self.window = deque()
+        self.position = 0
+
+    def push(self, value):
+        keyed = self.sign * value
+        while self.window and self.window[-1][1] <= keyed:
+            self.window.pop()
+        self.window.append((self.position, keyed))
+        self.position += 1
+        # Keep size-1 committed values: the provisional bar makes the full window
+        while self.window[0][0] <= self.position - self.size:
+            self.window.popleft()
+
+    def extreme_with(self, value):
+        keyed = self.sign * value
+        if self.window:
+            keyed = max(keyed, self.window[0][1])
+        return self.sign * keyed
+
+
+class SymbolStats:
+    def __init__(self):
+        self.high = RollingExtreme(YEAR_BARS - 1, highest=True)
+        self.low = RollingExtreme(YEAR_BARS - 1, highest=False)
+        self.sma_short = RollingMean(SMA_SHORT - 1)
+        self.sma_long = RollingMean(SMA_LONG - 1)
+        self.volumes = RollingMean(AVG_VOLUME_BARS - 1)
+        self.day = None # day of the provisional bar
+        self.bar = None # provisional (high, low, close, volume)
+
+    def push(self, day, high, low, close, volume):
+        """Adds a daily bar; a bar for the provisional day replaces it, older days are ignored."""
+        if self.day is not None and day < self.day:
+            return
+        if self.day is not None and day > self.day:
+            h, l, c, v = self.bar
+            self.high.push(h)
+            self.low.push(l)
+            self.sma_short.push(c)
+            self.sma_long.push(c)
+            self.volumes.push(v)
+        self.day = day
+        self.bar = (high, low, close, volume)
+
+    def values(self, price=None):
+        """Current stats; price (the live quote) defaults to the provisional close."""
+        if self.bar is None:
+            return dict.fromkeys(STAT_COLUMNS)
+        h, l, c, v = self.bar
+        high = self.high.extreme_with(h)
+        return {
+            "High52w": high,
+            "Low52w": self.low.extreme_with(l),
+            "AvgVolume": self.volumes.mean_with(v),
+            "SMA50": self.sma_short.mean_with(c),
+            "SMA200": self.sma_long.mean_with(c),
+            "FromHighPct": ((price if price is not None else c) / high - 1) * 100 if high else None,
+        }
+
+
+def _clean(value):
+    return None if value is None or (isinstance(value, float) and not math.isfinite(value)) else float(value)
+
+
+class StatsEngine:
+    """Materialized stats for every symbol, fed by the history store and the quote snapshots."""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def ingest_bars(self, bars):
+        """
+        Folds daily OHLCV frames ({symbol: DataFrame indexed by day}) in.
+        Only bars from the symbol's provisional day onwards are applied.
+        """
+        with self._lock:
+            for symbol, frame in bars.items():
+                stats = self._stats.setdefault(symbol, SymbolStats())
+                if stats.day is not None:
+                    frame = frame.loc[frame.index >= stats.day]
+                for day, h, l, c, v in zip(frame.index, frame['High'], frame['Low'], frame['Close'], frame['Volume']):
+                    if not math.isfinite(c):
+                        continue
+                    stats.push(day, _finite_or(h, c), _finite_or(l, c), c, _finite_or(v, 0.0))
+
+    def reset(self, symbols):
+        """Forgets the symbols' stats, e.g. before re-ingesting a restated (re-adjusted) history."""
+        with self._lock:
+            for symbol in symbols:
+                self._stats.pop(symbol, None)
+
+    def ingest_quotes(self, stocks):
+        """
+        Revises (or opens) each symbol's bar for the session its quote belongs
+        to (MarketTime, the exchange time of the last trade). Snapshots taken
+        on weekends and holidays repeat the last session, so they revise that
+        bar instead of adding one. Quotes without a time (from the site) only
+        revise the provisional bar.
+        """
+        if stocks is None or stocks.empty:
+            return
+        times = stocks['MarketTime'] if 'MarketTime' in stocks.columns else pd.Series(index=stocks.index, dtype=float)
+        # Same day boundary as the daily bars (UTC epoch dates, see market_data.parse_ohlcv)
+        days = pd.to_datetime(pd.to_numeric(times, errors='coerce'), unit='s').dt.normalize()
+        with self._lock:
+            for symbol, day, price, high, low, volume in zip(
+                stocks['Symbol'], days, stocks['Price'], stocks['DayHigh'], stocks['DayLow'], stocks['Volume']
+            ):
+                stats = self._stats.get(symbol)
+                if stats is None or not price:
+                    continue
+                day = stats.day if pd.isna(day) else day
+                if day is None:
+                    continue
+                stats.push(day, high or price, low or price, price, volume or 0.0)
+
+    def table(self, stocks=None):
+        """Stats as a DataFrame indexed by Symbol; distance from high uses the snapshot price when given."""
+        prices = dict(zip(stocks['Symbol'], stocks['Price'])) if stocks is not None and not stocks.empty else {}
+        with self._lock:
+            rows = {
+                symbol: {k: _clean(v) for k, v in stats.values(prices.get(symbol)).items()}
+                for symbol, stats in self._stats.items()
+            }
+        return pd.DataFrame.from_dict(rows, orient="index", columns=STAT_COLUMNS)
+
+
+def _finite_or(value, fallback):
+    return value if value is not None and math.isfinite(value) else fallback
@@ -0,0 +1,65 @@
+"""
+Portfolio valuation against a quote snapshot. No streamlit imports here.
+"""
+
+
+def value_portfolio(holdings, stocks):
+    """
+    Values each holding at the snapshot price (falling back to its average cost
+    when the symbol has no quote).
+
+    holdings: list of dicts as returned by db.get_holdings().
+    stocks: quote DataFrame (Symbol, Price, ChangePercent, ...); may be empty.
+
+    Returns (positions, totals). Each position keeps the holding's raw fields
+    plus the display columns; totals has 'value', 'cost', 'gain' and 'gain_pct'.
+    """
+    quotes = {}
+    if stocks is not None and not stocks.empty:
+        quotes = dict(zip(stocks['Symbol'], zip(stocks['Price'], stocks['ChangePercent'])))
+
+    positions = []
+    total_value = 0.0
+    total_cost = 0.0
+
+    for item in holdings:
+        # Default fallback: no market data for this symbol
+        curr_price, day_change_pct = quotes.get(item['symbol'], (item['avg_cost'], 0.0))
+
+        market_val = curr_price * item['qty']
+        cost_val = item['avg_cost'] * item['qty']
+        gain_loss = market_val - cost_val
+        gain_loss_pct = (gain_loss / cost_val * 100) if cost_val > 0 else 0
+
+        total_value += market_val
+        total_cost += cost_val
+
+        positions.append({
+            "id": item['id'],
+            "Symbol": item['symbol'],
+            "Cantidad": item['qty'],
+            "Precio Mercado": curr_price,
+            "Costo Prom.": item['avg_cost'],
+            "Valor Total": market_val,
+            "Ganancia/Pérdida": gain_loss,
+            "G/P %": gain_loss_pct,
+            "Cambio Diario %": day_change_pct,
+            "purchase_date": item.get('purchase_date'),
+            "qty": item['qty'],
+            "avg_cost": item['avg_cost'],
+            "symbol": item['symbol']
+        })
+
+    total_gain = total_value - total_cost
+    totals = {
+        "value": total_value,
+        "cost": total_cost,
+        "gain": total_gain,
+        "gain_pct": (total_gain / total_cost * 100) if total_cost > 0 else 0,
+    }
+    return positions, totals
+
+
+def to_usd(amount, usd_rate):
+    """Converts a Bs. amount to USD (0 when the rate is unknown)."""
+    return amount / usd_rate if usd_rate and usd_rate > 0 else 0
@@ -1,147 +1,89 @@
-import sqlite3
-import os
+"""
+Streamlit-facing database helpers. Storage lives in bvc_core.db; this module
+resolves DATABASE_URL from st.secrets, surfaces connection errors in the UI
+and caches holdings per session.
+"""
 import logging
 import streamlit as st
 
+from bvc_core import db
+from bvc_core.db import (
+    SQLITE_PATH, init_db, get_connection, query_holdings, save_index_values, get_last_index_closes, get_index_series,
+    save_daily_bars, load_daily_bars, save_corporate_actions, load_corporate_actions,
+    get_alert_rules, record_alert_events, get_fired_alert_ids, get_alert_events
+)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # --- Configuration ---
-try:
-    DB_URL = os.environ.get("DATABASE_URL") or st.secrets.get("DATABASE_URL")
-    # Fix for psycopg2: it prefers 'postgresql://' over 'postgres://'
-    if DB_URL and DB_URL.startswith("postgres://"):
-        DB_URL = DB_URL.replace("postgres://", "postgresql://", 1)
-except (FileNotFoundError, Exception):
-    DB_URL = os.environ.get("DATABASE_URL")
-
-# Local SQLite fallback
-DB_DIR = os.path.dirname(os.path.abspath(__file__))
-SQLITE_PATH = os.path.join(DB_DIR, "portfolio.db")
-
-def get_connection():
-    """Tries to connect to PostgreSQL, falls back to SQLite if it fails."""
-    if DB_URL:
-        try:
-            import psycopg2
-            # We add a connection timeout to avoid hanging
-            conn = psycopg2.connect(DB_URL, connect_timeout=5)
-            return conn, True
-        except Exception as e:
-            logger.error(f"PostgreSQL connection failed: {e}. Falling back to SQLite.")
-            # We store the error in session state to show it in the UI later
-            if "db_error" not in st.session_state:
-                st.session_state.db_error = str(e)
-            return sqlite3.connect(SQLITE_PATH), False
-    else:
-        return sqlite3.connect(SQLITE_PATH), False
-
-def init_db():
-    """Initializes the database and ensures tables and columns exist."""
-    conn, is_postgres = get_connection()
-    placeholder = "%s" if is_postgres else "?"
-    
+if not db.DB_URL:
     try:
-        cursor = conn.cursor()
-        
-        # Create table logic
-        auto_inc = "SERIAL" if is_postgres else "INTEGER PRIMARY KEY AUTOINCREMENT"
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS holdings (
-                id {auto_inc},
-                symbol TEXT NOT NULL,
-                quantity REAL NOT NULL,
-                avg_cost REAL NOT NULL,
-                purchase_date TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Migration/Column check
-        if is_postgres:
-            cursor.execute("SELECT column_name FROM information_schema.columns WHERE table_name='holdings'")
-        else:
-            cursor.execute("PRAGMA table_info(holdings)")
-        
-        columns = [row[0] if is_postgres else row[1] for row in cursor.fetchall()]
-        
-        if "purchase_date" not in columns:
-            cursor.execute("ALTER TABLE holdings ADD COLUMN purchase_date TEXT")
-            if is_postgres:
-                cursor.execute("UPDATE holdings SET purchase_date = CAST(created_at AS DATE)::text WHERE purchase_date IS NULL")
-            else:
-                cursor.execute("UPDATE holdings SET purchase_date = date(created_at) WHERE purchase_date IS NULL")
-        
-        conn.commit()
-    except Exception as e:
-        logger.error(f"Database init error: {e}")
-    finally:
-        conn.close()
+        db.configure(st.secrets.get("DATABASE_URL"))
+    except (FileNotFoundError, Exception):
+        pass
+
+DB_URL = db.DB_URL
+DB_NAME = db.DB_NAME
+
+def _store_db_error(message):
+    # We store the error in session state to show it in the UI later
+    if "db_error" not in st.session_state:
+        st.session_state.db_error = message
+
+db.on_connection_error = _store_db_error
+
+# Seconds a version read from the DB serves every session of this worker
+VERSION_TTL = 5
+
+@st.cache_data(ttl=VERSION_TTL, show_spinner=False)
+def get_portfolio_version():
+    """
+    The portfolio version stored in the DB, read at most once per VERSION_TTL
+    per worker. Writes from this worker show at once; writes from other
+    workers within VERSION_TTL.
+    """
+    return db.get_portfolio_version()
 
 def add_holding(symbol, quantity, avg_cost, purchase_date):
-    conn, is_postgres = get_connection()
-    placeholder = "%s" if is_postgres else "?"
-    try:
-        cursor = conn.cursor()
-        cursor.execute(
-            f"INSERT INTO holdings (symbol, quantity, avg_cost, purchase_date) VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder})",
-            (symbol, float(quantity), float(avg_cost), purchase_date)
-        )
-        conn.commit()
-    finally:
-        conn.close()
+    db.add_holding(symbol, quantity, avg_cost, purchase_date)
+    get_portfolio_version.clear()
 
 def update_holding(holding_id, symbol, quantity, avg_cost, purchase_date):
-    """Updates an existing holding in the database."""
-    conn, is_postgres = get_connection()
-    placeholder = "%s" if is_postgres else "?"
-    try:
-        cursor = conn.cursor()
-        cursor.execute(
-            f"UPDATE holdings SET symbol = {placeholder}, quantity = {placeholder}, avg_cost = {placeholder}, purchase_date = {placeholder} WHERE id = {placeholder}",
-            (symbol, float(quantity), float(avg_cost), purchase_date, holding_id)
-        )
-        conn.commit()
-    finally:
-        conn.close()
+    db.update_holding(holding_id, symbol, quantity, avg_cost, purchase_date)
+    get_portfolio_version.clear()
 
 def delete_holding(holding_id):
-    conn, is_postgres = get_connection()
-    placeholder = "%s" if is_postgres else "?"
-    try:
-        cursor = conn.cursor()
-        cursor.execute(f"DELETE FROM holdings WHERE id = {placeholder}", (holding_id,))
-        conn.commit()
-    finally:
-        conn.close()
+    db.delete_holding(holding_id)
+    get_portfolio_version.clear()
+
+@st.cache_data(ttl=VERSION_TTL, show_spinner=False)
+def get_alerts_version():
+    """The alert rules version stored in the DB, read like get_portfolio_version()."""
+    return db.get_alerts_version()
+
+def add_alert_rule(kind, symbol, direction, threshold):
+    db.add_alert_rule(kind, symbol, direction, threshold)
+    get_alerts_version.clear()
+
+def delete_alert_rule(rule_id):
+    db.delete_alert_rule(rule_id)
+    get_alerts_version.clear()
 
 def get_holdings():
-    holdings = []
-    conn, is_postgres = get_connection()
-    try:
-        if is_postgres:
-            from psycopg2.extras import RealDictCursor
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-        else:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-        cursor.execute("SELECT * FROM holdings ORDER BY created_at DESC")
-        rows = cursor.fetchall()
-        
-        for row in rows:
-            holdings.append({
-                "id": row["id"],
-                "symbol": row["symbol"],
-                "qty": row["quantity"] if is_postgres else row["quantity"], # names might differ slightly in dict
-                "avg_cost": row["avg_cost"],
-                "purchase_date": row["purchase_date"]
-            })
-    except Exception as e:
-        logger.error(f"Error fetching: {e}")
-    finally:
-        conn.close()
-    return holdings
+    """
+    Returns the current holdings (read-only list of dicts).
+    Served from the session cache while the portfolio version (stored in the
+    DB, so shared by every worker) is unchanged: no DB query when nothing changed.
+    """
+    # Read the version before querying so a concurrent write forces a refetch next time
+    version = get_portfolio_version()
+    cached = st.session_state.get("_holdings_cache")
+    if version is not None and cached is not None and cached[0] == version:
+        return cached[1]
 
-DB_NAME = "PostgreSQL (Cloud)" if DB_URL else SQLITE_PATH
+    holdings, ok = db.query_holdings()
+    if ok and version is not None:
+        st.session_state["_holdings_cache"] = (version, holdings)
+    return holdings
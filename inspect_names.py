@@ -1,32 +1,15 @@
-import requests
-import json
 import logging
+from bvc_core.market_data import chart_url, post_chart_urls
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def test_interbono_api():
-    url = "https://getmarketvalues-hdiyird7fq-uc.a.run.app"
-    
     symbols = ["PGR.CR", "BNC.CR"] 
     
-    yahoo_urls = [f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}" for symbol in symbols]
-    
-    payload = {
-        "urls": yahoo_urls
-    }
-    
-    headers = {
-        "Content-Type": "application/json",
-         "User-Agent": "Mozilla/5.0"
-    }
-    
     try:
-        response = requests.post(url, json=payload, headers=headers)
-        data = response.json()
-        
-        if 'data' in data:
-            results = data['data']
+        results = post_chart_urls([chart_url(symbol) for symbol in symbols])
+        if results:
             for i, result in enumerate(results):
                 try:
                     meta = result['chart']['result'][0]['meta']
@@ -0,0 +1,70 @@
+"""Parser of the bolsadecaracas.com home page, against a saved copy of its layout."""
+import pathlib
+import sys
+
+import pytest
+
+from bvc_core import bvc_site
+
+FIXTURE = pathlib.Path(__file__).parent / "fixtures" / "bvc_home.html"
+
+
+@pytest.fixture(params=["lxml", "stdlib"])
+def page(request, monkeypatch):
+    if request.param == "lxml":
+        pytest.importorskip("lxml.html")
+    else:
+        # Makes `import lxml.html` fail so the HTMLParser fallback runs
+        monkeypatch.setitem(sys.modules, "lxml", None)
+        monkeypatch.setitem(sys.modules, "lxml.html", None)
+    return FIXTURE.read_bytes()
+
+
+def test_parses_stock_rows(page):
+    rows, _ = bvc_site.parse_page(page)
+    by_symbol = {r["Symbol"]: r for r in rows}
+
+    # Suspended stocks (no price) and the indices table are left out
+    assert list(by_symbol) == ["BNC.CR", "MVZ-A.CR", "ABC-A.CR"]
+
+    bnc = by_symbol["BNC.CR"]
+    assert bnc["Name"] == "Banco Nacional De Credito"
+    assert bnc["Price"] == pytest.approx(1200.50)
+    assert bnc["Change"] == pytest.approx(15.50)
+    assert bnc["ChangePercent"] == pytest.approx(1.31)
+    assert bnc["Volume"] == 125300
+    assert bnc["Open"] == pytest.approx(1185.0)
+    assert bnc["DayHigh"] == pytest.approx(1210.0)
+    assert bnc["DayLow"] == pytest.approx(1180.0)
+
+    mvz = by_symbol["MVZ-A.CR"]
+    assert mvz["Change"] == pytest.approx(-5.0)
+    assert mvz["ChangePercent"] == pytest.approx(-0.92)
+
+
+def test_reads_utf8_without_declared_charset(page):
+    # Served pages do not always carry <meta charset>; accented headers must still match
+    rows, _ = bvc_site.parse_page(page.replace(b'<meta charset="utf-8">', b""))
+    assert [r["Symbol"] for r in rows] == ["BNC.CR", "MVZ-A.CR", "ABC-A.CR"]
+
+
+def test_parses_official_ibc(page):
+    _, ibc = bvc_site.parse_page(page)
+    # The value in the <script> block is ignored
+    assert ibc == {"value": pytest.approx(3358.29), "change_pct": pytest.approx(-1.25)}
+
+
+def test_columns_prefer_specific_headers():
+    header = ["Símbolo", "Nombre", "Último Precio", "Variación", "Var. %", "Volumen", "Apertura", "Máximo", "Mínimo"]
+    assert bvc_site._columns(header) == {
+        "Symbol": 0, "Name": 1, "Price": 2, "Change": 3, "ChangePercent": 4,
+        "Volume": 5, "Open": 6, "DayHigh": 7, "DayLow": 8,
+    }
+
+
+@pytest.mark.parametrize("text, value", [
+    ("3.358,29", 3358.29), ("-1,25 %", -1.25), ("+15,50", 15.5), ("1.200", 1200.0),
+    ("12.5", 12.5), ("Bs 1.200,50", 1200.5), ("-", None), ("", None),
+])
+def test_parse_number(text, value):
+    assert bvc_site.parse_number(text) == (pytest.approx(value) if value is not None else None)
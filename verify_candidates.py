@@ -1,9 +1,7 @@
-import requests
 import json
+from bvc_core.market_data import chart_result, chart_url, post_chart_urls
 
 def verify_all_possibilities():
-    url = "https://getmarketvalues-hdiyird7fq-uc.a.run.app"
-    
     # Base names from BVC and search
     bases = [
         "ABC", "AIV", "BNC", "BPV", "BVCC", "BVL", "CCP", "CCR", "CGQ", "CRM",
@@ -35,31 +33,23 @@ def verify_all_possibilities():
         if i % 10 == 0:
             print(f"Progress: {i}/{len(candidate_symbols)}...")
             
-        yahoo_url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
-        payload = {"urls": [yahoo_url]}
-        headers = {"Content-Type": "application/json", "User-Agent": "Mozilla/5.0"}
-        
         try:
-            response = requests.post(url, json=payload, headers=headers, timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                if 'data' in data and data['data']:
-                    result = data['data'][0]
-                    try:
-                        if result.get('chart', {}).get('result'):
-                            meta = result['chart']['result'][0]['meta']
-                            if meta.get('regularMarketPrice') is not None:
-                                sym = meta.get('symbol')
-                                name = meta.get('shortName', meta.get('longName', sym))
-                                price = meta.get('regularMarketPrice')
-                                valid_results.append({
-                                    "symbol": sym,
-                                    "name": name,
-                                    "price": price
-                                })
-                                print(f"  [+] Found: {sym} ({name})")
-                    except:
-                        pass
+            results = post_chart_urls([chart_url(symbol)], timeout=5)
+            if results:
+                try:
+                    meta = chart_result(results[0]).get('meta', {})
+                    if meta.get('regularMarketPrice') is not None:
+                        sym = meta.get('symbol')
+                        name = meta.get('shortName', meta.get('longName', sym))
+                        price = meta.get('regularMarketPrice')
+                        valid_results.append({
+                            "symbol": sym,
+                            "name": name,
+                            "price": price
+                        })
+                        print(f"  [+] Found: {sym} ({name})")
+                except:
+                    pass
         except Exception:
             pass
 